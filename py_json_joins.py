@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # coding=utf-8
 
 """ Module for the Conversion of Bridget Moynihan's JSON for Edwin Morgan's Scrapbooks
@@ -32,12 +32,42 @@ __status__ = "Production"
 __version__ = "1.0.8"
 
 
-from collections import Counter
+import argparse
+import array
+import cProfile
+from collections import Counter, OrderedDict
 import decimal
+import gzip
+import hashlib
 import json
+import multiprocessing
 import os
+import pstats
 import re
-import string
+import sqlite3
+import struct
+import sys
+import time
+from types import MappingProxyType
+import zlib
+
+# Peak memory for the stage report (the module is not available on Windows)
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# Brotli-compressed outputs (optional, see --compress)
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# C MessagePack reader for binary outputs (optional, see WfsBinaryDecoder)
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
 
 
 # Quickly transform string month to number
@@ -56,20 +86,73 @@ month_dict = {
     "December"  : 12
 }
 
+# Tables of a database export: name, primary key field, and the fields tying each record
+# to the pages, books, and entities built from it (used to find what changed between exports)
+export_tables = [
+	("Scrapbook", "Scrapbook_Id", []),
+	("Scrapbook_Page", "Page_Id", ["Scrapbook_Id", "Page_keywords"]),
+	("Page_Associated_People", "Associated_Person_Id", []),
+	("Page_Places_Named", "Place_Id", []),
+	("Page_Associated_Sources", "Page_Associated_Sources_Id", []),
+	("Page_People_Join", "Page_Associated_Person_Join_Id", ["Page_Id_Join", "Associated_Person_Id_Join"]),
+	("Page_Places_Named_Join", "Page_Places_Named_Join", ["Page_Id_Join_5", "Places_Named_Id_Join"]),
+	("Page_Associated_Sources_Join", "Page_Associated_Sources_Join_Id", ["Page_Id_Join_2", "Associated_Sources_Id_Join"]),
+	("Sources_People_Join", "Sources_Person_Join_Id", ["Associated_Sources_Id_Join_2"])
+]
+
+# Page ID lists whose co-occurrences are saved in the stats of people, places, and sources, and the stats
+# dict of the pages each co-occurring entity shares (see find_associated_pps)
+associated_pps_types = [
+	("people_ids", "people_on_pages_dict"),
+	("places_ids", "places_on_pages_dict"),
+	("sources_ids", "sources_on_pages_dict")
+]
+
+# Binary outputs (see WfsBinaryEncoder): format name and version at the start of each file, the MessagePack
+# extension types for string table references and integer-encoded IDs, and the IDs encoded as integers
+binary_format = "wfsb"
+binary_version = 1
+binary_string_type = 0
+binary_id_type = 1
+binary_id_regex = re.compile(r"(0|[1-9][0-9]{0,18})\Z")
+
+# Extension type and value of the fixed-size extensions (1, 2, 4, and 8 byte values)
+binary_extension_structs = [struct.Struct(">bB"), struct.Struct(">bH"), struct.Struct(">bI"), struct.Struct(">bQ")]
+
+# Regexes and chunk size for reading the RECORDS array of an export's JSON files
+records_start_regex = re.compile(r'"RECORDS"\s*:\s*\[')
+records_whitespace_regex = re.compile(r"[ \t\n\r]*")
+records_chunk_size = 65536
+
 # Regex for format description
 desc_regex = re.compile(r"\|\s*[A-Za-z\s]+\s*\[\d+\]\s*\|", re.IGNORECASE)
 
+# NOTE: Gathered (in post) by searching json descriptions for endline possiblities
+endline_list = ['%\n\n\n', '%', '%\n\n', '%\n', '%\n\r\n',
+				'%\n\n\r\n', '%\r\n', '\r\n\r\n', '%\r\n\r\n',
+				'\n\n\n', '\n\n', '%\r\n\r\n\r\n', '\r\n']
+
+# Tokens of a description: runs of endline characters, line breaks, the pipes of |Name [id]| tags, and clipping headings
+desc_token_regex = re.compile("[%\r\n]+|<br/>|\\||Identified Clippings:|Unidentified Clippings:")
+
+# Formatted runs of endline characters seen so far (see format_endline_run)
+endline_run_cache = {}
+
+# Symbol table of the IDs and repeated terms (keywords, roles, orientations, etc.) read from the export,
+# so that each distinct value is held once and compared by identity in sets, dicts, and Counters
+symbols = {}
+
 def anchor_routes_from_formatted_text_old(p_formatted_line, p_route):
 
 	# |Name [id]| - yields anchor tag to this person page
 
 	substitutions = re.findall(desc_regex, p_formatted_line)
-	# print "Substitutions: {0}".format(substitutions)
+	# print("Substitutions: {0}".format(substitutions))
 	line_with_tags = p_formatted_line
 
 	for index in range(len(substitutions)):
 
-		# print "Sub[{0}]: {1}".format(index, substitutions[index])
+		# print("Sub[{0}]: {1}".format(index, substitutions[index]))
 
 		parts = substitutions[index].strip().strip("|").split("[")
 
@@ -80,7 +163,7 @@ def anchor_routes_from_formatted_text_old(p_formatted_line, p_route):
 
 		line_with_tags = line_with_tags.replace(substitutions[index], anchor_tag) 
 
-		# print "line_with_tags: {0}".format(line_with_tags)
+		# print("line_with_tags: {0}".format(line_with_tags))
 
 	return line_with_tags
 
@@ -94,10 +177,10 @@ def anchor_routes_from_formatted_text(p_formatted_line, p_route):
 		if "|" == p_formatted_line[index]:
 			pipe_instances.append(index)
 	if len(pipe_instances) % 2 == 1:
-		print line_with_tags
+		print(line_with_tags)
 
 	# 2. Parse out the person name and ID and replace them with an anchor tag
-	for index in xrange(0, len(pipe_instances), 2):
+	for index in range(0, len(pipe_instances), 2):
 
 		# Two pipes surround a person tag
 		person_tag = p_formatted_line[pipe_instances[index]:pipe_instances[index + 1] + 1]
@@ -108,22 +191,17 @@ def anchor_routes_from_formatted_text(p_formatted_line, p_route):
 			parts[index2] = parts[index2].strip().strip("]")
 
 		if len(parts) < 2:
-			print parts
+			print(parts)
 
 		# Anchor tag for person
-		anchor_tag = "<a href='{0}/{1}'>{2}</a>".format(p_route, parts[1], parts[0].encode("utf-8"))
+		anchor_tag = "<a href='{0}/{1}'>{2}</a>".format(p_route, parts[1], parts[0])
 
 		# Replace piped person tag with formatted anchor tag
-		line_with_tags = line_with_tags.replace(person_tag, anchor_tag.decode('utf-8'))
+		line_with_tags = line_with_tags.replace(person_tag, anchor_tag)
 
 	return line_with_tags	
 
-def format_description(p_str_description):
-
-	# NOTE: Gathered (in post) by searching json descriptions for endline possiblities
-	endline_list = [u'%\n\n\n', u'%', u'%\n\n', u'%\n', u'%\n\r\n',
-					u'%\n\n\r\n', u'%\r\n', u'\r\n\r\n', u'%\r\n\r\n',
-					u'\n\n\n', u'\n\n', u'%\r\n\r\n\r\n', u'\r\n']
+def format_description_old(p_str_description, p_route="/collection/person"):
 
 	# Split out the description into separate lines
 	formatted_description = p_str_description
@@ -142,11 +220,117 @@ def format_description(p_str_description):
 		paragraphs[index] = style_text(paragraphs[index], "Unidentified Clippings:", "italic")
 		paragraphs[index] = weight_text(paragraphs[index], "Unidentified Clippings:", "bold")
 
-		paragraphs[index] = anchor_routes_from_formatted_text(paragraphs[index], "/collection/person")
+		paragraphs[index] = anchor_routes_from_formatted_text(paragraphs[index], p_route)
 		paragraphs[index] = "<p class=\"desc_paragraph\">" + paragraphs[index].strip().strip("%").strip() + "</p>"
 
 	return "".join(paragraphs).strip()
 
+def format_description(p_str_description, p_route="/collection/person"):
+
+	# Formats the description in one pass over its tokens, with the same output as format_description_old.
+	# Descriptions that the old function would pair pipes differently in (or fail on) are passed to it instead
+	paragraphs = []
+	paragraph_pieces = []
+	paragraph_tags = []
+	tag_pieces = None
+	gap_start = None
+	position = 0
+
+	for match in desc_token_regex.finditer(p_str_description):
+
+		# Text up to the token goes to the open |Name [id]| tag, or else to the paragraph
+		text = p_str_description[position:match.start()]
+		position = match.end()
+		if tag_pieces is not None:
+			tag_pieces.append(text)
+		else:
+			paragraph_pieces.append(text)
+
+		token = match.group()
+
+		# (1) Runs of endline characters become line breaks (and any characters left over)
+		if token[0] in "%\r\n" or "<br/>" == token:
+
+			lines = format_endline_run(token).split("<br/>") if "<br/>" != token else ["", ""]
+			if len(lines) > 1 and tag_pieces is not None:
+				return format_description_old(p_str_description, p_route)
+
+			for line in lines[:-1]:
+				paragraph_pieces.append(line)
+				paragraphs.append("<p class=\"desc_paragraph\">" + "".join(paragraph_pieces).strip().strip("%").strip() + "</p>")
+				paragraph_pieces = []
+				paragraph_tags = []
+				gap_start = None
+			if tag_pieces is not None:
+				tag_pieces.append(lines[-1])
+			else:
+				paragraph_pieces.append(lines[-1])
+
+		# (2) Italicize/bold the phrases "Identified Clippings:" and "Unidentified Clippings:"
+		elif "Clippings:" == token[-10:]:
+
+			styled_token = "<span style=\"font-style: italic;\"><span style=\"font-weight: bold;\">" + token + "</span></span>"
+			if tag_pieces is not None:
+				tag_pieces.append(styled_token)
+			else:
+				paragraph_pieces.append(styled_token)
+
+		# (3) Opening pipe of a |Name [id]| tag. The old function replaces every occurrence of each tag, so text
+		#     between two tags that reads like one of them (e.g. "|A [1]|B [2]|A [1]|") needs its pairing
+		elif tag_pieces is None:
+
+			if gap_start is not None and "|" + "".join(paragraph_pieces[gap_start:]) + "|" in paragraph_tags:
+				return format_description_old(p_str_description, p_route)
+			tag_pieces = []
+
+		# (4) Closing pipe of a |Name [id]| tag, replaced with an anchor tag to route to the person's page
+		else:
+
+			person_tag = "|" + "".join(tag_pieces) + "|"
+			parts = person_tag.strip().strip("|").split("[")
+			if len(parts) < 2:
+				return format_description_old(p_str_description, p_route)
+			for index in range(len(parts)):
+				parts[index] = parts[index].strip().strip("]")
+
+			paragraph_pieces.append("<a href='{0}/{1}'>{2}</a>".format(p_route, parts[1], parts[0]))
+			paragraph_tags.append(person_tag)
+			gap_start = len(paragraph_pieces)
+			tag_pieces = None
+
+	# An unpaired pipe is left to the old function
+	if tag_pieces is not None:
+		return format_description_old(p_str_description, p_route)
+
+	# Last paragraph
+	paragraph_pieces.append(p_str_description[position:])
+	paragraphs.append("<p class=\"desc_paragraph\">" + "".join(paragraph_pieces).strip().strip("%").strip() + "</p>")
+
+	return "".join(paragraphs).strip()
+
+def format_endline_run(p_endline_run):
+
+	# Replaces the endlines in a run of endline characters in the same order as format_description_old.
+	# Since "<br/>" has no endline characters, doing this run by run matches doing it over the whole description
+	if p_endline_run in endline_run_cache:
+		return endline_run_cache[p_endline_run]
+
+	formatted_run = p_endline_run
+	for endline in endline_list:
+		formatted_run = formatted_run.replace(endline, "<br/>")
+	if len(p_endline_run) <= 32:
+		endline_run_cache[p_endline_run] = formatted_run
+
+	return formatted_run
+
+def intern_symbol(p_string):
+
+	return symbols.setdefault(p_string, p_string)
+
+def intern_symbols(p_strings):
+
+	return [symbols.setdefault(string, string) for string in p_strings]
+
 def get_month_number(p_month_str):
 	
 	return month_dict[p_month_str] if p_month_str in month_dict else "N/A"
@@ -209,9 +393,9 @@ def get_obj_from_dd_month_year(p_date_string):
 	# 		if not (int(date_parts[0]) >= 1 and int(date_parts[0]) <= 31 and
 	# 		   "N/A" != get_month_number(date_parts[1]) and 
 	# 		   int(date_parts[2]) >= 0 and int(date_parts[2]) <= 2018):
-	# 			print date_parts		     
+	# 			print(date_parts)
 	# 	except:
-	# 		print date_parts
+	# 		print(date_parts)
 
 	return date_obj
 
@@ -227,69 +411,469 @@ def update_stat(p_value_to_check, p_stat_dict):
 		else:
 			p_stat_dict[p_value_to_check] += 1
 
+def update_page_stat(p_value_to_check, p_page_stats, p_stat):
+
+	# Page stats dicts are only made once something is counted in them (see WfsPageStats)
+	if len(p_value_to_check.strip()) > 0:
+		update_stat(p_value_to_check, p_page_stats.setdefault(p_stat, {}))
+
+def round_to_hundredths(p_value):
+
+	# Rounded half up to two places and written as the shortest float string ("3.5", "3.67"), as the
+	# Python 2 version of this script did (round() on Python 3 rounds half to even and keeps Decimals)
+	return str(float(decimal.Decimal(p_value).quantize(decimal.Decimal("0.01"), rounding=decimal.ROUND_HALF_UP)))
+
+def replace_file(p_temp_filename, p_filename):
+
+	# Renaming replaces the file atomically on POSIX, but Windows needs the old file removed first
+	if "nt" == os.name and os.path.exists(p_filename):
+		os.remove(p_filename)
+	os.rename(p_temp_filename, p_filename)
+
+def write_json(p_filename, p_json, p_stream_depth=0, p_canonical=False, p_previous=None):
+
+	# With a manifest entry for the file (p_previous), hash the output first, and leave the file as it is
+	# without writing anything if it already has these contents
+	if p_previous is not None:
+		hashing_file = WfsHashingWriter()
+		write_json_entries(hashing_file, p_json, p_stream_depth, p_canonical)
+		if p_previous == hashing_file.output_info():
+			return hashing_file.output_info(), False
+
+	# Write to a temporary file first, so the site never reads a half-written file
+	temp_filename = p_filename + ".tmp"
+	with open(temp_filename, "wb") as output_file:
+		hashing_file = WfsHashingWriter(output_file)
+		write_json_entries(hashing_file, p_json, p_stream_depth, p_canonical)
+
+	return replace_output(temp_filename, p_filename, hashing_file, p_previous)
+
+def write_binary(p_filename, p_json, p_canonical=False, p_previous=None):
+
+	# Same as write_json, in the binary format (see WfsBinaryEncoder)
+	if p_canonical:
+		p_json = canonical_json(p_json)
+	data = WfsBinaryEncoder(p_canonical).encode(p_json)
+
+	hashing_file = WfsHashingWriter()
+	hashing_file.write(data)
+	if p_previous is not None and p_previous == hashing_file.output_info():
+		return hashing_file.output_info(), False
+
+	temp_filename = p_filename + ".tmp"
+	with open(temp_filename, "wb") as output_file:
+		hashing_file = WfsHashingWriter(output_file)
+		hashing_file.write(data)
+
+	return replace_output(temp_filename, p_filename, hashing_file, p_previous)
+
+def read_binary(p_filename):
+
+	# JSON of a binary output, as json.loads would give for the JSON output it was written with
+	with open(p_filename, "rb") as input_file:
+		return WfsBinaryDecoder(input_file.read()).decode()
+
+def binary_filename(p_filename):
+
+	# e.g. wfs_people.wfsb for wfs_people.json
+	return os.path.splitext(p_filename)[0] + "." + binary_format
+
+def replace_output(p_temp_filename, p_filename, p_hashing_file, p_previous):
+
+	# Leave the file as it is if it already has these contents (p_previous is its manifest entry)
+	output_info = p_hashing_file.output_info()
+	if p_previous is not None and p_previous == output_info:
+		os.remove(p_temp_filename)
+		return output_info, False
+
+	replace_file(p_temp_filename, p_filename)
+
+	return output_info, True
+
+def write_json_entries(p_output_file, p_json, p_stream_depth, p_canonical=False):
+
+	# Dictionaries nested less than p_stream_depth deep are written one entry at a time, with the same
+	# separators and key order as json.dumps, so only one entry is ever serialised in memory at once
+	if p_stream_depth <= 0 or not isinstance(p_json, dict):
+		if p_canonical:
+			p_output_file.write(json.dumps(canonical_json(p_json), sort_keys=True))
+		else:
+			p_output_file.write(json.dumps(p_json))
+		return
+
+	p_output_file.write("{")
+	separator = ""
+	for key in (sorted(p_json) if p_canonical else p_json):
+		p_output_file.write(separator + json.dumps(key) + ": ")
+		write_json_entries(p_output_file, p_json[key], p_stream_depth - 1, p_canonical)
+		separator = ", "
+	p_output_file.write("}")
+
+def canonical_json(p_json):
+
+	# Copy of the JSON with its lists of IDs (and other strings) sorted, IDs by number.
+	# Other lists (e.g. a book's pages) keep their order
+	if isinstance(p_json, dict):
+		return dict((key, canonical_json(value)) for key, value in p_json.items())
+	if isinstance(p_json, (list, tuple)):
+		if all(isinstance(item, str) for item in p_json):
+			return sorted(p_json, key=canonical_id_key)
+		return [canonical_json(item) for item in p_json]
+	return p_json
+
+def json_key(p_key):
+
+	# Dict key as json.dumps writes it (e.g. 1 as "1", True as "true")
+	if isinstance(p_key, str):
+		return p_key
+	return json.dumps(p_key)
+
+def canonical_id_key(p_id):
+
+	if p_id.isdigit():
+		return (0, int(p_id), p_id)
+	return (1, 0, p_id)
+
+def hash_file(p_filename):
+
+	sha256 = hashlib.sha256()
+	with open(p_filename, "rb") as input_file:
+		for chunk in iter(lambda: input_file.read(records_chunk_size), b""):
+			sha256.update(chunk)
+
+	return sha256.hexdigest()
+
+def quote_sql_name(p_name):
+
+	# Some fields of the exports have spaces in their names (e.g. "Total Number of Pages in Scrapbook")
+	return "\"" + p_name.replace("\"", "\"\"") + "\""
+
+def schedule_json(p_scheduler, p_filename, p_json, p_stream_depth=0):
+
+	# Write the file now, or leave it to the scheduler to write alongside the other outputs
+	if p_scheduler is None:
+		write_json(p_filename, p_json, p_stream_depth)
+	else:
+		p_scheduler.add(p_filename, p_json, p_stream_depth)
+
+def schedule_entries(p_scheduler, p_output_path, p_output_name, p_entries_dict, p_type, p_build=None, p_shard_count=0):
+
+	# Dictionary output of people, places, or sources by ID, in one file or split into p_shard_count files.
+	# Incremental builds only replace the entries whose stats were recomputed
+	if p_build is not None and not p_build.has_affected(p_type):
+		return
+	if 0 == p_shard_count:
+		output_json = p_entries_dict
+		if p_build is not None:
+			output_json = p_build.patch_entries(p_output_path + p_output_name + ".json", output_json, p_type)
+		schedule_json(p_scheduler, p_output_path + p_output_name + ".json", output_json, 1)
+		return
+
+	# 1. Split the entries into shards by ID, listing the shard of each ID in an index
+	shard_filenames = output_shard_filenames(p_output_name, p_shard_count)
+	shards = [{} for shard_filename in shard_filenames]
+	index = { "shards": shard_filenames, "ids": {} }
+	for entry_id in p_entries_dict:
+		shard = shard_of(entry_id, p_shard_count)
+		shards[shard][entry_id] = p_entries_dict[entry_id]
+		index["ids"][entry_id] = shard
+
+	# 2. Incremental builds only rewrite the shards that affected IDs (including removed ones) fall in
+	affected_shards = None
+	if p_build is not None and p_build.affected_ids(p_type) is not None:
+		affected_shards = set(shard_of(entry_id, p_shard_count) for entry_id in p_build.affected_ids(p_type))
+
+	# 3. Shards are written alongside the other outputs (in parallel if the scheduler has workers)
+	for shard, shard_filename in enumerate(shard_filenames):
+		shard_json = shards[shard]
+		if affected_shards is not None:
+			if shard not in affected_shards:
+				continue
+			shard_json = p_build.patch_entries(p_output_path + shard_filename, shard_json, p_type)
+		schedule_json(p_scheduler, p_output_path + shard_filename, shard_json, 1)
+	schedule_json(p_scheduler, p_output_path + p_output_name + "_index.json", index)
+
+def shard_of(p_id, p_shard_count):
+
+	# CRC-32 puts an ID in the same shard on every run, platform, and Python version (unlike hash)
+	return zlib.crc32(p_id.encode("utf-8")) % p_shard_count
+
+def output_shard_filenames(p_output_name, p_shard_count):
+
+	# e.g. wfs_people_00.json to wfs_people_15.json
+	width = max(2, len(str(p_shard_count - 1)))
+	return ["{0}_{1:0{2}d}.json".format(p_output_name, shard, width) for shard in range(p_shard_count)]
+
 def style_text(p_text, p_substring, p_font_style):
 
 	new_span = "<span style=\"font-style: " + p_font_style + ";\">" + p_substring + "</span>"
-	return string.replace(p_text, p_substring, new_span)
+	return p_text.replace(p_substring, new_span)
 
 def weight_text(p_text, p_substring, p_weight):
 
 	new_span = "<span style=\"font-weight: " + p_weight + ";\">" + p_substring + "</span>"
-	return string.replace(p_text, p_substring, new_span)	
+	return p_text.replace(p_substring, new_span)	
 
 # Helper functions for people, places, sources, and keywords
-def find_associated_pps_helper(p_pps, p_page, p_pps_ids_str, p_pps_on_pages_dict_str):	
-
-	# Save all people associated with this page
-	p_pps["stats"][p_pps_ids_str].extend(p_page[p_pps_ids_str])
-
-	# Note these pps are on this page that this pps is also on
-	for pps_id in p_page[p_pps_ids_str]:
-		if pps_id not in p_pps["stats"][p_pps_on_pages_dict_str]:
-			p_pps["stats"][p_pps_on_pages_dict_str][pps_id] = []
-		p_pps["stats"][p_pps_on_pages_dict_str][pps_id].append(p_page["id"])		
-
 def find_associated_pps(p_pps_collection, p_pages, p_pps_ids_str):
 
 	# Note people, places, and sources found on pages with this pps's in this collection
 	for pps in p_pps_collection:
 
-		for page in p_pages.m_pages:
+		pps_pages = p_pages.pages_with(p_pps_ids_str, pps["id"])
+		for other_ids_str, on_pages_dict_str in associated_pps_types:
 
-			# If this pps is on this page
-			if pps["id"] in page[p_pps_ids_str]:
+			# The pages each of these pps are on that this pps is also on (once per listing on the page),
+			# and these pps once each, in the order found
+			on_pages_dict = {}
+			other_ids = []
+			for page in pps_pages:
+				for other_id in page[other_ids_str]:
+					if other_id in on_pages_dict:
+						on_pages_dict[other_id].append(page["id"])
+					else:
+						on_pages_dict[other_id] = [page["id"]]
+						other_ids.append(other_id)
 
-				# Save all pps associated with this page and,
-				# Note these people are on this page that this source is also on
-				find_associated_pps_helper(pps, page, "people_ids", "people_on_pages_dict")
-				find_associated_pps_helper(pps, page, "places_ids", "places_on_pages_dict")
-				find_associated_pps_helper(pps, page, "sources_ids", "sources_on_pages_dict")
-
-		# De-duplicate the people, places, and sources ID lists
-		pps["stats"]["people_ids"] = list(set(pps["stats"]["people_ids"]))			
-		pps["stats"]["places_ids"] = list(set(pps["stats"]["places_ids"]))
-		pps["stats"]["sources_ids"] = list(set(pps["stats"]["sources_ids"]))
+			pps["stats"][on_pages_dict_str] = on_pages_dict
+			pps["stats"][other_ids_str] = other_ids
 
 		# Remove the pps' own ID from the pps type list it would belong to
 		if pps["id"] in pps["stats"][p_pps_ids_str]:
-			pps["stats"][p_pps_ids_str].remove(pps["id"])		
+			pps["stats"][p_pps_ids_str].remove(pps["id"])
+
+def diff_record_fields(p_old_entry, p_new_entry):
+
+	# Fields whose values differ between two versions of a record, as field: [old, new]
+	field_diffs = {}
+	for field in p_old_entry:
+		if field not in p_new_entry:
+			field_diffs[field] = [p_old_entry[field], None]
+		elif p_old_entry[field] != p_new_entry[field]:
+			field_diffs[field] = [p_old_entry[field], p_new_entry[field]]
+	for field in p_new_entry:
+		if field not in p_old_entry:
+			field_diffs[field] = [None, p_new_entry[field]]
+
+	return field_diffs
+
+def diff_exports(p_old_input_path, p_old_date, p_new_input_path, p_new_date):
+
+	changelog = { "old_date": p_old_date, "new_date": p_new_date, "tables": {} }
+
+	for table, key_field, ref_fields in export_tables:
+
+		# 1. Hash the old export's records by primary key
+		old_records = {}
+		for entry in read_records(export_filename(p_old_input_path, table, p_old_date)):
+			old_records[entry[key_field]] = entry
+
+		# 2. Stream the new export's records, looking each up by primary key
+		table_changes = { "added": [], "removed": [], "changed": [] }
+		for entry in read_records(export_filename(p_new_input_path, table, p_new_date)):
+
+			key = entry[key_field]
+			if key not in old_records:
+				table_changes["added"].append(entry)
+				continue
+
+			field_diffs = diff_record_fields(old_records.pop(key), entry)
+			if len(field_diffs) > 0:
+				table_changes["changed"].append({ "key": key, "fields": field_diffs })
+
+		# 3. Old records not found in the new export were removed
+		for key in sorted(old_records, key=canonical_id_key):
+			table_changes["removed"].append(old_records[key])
+
+		changelog["tables"][table] = table_changes
+
+	return changelog
+
+def export_filename(p_input_path, p_table, p_json_file_date):
+
+	return p_input_path + "{0}_{1}.json".format(p_table, p_json_file_date)
+
+def read_records(p_filename, p_chunk_size=records_chunk_size):
+
+	# Yields the entries of the "RECORDS" array in an export's JSON file one at a time,
+	# decoding them from a buffer refilled chunk by chunk (so the whole file is never in memory)
+	decoder = json.JSONDecoder()
+	with open(p_filename, "r", encoding="utf-8") as input_file:
+
+		buffer = input_file.read(p_chunk_size)
+		position = 0
+		at_end_of_file = 0 == len(buffer)
+
+		# 1. Find the start of the RECORDS array
+		records_start = records_start_regex.search(buffer)
+		while records_start is None and not at_end_of_file:
+			chunk = input_file.read(p_chunk_size)
+			at_end_of_file = 0 == len(chunk)
+			buffer += chunk
+			records_start = records_start_regex.search(buffer)
+		if records_start is None:
+			raise ValueError("No RECORDS array found in {0}".format(p_filename))
+		position = records_start.end()
+
+		# 2. Decode each record in the array. Records are separated by exactly one comma
+		after_record = False
+		after_comma = False
+		while True:
+
+			position = records_whitespace_regex.match(buffer, position).end()
+
+			# Refill the buffer when it runs out
+			if position == len(buffer):
+				if at_end_of_file:
+					raise ValueError("Unterminated RECORDS array in {0}".format(p_filename))
+				buffer = input_file.read(p_chunk_size)
+				position = 0
+				at_end_of_file = 0 == len(buffer)
+				continue
+
+			if after_record:
+				if "]" == buffer[position]:
+					break
+				if "," != buffer[position]:
+					raise ValueError("Expected , or ] after a record of the RECORDS array in {0}".format(p_filename))
+				position += 1
+				after_record = False
+				after_comma = True
+				continue
+			if buffer[position] in ",]":
+				if "]" == buffer[position] and not after_comma:
+					break
+				raise ValueError("Expected a record of the RECORDS array in {0}".format(p_filename))
+
+			# A record cut off by the end of the buffer is decoded again once more has been read, and so is one
+			# not yet followed by whitespace, a comma, or the end of the array (a number cut off by the end of
+			# the buffer, e.g. 12 of 12345 or 1.5 of 1.5e3, would otherwise decode as a shorter number)
+			try:
+				entry, record_end = decoder.raw_decode(buffer, position)
+			except ValueError:
+				if at_end_of_file:
+					raise ValueError("Malformed record in the RECORDS array of {0} at {1!r}".format(
+						p_filename, buffer[position:position + 32]))
+				record_end = None
+			if record_end is None or \
+			   (not at_end_of_file and (record_end == len(buffer) or buffer[record_end] not in " \t\n\r,]")):
+				chunk = input_file.read(p_chunk_size)
+				at_end_of_file = 0 == len(chunk)
+				buffer = buffer[position:] + chunk
+				position = 0
+				continue
+
+			position = record_end
+			after_record = True
+			after_comma = False
+			yield entry
+
+def fingerprint_record(p_json_entry):
+
+	# Short content hash of an export record (stable across key order)
+	return hashlib.sha1(json.dumps(p_json_entry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def find_page_entities(p_page, p_pps_ids_str, p_pps_dict, p_pps_type):
+
+	# Look up each person, place, or source on this page once
+	entities = []
+	seen_ids = set()
+	for pps_id in p_page[p_pps_ids_str]:
+
+		if pps_id in seen_ids:
+			continue
+		seen_ids.add(pps_id)
+
+		if pps_id in p_pps_dict:
+			entities.append(p_pps_dict[pps_id])
+		else:
+			print("Could not find {0} with ID {1} listed on page {2}".format(
+				p_pps_type, pps_id, p_page["id"]))
+
+	# Keep the order of the (ID-sorted) people, places, and sources tables
+	return sorted(entities, key=lambda x: int(x["id"]))
+
+def find_associated_books_and_pages_in_store(p_pps_collection, p_store, p_pps_ids_str):
+
+	# Book and page IDs of the pages each pps is on (in page order), from the staging store's join tables
+	pps_dict = dict((pps["id"], pps) for pps in p_pps_collection)
+	for pps_id, book_id, page_id in p_store.entity_pages(p_pps_ids_str):
+		if pps_id in pps_dict:
+			book_and_page_ids = pps_dict[pps_id]["stats"]["book_and_page_ids"]
+			if book_id not in book_and_page_ids:
+				book_and_page_ids[intern_symbol(book_id)] = []
+			book_and_page_ids[book_id].append(intern_symbol(page_id))
 
 def find_associated_keywords(p_pps_collection, p_pages, p_pps_ids_str):
 
 	# Add keywords from pages that each pps is on
 	for pps in p_pps_collection:
-		for page in p_pages.m_pages:
-			if pps["id"] in page[p_pps_ids_str]:
-				pps["stats"]["keywords_ids"].extend(page["keywords"])
-				pps["stats"]["ukat_keywords_ids"].extend(page["ukat_keywords"])
+		for page in p_pages.pages_with(p_pps_ids_str, pps["id"]):
+			pps["stats"]["keywords_ids"].extend(page["keywords"])
+			pps["stats"]["ukat_keywords_ids"].extend(page["ukat_keywords"])
 
 
 
+class WfsOrderedCounter(object):
+
+	# Counts of IDs (or other keys), which also serves as a set of them in the order they were first counted
+	__slots__ = ("m_counts", "m_keys")
+
+	def __init__(self, p_keys=None):
+
+		self.m_counts = {}
+		self.m_keys = []
+		if p_keys is not None:
+			self.update(p_keys)
+
+	def __contains__(self, p_key):
+
+		return p_key in self.m_counts
+
+	def __getitem__(self, p_key):
+
+		return self.m_counts.get(p_key, 0)
+
+	def __iter__(self):
+
+		return iter(self.m_keys)
+
+	def __len__(self):
+
+		return len(self.m_keys)
+
+	def add(self, p_key, p_count=1):
+
+		if p_key in self.m_counts:
+			self.m_counts[p_key] += p_count
+		else:
+			self.m_counts[p_key] = p_count
+			self.m_keys.append(p_key)
+
+	def update(self, p_keys):
+
+		counts = self.m_counts
+		for key in p_keys:
+			if key in counts:
+				counts[key] += 1
+			else:
+				counts[key] = 1
+				self.m_keys.append(key)
+
+	def keys(self):
+
+		return list(self.m_keys)
+
+
 class WfsScrapBooks:
 
-	def __init__(self, p_book_json_filename):
+	def __init__(self, p_book_json_filename, p_store=None):
 
 		self.m_book_json_filename = p_book_json_filename
+
+		# Staging store the export's tables are read from (optional, see WfsStagingStore)
+		self.m_store = p_store
+
 		self.m_collection = { "stats": {} }
 		self.m_books = [];
 		self.ingest()
@@ -297,52 +881,70 @@ class WfsScrapBooks:
 	def debug_output(self):
 
 		for book in self.m_books:
-			print "\n============================"
-			print "Scrapbook {0}".format(book["number"])
-			print book
+			print("\n============================")
+			print("Scrapbook {0}".format(book["number"]))
+			print(book)
 
 	def debug_stats(self):
 
 		for book in self.m_books:
-			print "\n============================"
-			print "Scrapbook {0}".format(book["number"])
+			print("\n============================")
+			print("Scrapbook {0}".format(book["number"]))
 			for key in book["stats"]:
-				print "{0}: {1}".format(key, book["stats"][key])
+				print("{0}: {1}".format(key, book["stats"][key]))
 
 	def ingest(self):
 
-		with open(self.m_book_json_filename, "rU") as input_file:
+		# Save each book entry
+		entries = read_records(self.m_book_json_filename) if self.m_store is None else self.m_store.records("Scrapbook")
+		for entry in entries:
+			self.save_book(entry)
 
-			# Read the JSON
-			book_json = json.loads(input_file.read())
+		# Sort the books by collection number
+		self.m_books = sorted(self.m_books, key=lambda x: int(x["number"]), reverse=False)
 
-			# Save each book entry
-			for entry in book_json["RECORDS"]:
-				self.save_book(entry)
-
-			# Sort the books by collection number
-			self.m_books = sorted(self.m_books, key=lambda x: int(x["number"]), reverse=False)
-
-	def output(self, p_pages, p_output_path):
+	def output(self, p_pages, p_output_path, p_build=None, p_scheduler=None):
 
 		# 1. Output stats for collection overview
 		output_filename = "wfs_collection_overview.json"
 		output_json = self.m_collection["stats"]
-		with open(p_output_path + output_filename, "w") as output_file:
-			output_file.write(json.dumps(output_json))
+		schedule_json(p_scheduler, p_output_path + output_filename, output_json)
 
 		# 2. Output stats for each book
 		for book in self.m_books:
 
+			# Incremental builds only rewrite books affected by changed records
+			if p_build is not None and not p_build.is_book_affected(book["id"]):
+				continue
+
 			# Filename per book w/ name format wfs_<id>_scrapbook<number>.json
 			output_filename = "wfs_scrapbook_{0:02d}.json".format(int(book["number"]))
 
 			# JSON will include book data and pages data
-			output_json = { "book": book, "pages": p_pages.m_pages_by_book_dict[book["id"]] }
+			output_json = { "book": book, "pages": p_pages.output_pages(book["id"]) }
 
 			# Output the combined book and pages data
-			with open(p_output_path + output_filename, "w") as output_file:
-				output_file.write(json.dumps(output_json))
+			schedule_json(p_scheduler, p_output_path + output_filename, output_json)
+
+	def output_filenames(self, p_shard_count=0, p_binary=False):
+
+		# Files written by a build: the collection overview and each book, and the dictionaries
+		# (people, places, and sources may be split into shards with an index, see schedule_entries),
+		# and the binary form of each (see WfsBinaryEncoder)
+		output_filenames = ["wfs_collection_overview.json"]
+		for book in self.m_books:
+			output_filenames.append("wfs_scrapbook_{0:02d}.json".format(int(book["number"])))
+		for output_name in ["wfs_people", "wfs_places", "wfs_sources"]:
+			if 0 == p_shard_count:
+				output_filenames.append(output_name + ".json")
+			else:
+				output_filenames.extend(output_shard_filenames(output_name, p_shard_count))
+				output_filenames.append(output_name + "_index.json")
+		output_filenames.append("wfs_keywords.json")
+		if p_binary:
+			output_filenames.extend([binary_filename(output_filename) for output_filename in output_filenames])
+
+		return output_filenames
 
 	def save_book(self, p_json_entry):
 
@@ -379,7 +981,7 @@ class WfsScrapBooks:
 		self.m_books.append({
 
 			# Record data
-			"id": p_json_entry["Scrapbook_Id"],
+			"id": intern_symbol(p_json_entry["Scrapbook_Id"]),
 			"number": p_json_entry["Scrapbook_number"],
 			"pages": p_json_entry["Scrapbook_pg_range"],
 			"begin_date": begin_date,
@@ -454,7 +1056,7 @@ class WfsScrapBooks:
 
 		# De-duplicate roles for people
 		for person_id in self.m_collection["stats"]["roles_by_people_ids"]:
-			self.m_collection["stats"]["roles_by_people_ids"][person_id] = list(set(self.m_collection["stats"]["roles_by_people_ids"][person_id]))		
+			self.m_collection["stats"]["roles_by_people_ids"][person_id] = WfsOrderedCounter(self.m_collection["stats"]["roles_by_people_ids"][person_id]).keys()		
 
 		# Collection level
 		role_types = []
@@ -470,7 +1072,7 @@ class WfsScrapBooks:
 
 		# De-duplicate roles for people
 		for person_id in self.m_collection["stats"]["roles_by_people_ids"]:
-			self.m_collection["stats"]["roles_by_people_ids"][person_id] = list(set(self.m_collection["stats"]["roles_by_people_ids"][person_id]))
+			self.m_collection["stats"]["roles_by_people_ids"][person_id] = WfsOrderedCounter(self.m_collection["stats"]["roles_by_people_ids"][person_id]).keys()
 
 	def save_source_types(self, p_sources):
 
@@ -493,7 +1095,7 @@ class WfsScrapBooks:
 		for key in source_type_counter:
 			self.m_collection["stats"]["source_type_counts"][key] = source_type_counter[key]
 
-	def save_stats(self, p_pages):
+	def save_stats(self, p_pages, p_canonical=False):
 
 		# 1. Tally book stats
 
@@ -519,20 +1121,30 @@ class WfsScrapBooks:
 		# "places_ids_dict": {},
 		# "sources_ids_dict": {},
 
+		# With a staging store, people, places, and sources are counted per book by the store
+		store_counters = None if self.m_store is None else self.store_counters()
+
 		for book in self.m_books:
 
 			clipping_counts = []
 			clipping_w_metadata_counts = []
-			people_ids = []
-			places_ids = []
-			sources_ids = []
+
+			# People, places, and sources on the book's pages, counted in the order found
+			if store_counters is None:
+				people_counter = WfsOrderedCounter()
+				places_counter = WfsOrderedCounter()
+				sources_counter = WfsOrderedCounter()
+			else:
+				people_counter = store_counters["people_ids"].get(book["id"], WfsOrderedCounter())
+				places_counter = store_counters["places_ids"].get(book["id"], WfsOrderedCounter())
+				sources_counter = store_counters["sources_ids"].get(book["id"], WfsOrderedCounter())
 
 			for page in p_pages.m_pages_by_book_dict[book["id"]]:
 
 				if book["id"] == page["book_id"]:
 
 					# if "" in page["places_ids"]:
-					# 	print "FOUND blank place on page {0} in book {1}".format(page["id"], book["number"])
+					# 	print("FOUND blank place on page {0} in book {1}".format(page["id"], book["number"]))
 
 					# Tally page count	
 					book["stats"]["pages"] += 1
@@ -577,10 +1189,11 @@ class WfsScrapBooks:
 						# Save the page to the dictionaries for with/without original material
 						book["stats"]["pages_w_orig_material_dict"][page["orig_material"]].append(page["id"])
 					
-					# Add persons, places, sources
-					book["stats"]["people_ids"].extend(page["people_ids"])
-					book["stats"]["places_ids"].extend(page["places_ids"])
-					book["stats"]["sources_ids"].extend(page["sources_ids"])
+					# Count persons, places, sources
+					if store_counters is None:
+						people_counter.update(page["people_ids"])
+						places_counter.update(page["places_ids"])
+						sources_counter.update(page["sources_ids"])
 
 					# Tally continents
 					for continent in page["stats"]["continent_counts"]:
@@ -599,23 +1212,20 @@ class WfsScrapBooks:
 
 			# Calculate and save the average number of clippings per page (rounded to two places)
 			book["stats"]["avg_clipping_per_page"] = float(sum(clipping_counts)) / float(len(clipping_counts))
-			book["stats"]["avg_clipping_per_page"] = str(round(decimal.Decimal(book["stats"]["avg_clipping_per_page"]), 2))
+			book["stats"]["avg_clipping_per_page"] = round_to_hundredths(book["stats"]["avg_clipping_per_page"])
 
 			# Tally people, place, source counts
-			people_counter = Counter(book["stats"]["people_ids"])
-			for key in people_counter.keys():
+			for key in people_counter:
 				book["stats"]["people_ids_dict"][key] = people_counter[key]
-			places_counter = Counter(book["stats"]["places_ids"])
-			for key in places_counter.keys():
+			for key in places_counter:
 				book["stats"]["places_ids_dict"][key] = places_counter[key]
-			sources_counter = Counter(book["stats"]["sources_ids"])
-			for key in sources_counter.keys():
+			for key in sources_counter:
 				book["stats"]["sources_ids_dict"][key] = sources_counter[key]
 
 			# Keep unique people, place, and source IDs
-			book["stats"]["people_ids"] = list(set(book["stats"]["people_ids"]))
-			book["stats"]["places_ids"] = list(set(book["stats"]["places_ids"]))
-			book["stats"]["sources_ids"] = list(set(book["stats"]["sources_ids"]))
+			book["stats"]["people_ids"] = people_counter.keys()
+			book["stats"]["places_ids"] = places_counter.keys()
+			book["stats"]["sources_ids"] = sources_counter.keys()
 
 		# 2. Tally collection stats
 		self.m_collection["stats"]["pages"] = 0
@@ -681,32 +1291,263 @@ class WfsScrapBooks:
 
 		# Finish calculation of average number of clippings per book
 		self.m_collection["stats"]["avg_clippings_per_book"] /= float(len(self.m_books))
-		self.m_collection["stats"]["avg_clippings_per_book"] = str(round(decimal.Decimal(self.m_collection["stats"]["avg_clippings_per_book"]), 2))
+		self.m_collection["stats"]["avg_clippings_per_book"] = round_to_hundredths(self.m_collection["stats"]["avg_clippings_per_book"])
 
-		# Create IDs for keywords (for keyword pages/routing)
+		# Create IDs for keywords (for keyword pages/routing), numbered alphabetically for canonical outputs
 		keyword_id = 1
-		for keyword in self.m_collection["stats"]["keyword_count_dict"]:
+		keywords = self.m_collection["stats"]["keyword_count_dict"]
+		if p_canonical:
+			keywords = sorted(keywords)
+		for keyword in keywords:
 			self.m_collection["stats"]["keywords_to_ids"][keyword] = str(keyword_id)
 			self.m_collection["stats"]["ids_to_keywords"][str(keyword_id)] = keyword
 			keyword_id += 1
 
+	def store_counters(self):
+
+		# Counters of the people, places, and sources on each book's pages, by ID list and book ID
+		store_counters = {}
+		for ids_str in ["people_ids", "places_ids", "sources_ids"]:
+			store_counters[ids_str] = {}
+			for book_id, pps_id, count in self.m_store.book_entity_counts(ids_str):
+				if book_id not in store_counters[ids_str]:
+					store_counters[ids_str][book_id] = WfsOrderedCounter()
+				store_counters[ids_str][book_id].add(intern_symbol(pps_id), count)
+		return store_counters
+
+
+class WfsIdTable:
+
+	# Interns ID and term (keyword, orientation, role) strings as small integers, shared by the compact pages
+	def __init__(self):
+
+		self.m_ints_by_string = {}
+		self.m_strings = []
+
+	def intern(self, p_string):
+
+		if p_string not in self.m_ints_by_string:
+			self.m_ints_by_string[p_string] = len(self.m_strings)
+			self.m_strings.append(p_string)
+
+		return self.m_ints_by_string[p_string]
+
+
+class WfsIdList(object):
+
+	# List of ID strings stored as an array of their interned integers
+	__slots__ = ("m_table", "m_ints")
+
+	def __init__(self, p_table, p_strings=None):
+
+		self.m_table = p_table
+		self.m_ints = array.array("i")
+		if p_strings is not None:
+			self.extend(p_strings)
+
+	def __contains__(self, p_string):
+
+		return p_string in self.m_table.m_ints_by_string and \
+			   self.m_table.m_ints_by_string[p_string] in self.m_ints
+
+	def __getitem__(self, p_index):
+
+		return self.m_table.m_strings[self.m_ints[p_index]]
+
+	def __iter__(self):
+
+		strings = self.m_table.m_strings
+		for string_int in self.m_ints:
+			yield strings[string_int]
+
+	def __len__(self):
+
+		return len(self.m_ints)
+
+	def append(self, p_string):
+
+		self.m_ints.append(self.m_table.intern(p_string))
+
+	def extend(self, p_strings):
+
+		for string in p_strings:
+			self.append(string)
+
+	def to_list(self):
+
+		return list(self)
+
+
+class WfsPageStats(object):
+
+	# Page stats whose dicts are only made once something is counted in them (most stay empty)
+	__slots__ = ("people_dates_lived", "people_nationalities", "people_genders", "people_epithets",
+				 "place_counts_dict", "sources_places", "source_dates", "sources_rights_holders",
+				 "continent_counts")
+
+	# What stats nothing was counted in read as (read-only, so that counts go through setdefault)
+	empty_stat = MappingProxyType({})
+
+	def __init__(self):
+
+		for field in WfsPageStats.__slots__:
+			setattr(self, field, None)
+
+	def __contains__(self, p_field):
+
+		return p_field in WfsPageStats.__slots__
+
+	def __getitem__(self, p_field):
+
+		stat = getattr(self, p_field)
+		return stat if stat is not None else WfsPageStats.empty_stat
+
+	def __iter__(self):
+
+		return iter(WfsPageStats.__slots__)
+
+	def setdefault(self, p_field, p_default):
+
+		# Same as dict.setdefault, for the stats counted in
+		if getattr(self, p_field) is None:
+			setattr(self, p_field, p_default)
+		return getattr(self, p_field)
+
+	def to_dict(self):
+
+		# Same literal as the stats section of WfsPages.save_page, so that its keys are written in the same order
+		stats = {
+
+			"people_dates_lived": {},
+			"people_nationalities": {},
+			"people_genders": {},
+			"people_epithets": {},
+
+			"place_counts_dict": {},
+
+			"sources_places": {},
+			"source_dates": {},
+			"sources_rights_holders": {},
+
+			"continent_counts": {},
+		}
+		for field in WfsPageStats.__slots__:
+			if getattr(self, field) is not None:
+				stats[field] = getattr(self, field)
+
+		return stats
+
+
+class WfsPage(object):
+
+	# Compact page record, with the same fields as the dicts made by WfsPages.save_page
+	__slots__ = ("id", "number", "suffix", "book_id", "desc", "foldout", "clippings",
+				 "clippings_w_metadata", "keywords", "ukat_keywords", "orientations",
+				 "orig_material", "notes", "people_ids", "places_ids", "sources_ids",
+				 "people_roles", "stats")
+
+	# ID and term lists stored as interned integers
+	id_list_fields = ["people_ids", "places_ids", "sources_ids"]
+	term_list_fields = ["keywords", "ukat_keywords", "orientations"]
+
+	def __init__(self, p_page_dict, p_id_table, p_term_table):
+
+		for field in WfsPage.__slots__:
+			setattr(self, field, p_page_dict[field])
+		for field in WfsPage.id_list_fields:
+			setattr(self, field, WfsIdList(p_id_table, p_page_dict[field]))
+		for field in WfsPage.term_list_fields:
+			setattr(self, field, WfsIdList(p_term_table, p_page_dict[field]))
+		self.stats = WfsPageStats()
+
+	def __contains__(self, p_field):
+
+		return p_field in WfsPage.__slots__
+
+	def __getitem__(self, p_field):
+
+		return getattr(self, p_field)
+
+	def __setitem__(self, p_field, p_value):
+
+		setattr(self, p_field, p_value)
+
+	def to_dict(self):
+
+		# Same literal as WfsPages.save_page, so that the page's keys are written in the same order
+		return {
+
+			"id": self.id,
+			"number": self.number,
+			"suffix": self.suffix,
+			"book_id": self.book_id,
+			"desc": self.desc,
+			"foldout": self.foldout,
+			"clippings": self.clippings,
+			"clippings_w_metadata": self.clippings_w_metadata,
+			"keywords": self.keywords.to_list(),
+			"ukat_keywords": self.ukat_keywords.to_list(),
+			"orientations": self.orientations.to_list(),
+			"orig_material": self.orig_material,
+			"notes": self.notes,
+			"people_ids": self.people_ids.to_list(),
+			"places_ids": self.places_ids.to_list(),
+			"sources_ids": self.sources_ids.to_list(),
+			"people_roles": self.people_roles,
+
+			# Stats section
+			"stats": self.stats.to_dict()
+		}
+
 
 class WfsPages:
 
+	# Page stats counted by the staging store: the pages' ID list, the field of the export counted, and the stat
+	store_stats = [
+		("people_ids", "Associated_Person_nationality", "people_nationalities"),
+		("people_ids", "Associated_Person_gender", "people_genders"),
+		("people_ids", "Associated_Person_epithets", "people_epithets"),
+		("sources_ids", "Page_Associated_Sources_associated_place", "sources_places"),
+		("sources_ids", "Page_Associated_Source_rights_holder", "sources_rights_holders"),
+		("places_ids", "Place_name_continents", "continent_counts")
+	]
+
 	def __init__(
 		self, 
 		p_page_json_filename, 
 		p_peoplejoin_json_filename, 
 		p_placesjoin_json_filename, 
-		p_sourcesjoin_json_filename):
+		p_sourcesjoin_json_filename,
+		p_description_cache=None,
+		p_compact=False,
+		p_store=None,
+		p_canonical=False):
 
 		self.m_page_json_filename = p_page_json_filename
 		self.m_peoplejoin_json_filename = p_peoplejoin_json_filename
 		self.m_placesjoin_json_filename = p_placesjoin_json_filename
 		self.m_sourcesjoin_json_filename = p_sourcesjoin_json_filename
+
+		# Descriptions rendered by earlier runs (optional)
+		self.m_description_cache = p_description_cache
+
+		# Staging store the export's tables are read from (optional, see WfsStagingStore)
+		self.m_store = p_store
+
+		# Canonical builds keep pages in ID order, whatever order the export lists them in
+		self.m_canonical = p_canonical
+
+		# Compact pages keep their ID and term lists as interned integers (see WfsPage)
+		self.m_compact = p_compact
+		self.m_id_table = WfsIdTable()
+		self.m_term_table = WfsIdTable()
 		
 		self.m_pages = []
 		self.m_pages_by_book_dict = {}
+		self.m_pages_by_id_dict = {}
+
+		# Inverted index of pages by the people, places, sources, and keywords on them
+		self.m_pages_by_entity_dict = {}
 
 		self.ingest()
 
@@ -720,21 +1561,25 @@ class WfsPages:
 		# "Creator_item_desc":"",
 		# "Creator_item_links":""
 
-		for index in range(len(self.m_pages)):
+		# Join records can refer to pages outside of this export's subset
+		if p_json_entry["Page_Id_Join"] not in self.m_pages_by_id_dict:
+			return
+		page = self.m_pages_by_id_dict[p_json_entry["Page_Id_Join"]]
 
-			if p_json_entry["Page_Id_Join"] == self.m_pages[index]["id"]:
-
-				person_id = p_json_entry["Associated_Person_Id_Join"]
-				
-				# Associate the person to this page
-				self.m_pages[index]["people_ids"].append(person_id)
-
-				# Indicate what roles this person plays on this page
-				if person_id not in self.m_pages[index]["people_roles"]:
-					self.m_pages[index]["people_roles"][person_id] = []
-				self.m_pages[index]["people_roles"][person_id].append(p_json_entry["Associated_Person_Role"])
-
-				break
+		person_id = intern_symbol(p_json_entry["Associated_Person_Id_Join"])
+		
+		# Associate the person to this page
+		page["people_ids"].append(person_id)
+
+		# Indicate what roles this person plays on this page
+		# (compact pages keep them as tuples of role strings shared between pages)
+		if self.m_compact:
+			role = intern_symbol(p_json_entry["Associated_Person_Role"])
+			page["people_roles"][person_id] = page["people_roles"].get(person_id, ()) + (role,)
+			return
+		if person_id not in page["people_roles"]:
+			page["people_roles"][person_id] = []
+		page["people_roles"][person_id].append(intern_symbol(p_json_entry["Associated_Person_Role"]))
 
 	def associate_place_to_page(self, p_json_entry):
 
@@ -742,12 +1587,11 @@ class WfsPages:
 		# "Page_Id_Join_5":"3",
 		# "Places_Named_Id_Join":"1"
 
-		for index in range(len(self.m_pages)):
-			if p_json_entry["Page_Id_Join_5"] == self.m_pages[index]["id"]:
-				if "" == p_json_entry["Places_Named_Id_Join"]:
-					continue
-				self.m_pages[index]["places_ids"].append(p_json_entry["Places_Named_Id_Join"])
-				break
+		if p_json_entry["Page_Id_Join_5"] not in self.m_pages_by_id_dict:
+			return
+		if "" == p_json_entry["Places_Named_Id_Join"]:
+			return
+		self.m_pages_by_id_dict[p_json_entry["Page_Id_Join_5"]]["places_ids"].append(intern_symbol(p_json_entry["Places_Named_Id_Join"]))
 
 	def associate_source_to_page(self, p_json_entry):
 
@@ -760,53 +1604,111 @@ class WfsPages:
 		# "Source_link_to_page_content":"",
 		# "Page_Associated_Sources_Join_notes":""		
 		
-		for index in range(len(self.m_pages)):
-			if p_json_entry["Page_Id_Join_2"] == self.m_pages[index]["id"]:
-				self.m_pages[index]["sources_ids"].append(p_json_entry["Associated_Sources_Id_Join"])
-				break
+		if p_json_entry["Page_Id_Join_2"] not in self.m_pages_by_id_dict:
+			return
+		self.m_pages_by_id_dict[p_json_entry["Page_Id_Join_2"]]["sources_ids"].append(intern_symbol(p_json_entry["Associated_Sources_Id_Join"]))
 
 	def debug_output(self):
 
 		for page in self.m_pages:
-			print page
+			print(page)
 
 	def debug_stats(self):
 
 		for page in self.m_pages:
-			print page["stats"]
+			print(page["stats"])
 
 	def ingest(self):
 
 		# 1. Read and sort pages JSON
-		self.ingest_helper(self.m_page_json_filename, self.save_page)
+		self.ingest_helper(self.m_page_json_filename, self.save_page, "Scrapbook_Page")
+		if self.m_canonical:
+			self.m_pages = sorted(self.m_pages, key=lambda x: canonical_id_key(x["id"]))
 		self.m_pages = sorted(self.m_pages, key=lambda x: int(x["book_id"]), reverse=False)
 
-		# Populate the pages by book dict
+		# Populate the pages by book and pages by ID dicts
+		self.make_dict()
+
+		# 2. Add associated person IDs to pages
+		self.ingest_helper(self.m_peoplejoin_json_filename, self.associate_person_to_page, "people_ids")
+
+		# 3. Add associated place IDs to pages
+		self.ingest_helper(self.m_placesjoin_json_filename, self.associate_place_to_page, "places_ids")
+
+		# 4. Add associated source IDs to pages
+		self.ingest_helper(self.m_sourcesjoin_json_filename, self.associate_source_to_page, "sources_ids")
+
+		# 5. Index pages by the people, places, sources, and keywords on them
+		self.make_entity_index()
+
+	def ingest_helper(self, p_filename, p_save_function, p_store_records):
+
+		# Save each entry (with a staging store, the pages table or the join records of the pages' ID list
+		# p_store_records whose pages are in the export)
+		if self.m_store is None:
+			entries = read_records(p_filename)
+		elif "Scrapbook_Page" == p_store_records:
+			entries = self.m_store.records(p_store_records)
+		else:
+			entries = self.m_store.page_join_records(p_store_records)
+		for entry in entries:
+			p_save_function(entry)			
+				
+	def make_dict(self):
+
 		for page in self.m_pages:
+
+			# Create a dict for pages by book ID
 			if page["book_id"] not in self.m_pages_by_book_dict:
 				self.m_pages_by_book_dict[page["book_id"]] = []
 			self.m_pages_by_book_dict[page["book_id"]].append(page)
 
-		# 2. Add associated person IDs to pages
-		self.ingest_helper(self.m_peoplejoin_json_filename, self.associate_person_to_page)
+			# Create a dict for pages by ID (join records resolve their pages through this)
+			if page["id"] not in self.m_pages_by_id_dict:
+				self.m_pages_by_id_dict[page["id"]] = page
+			else:
+				print("Duplicate page listings for {0}".format(page["id"]))
 
-		# 3. Add associated place IDs to pages
-		self.ingest_helper(self.m_placesjoin_json_filename, self.associate_place_to_page)
+	def make_entity_index(self):
 
-		# 4. Add associated source IDs to pages
-		self.ingest_helper(self.m_sourcesjoin_json_filename, self.associate_source_to_page)
+		# Single pass over all pages, listing each page once per entity ID found on it
+		self.m_pages_by_entity_dict = { "people_ids": {}, "places_ids": {}, "sources_ids": {}, "keywords": {} }
+		for page in self.m_pages:
+			for ids_str in self.m_pages_by_entity_dict:
+				entity_index = self.m_pages_by_entity_dict[ids_str]
+				for entity_id in page[ids_str]:
+					if entity_id not in entity_index:
+						entity_index[entity_id] = [page]
+					elif entity_index[entity_id][-1] is not page:
+						entity_index[entity_id].append(page)
 
-	def ingest_helper(self, p_filename, p_save_function):
+	def output_pages(self, p_book_id):
 
-		with open(p_filename, "rU") as input_file:
+		# Pages of the book in the dict shape written to its scrapbook file
+		if not self.m_compact:
+			return self.m_pages_by_book_dict[p_book_id]
+		return [page.to_dict() for page in self.m_pages_by_book_dict[p_book_id]]
 
-			# Read the JSON
-			my_json = json.loads(input_file.read())
+	def pages_with(self, p_ids_str, p_entity_id):
+
+		# Pages (in page order) whose ID list p_ids_str contains the given person, place, source, or keyword
+		return self.m_pages_by_entity_dict[p_ids_str].get(p_entity_id, [])
+
+	def top_cooccurrences(self, p_ids_str, p_entity_id, p_other_ids_str, p_count=None):
+
+		# The entities of ID list p_other_ids_str sharing the most pages with the given one (all of them by default),
+		# as (ID, pages shared) pairs, ties by ID
+		pages_shared = Counter()
+		for page in self.pages_with(p_ids_str, p_entity_id):
+			pages_shared.update(set(page[p_other_ids_str]))
+
+		# An entity does not co-occur with itself
+		if p_ids_str == p_other_ids_str:
+			pages_shared.pop(p_entity_id, None)
+
+		ranked = sorted(pages_shared.items(), key=lambda item: (-item[1], item[0]))
+		return ranked if p_count is None else ranked[:p_count]
 
-			# Save each entry
-			for entry in my_json["RECORDS"]:
-				p_save_function(entry)			
-				
 	def save_page(self, p_json_entry):
 
 		# "Page_Id":"1",
@@ -824,20 +1726,21 @@ class WfsPages:
 		# "Page_notes":"",
 		# "Page_image_id":"MS_Morgan_C_1_0001"
 		
-		self.m_pages.append({
+		page = {
 
-			"id": p_json_entry["Page_Id"],
+			"id": intern_symbol(p_json_entry["Page_Id"]),
 			"number": p_json_entry["Page_number"],
-			"suffix": p_json_entry["Page_Number_suffix"],
-			"book_id": p_json_entry["Scrapbook_Id"],
-			"desc": format_description(p_json_entry["Page_desc"]),
-			"foldout": p_json_entry["Page_foldout"],
+			"suffix": intern_symbol(p_json_entry["Page_Number_suffix"]),
+			"book_id": intern_symbol(p_json_entry["Scrapbook_Id"]),
+			"desc": format_description(p_json_entry["Page_desc"]) if self.m_description_cache is None else \
+					self.m_description_cache.render(p_json_entry["Page_desc"]),
+			"foldout": intern_symbol(p_json_entry["Page_foldout"]),
 			"clippings": int(p_json_entry["Page_clipping_count"]),
 			"clippings_w_metadata": int(p_json_entry["Page_clipping_w_metadata_count"]),
-			"keywords": p_json_entry["Page_keywords"].split(", "),
-			"ukat_keywords": p_json_entry["Page_UKAT_keyword"].split(", "),
-			"orientations": p_json_entry["Page_clipping_orientations"].split(", "),
-			"orig_material": p_json_entry["Page_original_material"],
+			"keywords": intern_symbols(p_json_entry["Page_keywords"].split(", ")),
+			"ukat_keywords": intern_symbols(p_json_entry["Page_UKAT_keyword"].split(", ")),
+			"orientations": intern_symbols(p_json_entry["Page_clipping_orientations"].split(", ")),
+			"orig_material": intern_symbol(p_json_entry["Page_original_material"]),
 			"notes": p_json_entry["Page_notes"],
 			"people_ids": [],			
 			"places_ids": [],
@@ -860,102 +1763,116 @@ class WfsPages:
 
 				"continent_counts": {},
 			}
-		})
+		}
+
+		self.m_pages.append(page if not self.m_compact else WfsPage(page, self.m_id_table, self.m_term_table))
 
 	def save_stats(self, p_people, p_places, p_sources):
 
+		if self.m_store is not None:
+			self.save_store_stats()
+			return
+
 		for page in self.m_pages:
 
 			# Collect stats about the people on each page		
-			for person in p_people.m_people:
-
-				if person["id"] in page["people_ids"]:
+			for person in find_page_entities(page, "people_ids", p_people.m_people_dict, "person"):
 
-					# Date of birth/Date of death
-					# NOTE: Range test to be implemented
-					# update_stat(date_range_fn(person["dob"], person["dod"], 
-					# 			  page["stats"]["date_ranges_lived"])
+				# Date of birth/Date of death
+				# NOTE: Range test to be implemented
+				# update_stat(date_range_fn(person["dob"], person["dod"], 
+				# 			  page["stats"]["date_ranges_lived"])
 
-					# Nationality
-					update_stat(person["nationality"], page["stats"]["people_nationalities"])
+				# Nationality
+				update_page_stat(person["nationality"], page["stats"], "people_nationalities")
 
-					# Gender
-					update_stat(person["gender"], page["stats"]["people_genders"])
+				# Gender
+				update_page_stat(person["gender"], page["stats"], "people_genders")
 
-					# Profession
-					update_stat(person["epithets"], page["stats"]["people_epithets"])
+				# Profession
+				update_page_stat(person["epithets"], page["stats"], "people_epithets")
 
 			# Collect stats about the sources on each page
-			for source in p_sources.m_sources:
-
-				if source["id"] in page["sources_ids"]:
+			for source in find_page_entities(page, "sources_ids", p_sources.m_sources_dict, "source"):
 
-					# Original publication place
-					update_stat(source["place"], page["stats"]["sources_places"])
+				# Original publication place
+				update_page_stat(source["place"], page["stats"], "sources_places")
 
-					# Original publication date
-					# NOTE: Range test to be implemented
-					# update_stat(date_range_fn2(source["date"],
-					# 			  page["stats"]["source_dates"])
+				# Original publication date
+				# NOTE: Range test to be implemented
+				# update_stat(date_range_fn2(source["date"],
+				# 			  page["stats"]["source_dates"])
 
-					# Publisher
-					update_stat(source["rights_holder"], page["stats"]["sources_rights_holders"])
+				# Publisher
+				update_page_stat(source["rights_holder"], page["stats"], "sources_rights_holders")
 
 			# Collect stats about the places on each page
-			for place in p_places.m_places:
+			for place in find_page_entities(page, "places_ids", p_places.m_places_dict, "place"):
 
-				if place["id"] in page["places_ids"]:
+				# Continent
+				update_page_stat(place["continent"], page["stats"], "continent_counts")
 
-					# Continent
-					update_stat(place["continent"], page["stats"]["continent_counts"])
+	def save_store_stats(self):
+
+		# Same stats as save_stats, counted by the staging store's joins of the pages' ID lists and entity tables
+		for ids_str, page_id, pps_id in self.m_store.missing_page_entities():
+			print("Could not find {0} with ID {1} listed on page {2}".format(
+				{ "people_ids": "person", "places_ids": "place", "sources_ids": "source" }[ids_str], pps_id, page_id))
+
+		for ids_str, value_field, stat in WfsPages.store_stats:
+			for page_id, value, count in self.m_store.page_stats(ids_str, value_field):
+				if len(value.strip()) > 0:
+					page_stat = self.m_pages_by_id_dict[page_id]["stats"].setdefault(stat, {})
+					page_stat[intern_symbol(value)] = page_stat.get(value, 0) + count
 
 	
 class WfsPeople:
 
-	def __init__(self, p_people_json_filename):
+	def __init__(self, p_people_json_filename, p_store=None):
 
 		self.m_people_json_filename = p_people_json_filename
+
+		# Staging store the export's tables are read from (optional, see WfsStagingStore)
+		self.m_store = p_store
 		self.m_people = []
 		self.m_people_dict = {}
 		self.ingest()
 
 	def debug_output(self):
 
-		print "\nPeople\n=============================\n"
+		print("\nPeople\n=============================\n")
 		for person in self.m_people:
-			print person
-		print "\nPeople Dict\n=============================\n"
+			print(person)
+		print("\nPeople Dict\n=============================\n")
 		for person_id in self.m_people_dict:
-			print person_id
-			print self.m_people_dict[person_id]
+			print(person_id)
+			print(self.m_people_dict[person_id])
 
-	def find_associated_books_and_pages(self, p_pages):
+	def find_associated_books_and_pages(self, p_pages, p_people):
 
 		# Save a list of associated pages for each person
-		for person in self.m_people:
-			for page in p_pages.m_pages:
+		if self.m_store is not None:
+			find_associated_books_and_pages_in_store(p_people, self.m_store, "people_ids")
+			return
+		for person in p_people:
 
-				# If the person is on this page, include book and page IDs on its association lists
-				if person["id"] in page["people_ids"]:
+			# Include book and page IDs of each page the person is on in its association lists
+			for page in p_pages.pages_with("people_ids", person["id"]):
 
-					if page["book_id"] not in person["stats"]["book_and_page_ids"]:
-						person["stats"]["book_and_page_ids"][page["book_id"]] = []
+				if page["book_id"] not in person["stats"]["book_and_page_ids"]:
+					person["stats"]["book_and_page_ids"][page["book_id"]] = []
 
-					person["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
+				person["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
 
 	def ingest(self):
 
-		with open(self.m_people_json_filename, "rU") as input_file:
-
-			# Read the JSON
-			people_json = json.loads(input_file.read())
-
-			# Save each person entry
-			for entry in people_json["RECORDS"]:
-				self.save_person(entry)
+		# Save each person entry
+		entries = read_records(self.m_people_json_filename) if self.m_store is None else self.m_store.records("Page_Associated_People")
+		for entry in entries:
+			self.save_person(entry)
 
-			# Sort the people
-			self.m_people = sorted(self.m_people, key=lambda x: int(x["id"]), reverse=False)
+		# Sort the people
+		self.m_people = sorted(self.m_people, key=lambda x: int(x["id"]), reverse=False)
 
 		# Make a dictionary of people by ID
 		self.make_dict()
@@ -967,16 +1884,12 @@ class WfsPeople:
 			if person["id"] not in self.m_people_dict:
 				self.m_people_dict[person["id"]] = person
 			else:
-				print "Duplicate person listings for {0}".format(person) 
+				print("Duplicate person listings for {0}".format(person))
 
-	def output(self, p_output_path):
+	def output(self, p_output_path, p_build=None, p_scheduler=None, p_shard_count=0):
 
-		# Filename w/ name format wfs_people.json
-		output_filename = "wfs_people.json"
-		
-		# Output the people dictionary
-		with open(p_output_path + output_filename, "w") as output_file:
-			output_file.write(json.dumps(self.m_people_dict))
+		# Output the people dictionary, one entry at a time, to wfs_people.json (or its shards, see schedule_entries)
+		schedule_entries(p_scheduler, p_output_path, "wfs_people", self.m_people_dict, "people", p_build, p_shard_count)
 
 	def save_person(self, p_json_entry):
 		
@@ -994,17 +1907,17 @@ class WfsPeople:
 
 		self.m_people.append({
 
-			"id": p_json_entry["Associated_Person_Id"],
+			"id": intern_symbol(p_json_entry["Associated_Person_Id"]),
 			"name": p_json_entry["Associated_Person_first_name"] + " " +
 					p_json_entry["Associated_Person_last_name"],
 			"birth": p_json_entry["Associated_Person_dob"],
 			"birth_sep": get_obj_from_dd_month_year(p_json_entry["Associated_Person_dob"]),
 			"death": p_json_entry["Associated_Person_dod"],
 			"death_sep": get_obj_from_dd_month_year(p_json_entry["Associated_Person_dod"]),
-			"nationality": p_json_entry["Associated_Person_nationality"],
-			"gender": p_json_entry["Associated_Person_gender"],
+			"nationality": intern_symbol(p_json_entry["Associated_Person_nationality"]),
+			"gender": intern_symbol(p_json_entry["Associated_Person_gender"]),
 			# "title": p_json_entry["Associated_Person_title_profession"],
-			"epithets": p_json_entry["Associated_Person_epithets"],
+			"epithets": intern_symbol(p_json_entry["Associated_Person_epithets"]),
 			"addl_names": p_json_entry["Associated_Person_alternate_names"],
 			"link": p_json_entry["Associated_Person_link"],
 			"viaf": p_json_entry["Associated_Person_viaf"],
@@ -1026,64 +1939,70 @@ class WfsPeople:
 			},
 		})
 
-	def save_stats(self, p_pages):
+	def save_stats(self, p_pages, p_people_ids=None):
+
+		# Stats can be limited to the given people (e.g. those affected by an incremental build)
+		people = self.m_people
+		if p_people_ids is not None:
+			people = [person for person in self.m_people if person["id"] in p_people_ids]
 
 		# Find all people, places, and sources that occur on the same pages as these people
-		find_associated_pps(self.m_people, p_pages, "people_ids")
+		find_associated_pps(people, p_pages, "people_ids")
 
 		# Find all keywords that occur on the same pages as these people
-		find_associated_keywords(self.m_people, p_pages, "people_ids")
+		find_associated_keywords(people, p_pages, "people_ids")
 
 		# Find all books and pages associated with these people
-		self.find_associated_books_and_pages(p_pages)
+		self.find_associated_books_and_pages(p_pages, people)
 
 
 class WfsPlaces:
 
-	def __init__(self, p_places_json_filename):
+	def __init__(self, p_places_json_filename, p_store=None):
 
 		self.m_places_json_filename = p_places_json_filename
+
+		# Staging store the export's tables are read from (optional, see WfsStagingStore)
+		self.m_store = p_store
 		self.m_places = []
 		self.m_places_dict = {}
 		self.ingest()
 
 	def debug_output(self):
 
-		print "\nPlaces\n=============================\n"
+		print("\nPlaces\n=============================\n")
 		for place in self.m_places:
-			print place
-		print "\nPlaces Dict\n=============================\n"
+			print(place)
+		print("\nPlaces Dict\n=============================\n")
 		for place_id in self.m_places_dict:
-			print place_id
-			print self.m_places_dict[place_id]
+			print(place_id)
+			print(self.m_places_dict[place_id])
 
-	def find_associated_books_and_pages(self, p_pages):
+	def find_associated_books_and_pages(self, p_pages, p_places):
 
 		# Save a list of associated pages for each place
-		for place in self.m_places:
-			for page in p_pages.m_pages:
+		if self.m_store is not None:
+			find_associated_books_and_pages_in_store(p_places, self.m_store, "places_ids")
+			return
+		for place in p_places:
 
-				# If the place is on this page, include book and page IDs on its association lists
-				if place["id"] in page["places_ids"]:
+			# Include book and page IDs of each page the place is on in its association lists
+			for page in p_pages.pages_with("places_ids", place["id"]):
 
-					if page["book_id"] not in place["stats"]["book_and_page_ids"]:
-						place["stats"]["book_and_page_ids"][page["book_id"]] = []
+				if page["book_id"] not in place["stats"]["book_and_page_ids"]:
+					place["stats"]["book_and_page_ids"][page["book_id"]] = []
 
-					place["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
+				place["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
 
 	def ingest(self):
 
-		with open(self.m_places_json_filename, "rU") as input_file:
-		
-			# Read the JSON
-			places_json = json.loads(input_file.read())
+		# Save each place entry
+		entries = read_records(self.m_places_json_filename) if self.m_store is None else self.m_store.records("Page_Places_Named")
+		for entry in entries:
+			self.save_place(entry)
 
-			# Save each place entry
-			for entry in places_json["RECORDS"]:
-				self.save_place(entry)
-
-			# Sort the places
-			self.m_places = sorted(self.m_places, key=lambda x: int(x["id"]), reverse=False)
+		# Sort the places
+		self.m_places = sorted(self.m_places, key=lambda x: int(x["id"]), reverse=False)
 
 		# Make a dictionary of places by ID
 		self.make_dict()
@@ -1095,16 +2014,12 @@ class WfsPlaces:
 			if place["id"] not in self.m_places_dict:
 				self.m_places_dict[place["id"]] = place
 			else:
-				print "Duplicate place listings for {0}".format(place) 
+				print("Duplicate place listings for {0}".format(place))
 
-	def output(self, p_output_path):
+	def output(self, p_output_path, p_build=None, p_scheduler=None, p_shard_count=0):
 
-		# Filename w/ name format wfs_places.json
-		output_filename = "wfs_places.json"
-		
-		# Output the places dictionary
-		with open(p_output_path + output_filename, "w") as output_file:
-			output_file.write(json.dumps(self.m_places_dict))
+		# Output the places dictionary, one entry at a time, to wfs_places.json (or its shards, see schedule_entries)
+		schedule_entries(p_scheduler, p_output_path, "wfs_places", self.m_places_dict, "places", p_build, p_shard_count)
 
 	def save_place(self, p_json_entry):
 
@@ -1121,11 +2036,11 @@ class WfsPlaces:
 
 		self.m_places.append({
 
-			"id": p_json_entry["Place_Id"],
+			"id": intern_symbol(p_json_entry["Place_Id"]),
 			"name": p_json_entry["Place_name"],
 			"addl_names": p_json_entry["Place_name_variations"],
-			"countries": p_json_entry["Place_name_countries"],
-			"continent": p_json_entry["Place_name_continents"],
+			"countries": intern_symbol(p_json_entry["Place_name_countries"]),
+			"continent": intern_symbol(p_json_entry["Place_name_continents"]),
 			"woeid": p_json_entry["Place_name_WOEID"],
 			"lat": p_json_entry["Place_name_geonames_lat"],
 			"long": p_json_entry["Place_name_geonames_long"],
@@ -1145,78 +2060,87 @@ class WfsPlaces:
 			},
 		})
 
-	def save_stats(self, p_pages):
+	def save_stats(self, p_pages, p_places_ids=None):
+
+		# Stats can be limited to the given places (e.g. those affected by an incremental build)
+		places = self.m_places
+		if p_places_ids is not None:
+			places = [place for place in self.m_places if place["id"] in p_places_ids]
 
 		# Find all people, places, and sources that occur on the same pages as these places
-		find_associated_pps(self.m_places, p_pages, "places_ids")	
+		find_associated_pps(places, p_pages, "places_ids")	
 
 		# Find all keywords that occur on the same pages as these places
-		find_associated_keywords(self.m_places, p_pages, "places_ids")
+		find_associated_keywords(places, p_pages, "places_ids")
 
 		# Find all books and pages associated with these places
-		self.find_associated_books_and_pages(p_pages)
+		self.find_associated_books_and_pages(p_pages, places)
 
 
 class WfsSources:
 
-	def __init__(self, p_sources_json_filename, p_sources_people_join_json_filename):
+	def __init__(self, p_sources_json_filename, p_sources_people_join_json_filename, p_store=None):
 
 		self.m_sources_json_filename = p_sources_json_filename
 		self.m_sources_people_join_json_filename = p_sources_people_join_json_filename
+
+		# Staging store the export's tables are read from (optional, see WfsStagingStore)
+		self.m_store = p_store
 		self.m_sources = []
 		self.m_sources_dict = {}
 		self.ingest()
 
 	def debug_output(self):
 
-		print "\nSources\n=============================\n"
+		print("\nSources\n=============================\n")
 		for source in self.m_sources:
-			print source
-		print "\nSources Dict\n=============================\n"
+			print(source)
+		print("\nSources Dict\n=============================\n")
 		for source_id in self.m_sources_dict:
-			print source_id
-			print self.m_sources_dict[source_id]
+			print(source_id)
+			print(self.m_sources_dict[source_id])
 
-	def find_associated_books_and_pages(self, p_pages):
+	def find_associated_books_and_pages(self, p_pages, p_sources):
 
 		# Save a list of associated pages for each source
-		for source in self.m_sources:
-			for page in p_pages.m_pages:
+		if self.m_store is not None:
+			find_associated_books_and_pages_in_store(p_sources, self.m_store, "sources_ids")
+			return
+		for source in p_sources:
 
-				# If the source is on this page, include book and page IDs on its association lists
-				if source["id"] in page["sources_ids"]:
+			# Include book and page IDs of each page the source is on in its association lists
+			for page in p_pages.pages_with("sources_ids", source["id"]):
 
-					if page["book_id"] not in source["stats"]["book_and_page_ids"]:
-						source["stats"]["book_and_page_ids"][page["book_id"]] = []
+				if page["book_id"] not in source["stats"]["book_and_page_ids"]:
+					source["stats"]["book_and_page_ids"][page["book_id"]] = []
 
-					source["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
+				source["stats"]["book_and_page_ids"][page["book_id"]].append(page["id"])
 
 	def ingest(self):
 		
-		with open(self.m_sources_json_filename, "rU") as input_file:
-		
-			# Read the JSON
-			sources_json = json.loads(input_file.read())
+		# Save each source entry
+		entries = read_records(self.m_sources_json_filename) if self.m_store is None else \
+				  self.m_store.records("Page_Associated_Sources")
+		for entry in entries:
+			self.save_source(entry)
 
-			# Save each source entry
-			for entry in sources_json["RECORDS"]:
-				self.save_source(entry)
-
-			# Sort the sources
-			self.m_sources = sorted(self.m_sources, key=lambda x: int(x["id"]), reverse=False)
+		# Sort the sources
+		self.m_sources = sorted(self.m_sources, key=lambda x: int(x["id"]), reverse=False)
 
 		# Make a dictionary of sources by ID
 		self.make_dict()
 
 		# Associate creators with sources
-		with open(self.m_sources_people_join_json_filename, "rU") as input_file:
-
-			# Read the JSON
-			sources_people_join_json = json.loads(input_file.read())
-
-			# Associate creators with sources
-			for entry in sources_people_join_json["RECORDS"]:
+		if self.m_store is None:
+			for entry in read_records(self.m_sources_people_join_json_filename):
 				self.save_source_people_join(entry)
+			return
+
+		# (the store resolves the join, leaving the records whose source isn't found)
+		for entry in self.m_store.join_records("Sources_People_Join", "Associated_Sources_Id_Join_2", "Page_Associated_Sources"):
+			self.save_source_people_join(entry)
+		for source_id in self.m_store.missing_references("Sources_People_Join", "Associated_Sources_Id_Join_2", "Page_Associated_Sources"):
+			print("Could not find source with ID {0} in sources_dict".format(source_id))
 
 	def make_dict(self):
 
@@ -1225,16 +2149,12 @@ class WfsSources:
 			if source["id"] not in self.m_sources_dict:
 				self.m_sources_dict[source["id"]] = source
 			else:
-				print "Duplicate source listings for {0}".format(source) 
+				print("Duplicate source listings for {0}".format(source))
 
-	def output(self, p_output_path):
+	def output(self, p_output_path, p_build=None, p_scheduler=None, p_shard_count=0):
 
-		# Filename w/ name format wfs_sources.json
-		output_filename = "wfs_sources.json"
-		
-		# Output the sources dictionary
-		with open(p_output_path + output_filename, "w") as output_file:
-			output_file.write(json.dumps(self.m_sources_dict))
+		# Output the sources dictionary, one entry at a time, to wfs_sources.json (or its shards, see schedule_entries)
+		schedule_entries(p_scheduler, p_output_path, "wfs_sources", self.m_sources_dict, "sources", p_build, p_shard_count)
 
 	def save_source(self, p_json_entry):
 
@@ -1249,12 +2169,12 @@ class WfsSources:
 
 		self.m_sources.append({
 
-			"id": p_json_entry["Page_Associated_Sources_Id"],
+			"id": intern_symbol(p_json_entry["Page_Associated_Sources_Id"]),
 			"name": p_json_entry["Page_Associated_Sources_name"],
-			"place": p_json_entry["Page_Associated_Sources_associated_place"],
+			"place": intern_symbol(p_json_entry["Page_Associated_Sources_associated_place"]),
 			"date": p_json_entry["Page_Associated_Sources_date"],
-			"rights_holder": p_json_entry["Page_Associated_Source_rights_holder"],
-			"source_type": p_json_entry["Page_Associated_Sources_type_of_source"],
+			"rights_holder": intern_symbol(p_json_entry["Page_Associated_Source_rights_holder"]),
+			"source_type": intern_symbol(p_json_entry["Page_Associated_Sources_type_of_source"]),
 			"link": p_json_entry["Page_Associated_Sources_link"],
 			"notes": p_json_entry["Page_Associated_Sources_notes"],
 
@@ -1285,31 +2205,36 @@ class WfsSources:
 		if p_json_entry["Associated_Sources_Id_Join_2"] in self.m_sources_dict:
 			
 			self.m_sources_dict[p_json_entry["Associated_Sources_Id_Join_2"]]["stats"]["creators"].append(
-				p_json_entry["Associated_Person_Id_Join_2"])
+				intern_symbol(p_json_entry["Associated_Person_Id_Join_2"]))
 
 			if len(p_json_entry["Sources_Person_Join_notes"]) > 0:
 				self.m_sources_dict[p_json_entry["Associated_Sources_Id_Join_2"]]["stats"]["creators_notes"].append(
 					p_json_entry["Sources_Person_Join_notes"])			
 
 		else:
-			print "Could not find source with ID {0} in sources_dict".format(
-				p_json_entry["Associated_Sources_Id_Join_2"])
+			print("Could not find source with ID {0} in sources_dict".format(
+				p_json_entry["Associated_Sources_Id_Join_2"]))
+
+	def save_stats(self, p_pages, p_sources_ids=None):
 
-	def save_stats(self, p_pages):
+		# Stats can be limited to the given sources (e.g. those affected by an incremental build)
+		sources = self.m_sources
+		if p_sources_ids is not None:
+			sources = [source for source in self.m_sources if source["id"] in p_sources_ids]
 
 		# Find all people, places, and sources that occur on the same pages as these sources
-		find_associated_pps(self.m_sources, p_pages, "sources_ids")
+		find_associated_pps(sources, p_pages, "sources_ids")
 
 		# Find all keywords that occur on the same pages as these sources
-		find_associated_keywords(self.m_sources, p_pages, "sources_ids")
+		find_associated_keywords(sources, p_pages, "sources_ids")
 
 		# Find all books and places associated with these sources
-		self.find_associated_books_and_pages(p_pages)
+		self.find_associated_books_and_pages(p_pages, sources)
 
 
 class WfsKeywords: 
 
-	def __init__(self, p_scrapbooks, p_pages):
+	def __init__(self, p_scrapbooks, p_pages, p_keywords=None):
 
 		# Keywords collection helps with statistics collection
 		self.m_keywords = []
@@ -1322,6 +2247,19 @@ class WfsKeywords:
 		# (rest will be filled out by people, places, sources according books/pages associations)
 		for id in p_scrapbooks.m_collection["stats"]["ids_to_keywords"]:
 
+			# Keywords collection and ID table share the same stats object
+			keyword_stats = {
+				# Co-occurrences
+				"people_ids": [],
+				"places_ids": [],
+				"sources_ids": [],
+				"keywords": [],
+
+				"people_on_pages_dict": {},
+				"places_on_pages_dict": {},
+				"sources_on_pages_dict": {}
+			}
+
 			# Build ID table (main table)
 			self.m_keywords_json["ids"][id] = {
 				"keyword": p_scrapbooks.m_collection["stats"]["ids_to_keywords"][id],
@@ -1329,150 +2267,1418 @@ class WfsKeywords:
 				"pages": [],
 				"people": [],
 				"places": [],
-				"sources": []
+				"sources": [],
+				"stats": keyword_stats
 			}
 
 			self.m_keywords.append({
 
 				"id": p_scrapbooks.m_collection["stats"]["ids_to_keywords"][id],
-				"stats": {
-					# Co-occurrences
-					"people_ids": [],
-					"places_ids": [],
-					"sources_ids": [],
-					"keywords": [],
-
-					"people_on_pages_dict": {},
-					"places_on_pages_dict": {},
-					"sources_on_pages_dict": {}
-				}
+				"stats": keyword_stats
 
 			})
 
-		self.save_stats(p_scrapbooks, p_pages)
-
-		# Copy over stats to object being written to json (ad hoc fix)
-		for id in p_scrapbooks.m_collection["stats"]["ids_to_keywords"]:
-			for index in range(len(self.m_keywords)):
-				if self.m_keywords[index]["id"] == self.m_keywords_json["ids"][id]["keyword"]:
-					self.m_keywords_json["ids"][id]["stats"] = self.m_keywords[index]["stats"]
-
+		self.save_stats(p_scrapbooks, p_pages, p_keywords)
 
-	def output(self, p_output_path):
+	def output(self, p_output_path, p_build=None, p_scheduler=None):
 
 		# Filename w/ name format wfs_keywords.json
 		output_filename = "wfs_keywords.json"
+
+		# Incremental builds only replace the keywords whose stats were recomputed
+		output_json = self.m_keywords_json
+		if p_build is not None:
+			if not p_build.has_affected("keywords"):
+				return
+			output_json = { "ids": p_build.patch_entries(p_output_path + output_filename,
+														 self.m_keywords_json["ids"], "keywords", "ids"),
+							"keywords": self.m_keywords_json["keywords"] }
 		
-		# Output the keywords dictionary
-		with open(p_output_path + output_filename, "w") as output_file:
-			output_file.write(json.dumps(self.m_keywords_json))
+		# Output the keywords dictionary, one entry of each lookup table at a time
+		schedule_json(p_scheduler, p_output_path + output_filename, output_json, 2)
 
-	def save_stats(self, p_scrapbooks, p_pages):
+	def save_stats(self, p_scrapbooks, p_pages, p_keywords=None):
+
+		keywords_to_ids = p_scrapbooks.m_collection["stats"]["keywords_to_ids"]
+
+		# Books, pages, people, places, and sources of each keyword, once each in the order found
+		associations = {}
+		for id in self.m_keywords_json["ids"]:
+			associations[id] = { "books": WfsOrderedCounter(), "pages": WfsOrderedCounter(), "people": WfsOrderedCounter(),
+								 "places": WfsOrderedCounter(), "sources": WfsOrderedCounter() }
 
 		# Associate each keyword by people, places, and sources on book pages
 		for book in p_scrapbooks.m_books:
 
 			for page in p_pages.m_pages_by_book_dict[book["id"]]:
 
-				if book["id"] == page["book_id"]:
+				# Look up the ID of each keyword on the page (once per page)
+				page_keyword_ids = set()
+				for kw in page["keywords"]:
+					if kw in keywords_to_ids:
+						page_keyword_ids.add(keywords_to_ids[kw])
 
-					for id in self.m_keywords_json["ids"]:
+				for id in page_keyword_ids:
 
-						if self.m_keywords_json["ids"][id]["keyword"] in page["keywords"]:
+					# Associate this keyword to this book and page
+					associations[id]["books"].add(book["number"])
+					associations[id]["pages"].add(page["id"])
 
-							# Associate this keyword to this book and page
-							self.m_keywords_json["ids"][id]["books"].append(book["number"])
-							self.m_keywords_json["ids"][id]["pages"].append(page["id"])
+					# Associate this keyword to these people, places, and sources
+					associations[id]["people"].update(page["people_ids"])
+					associations[id]["places"].update(page["places_ids"])
+					associations[id]["sources"].update(page["sources_ids"])
 
-							# Associate this keyword to these people, places, and sources
-							self.m_keywords_json["ids"][id]["people"].extend(page["people_ids"])
-							self.m_keywords_json["ids"][id]["places"].extend(page["places_ids"])
-							self.m_keywords_json["ids"][id]["sources"].extend(page["sources_ids"])
-
-		# De-dupe all ID association lists for keywords
+		# Save the de-duplicated ID association lists for keywords
 		for id in self.m_keywords_json["ids"]:
-			self.m_keywords_json["ids"][id]["books"] = list(set(self.m_keywords_json["ids"][id]["books"]))
-			self.m_keywords_json["ids"][id]["pages"] = list(set(self.m_keywords_json["ids"][id]["pages"]))
-			self.m_keywords_json["ids"][id]["people"] = list(set(self.m_keywords_json["ids"][id]["people"]))
-			self.m_keywords_json["ids"][id]["places"] = list(set(self.m_keywords_json["ids"][id]["places"]))
-			self.m_keywords_json["ids"][id]["sources"] = list(set(self.m_keywords_json["ids"][id]["sources"]))
+			for field in associations[id]:
+				self.m_keywords_json["ids"][id][field] = associations[id][field].keys()
 
 		# Find all people, places, and sources that occur on the same pages as these keywords
-		find_associated_pps(self.m_keywords, p_pages, "keywords")			
+		# (co-occurrences can be limited to the given keywords, e.g. for an incremental build)
+		keywords = self.m_keywords
+		if p_keywords is not None:
+			keywords = [keyword for keyword in self.m_keywords if keyword["id"] in p_keywords]
+		find_associated_pps(keywords, p_pages, "keywords")			
+
+class WfsDescriptionCache:
+
+	# Bump when format_description's output changes, so that descriptions rendered before are not reused
+	cache_version = 1
+
+	def __init__(self, p_cache_filename, p_route="/collection/person", p_max_size=8388608):
+
+		self.m_cache_filename = p_cache_filename
+		self.m_route = p_route
+
+		# Rendered descriptions kept, in characters of HTML
+		self.m_max_size = p_max_size
+		self.m_size = 0
+
+		# Rendered HTML by description hash, least recently used first
+		self.m_entries = OrderedDict()
+		self.m_hits = 0
+		self.m_misses = 0
+
+		self.read()
+
+	def add(self, p_key, p_html):
+
+		self.m_entries[p_key] = p_html
+		self.m_size += len(p_html)
+
+		# Evict the least recently used descriptions past the size cap
+		while self.m_size > self.m_max_size and len(self.m_entries) > 0:
+			evicted_key, evicted_html = self.m_entries.popitem(last=False)
+			self.m_size -= len(evicted_html)
+
+	def description_key(self, p_str_description):
+
+		return hashlib.sha1(self.m_route.encode("utf-8") + b"\n" + p_str_description.encode("utf-8")).hexdigest()
+
+	def read(self):
+
+		if not os.path.isfile(self.m_cache_filename):
+			return
+
+		with open(self.m_cache_filename, "r") as input_file:
+			cache = json.loads(input_file.read())
+
+		# Descriptions rendered by another version of format_description are re-rendered
+		if WfsDescriptionCache.cache_version != cache["version"]:
+			return
+		for key, html in cache["entries"]:
+			self.add(key, html)
+
+	def render(self, p_str_description):
+
+		key = self.description_key(p_str_description)
+
+		# Reuse the rendered description, marking it as the most recently used
+		if key in self.m_entries:
+			self.m_hits += 1
+			html = self.m_entries.pop(key)
+			self.m_entries[key] = html
+			return html
+
+		self.m_misses += 1
+		html = format_description(p_str_description, self.m_route)
+		self.add(key, html)
+
+		return html
+
+	def save(self):
 
+		cache_path = os.path.dirname(self.m_cache_filename)
+		if len(cache_path) > 0 and not os.path.isdir(cache_path):
+			os.makedirs(cache_path)
+		write_json(self.m_cache_filename, { "version": WfsDescriptionCache.cache_version,
+											"entries": list(self.m_entries.items()) })
+
+
+class WfsStagingStore:
+
+	# Foreign keys of the export tables (indexed, but not enforced since join records can refer to
+	# pages and entities outside of the export's subset): table, field, and the table it refers to
+	foreign_keys = [
+		("Scrapbook_Page", "Scrapbook_Id", "Scrapbook"),
+		("Page_People_Join", "Page_Id_Join", "Scrapbook_Page"),
+		("Page_People_Join", "Associated_Person_Id_Join", "Page_Associated_People"),
+		("Page_Places_Named_Join", "Page_Id_Join_5", "Scrapbook_Page"),
+		("Page_Places_Named_Join", "Places_Named_Id_Join", "Page_Places_Named"),
+		("Page_Associated_Sources_Join", "Page_Id_Join_2", "Scrapbook_Page"),
+		("Page_Associated_Sources_Join", "Associated_Sources_Id_Join", "Page_Associated_Sources"),
+		("Sources_People_Join", "Associated_Sources_Id_Join_2", "Page_Associated_Sources"),
+		("Sources_People_Join", "Associated_Person_Id_Join_2", "Page_Associated_People")
+	]
+
+	# Join table of each of the pages' ID lists: table, page field, entity field, entity table, and whether
+	# blank entity IDs are left off the pages (see WfsPages.associate_place_to_page)
+	page_joins = {
+		"people_ids": ("Page_People_Join", "Page_Id_Join", "Associated_Person_Id_Join", "Page_Associated_People", False),
+		"sources_ids": ("Page_Associated_Sources_Join", "Page_Id_Join_2", "Associated_Sources_Id_Join", "Page_Associated_Sources", False),
+		"places_ids": ("Page_Places_Named_Join", "Page_Id_Join_5", "Places_Named_Id_Join", "Page_Places_Named", True)
+	}
+
+	store_version = 1
+
+	def __init__(self, p_db_filename, p_input_path, p_json_file_date):
+
+		self.m_db_filename = p_db_filename
+		self.m_key_fields = dict((table, key_field) for table, key_field, ref_fields in export_tables)
+
+		# Tables loaded from the export by this run, and reused from an earlier run
+		self.m_loaded_tables = []
+		self.m_reused_tables = []
+		self.m_staged_records = 0
+
+		db_path = os.path.dirname(p_db_filename)
+		if len(db_path) > 0 and not os.path.isdir(db_path):
+			os.makedirs(db_path)
+		self.m_connection = sqlite3.connect(p_db_filename)
+
+		# The store can always be loaded again from the export, so it isn't worth syncing to disk
+		self.m_connection.execute("PRAGMA synchronous = OFF")
+
+		self.stage(p_input_path, p_json_file_date)
+
+	def close(self):
+
+		self.m_connection.close()
+
+	def entity_pages(self, p_ids_str):
+
+		# (entity ID, book ID, page ID) of each page each entity is on, in page order
+		join_table, page_field, entity_field, entity_table, skip_blank = WfsStagingStore.page_joins[p_ids_str]
+		return self.m_connection.execute(
+			"SELECT j.entity, p.\"Scrapbook_Id\", p.\"Page_Id\" FROM "
+			"(SELECT DISTINCT {1} AS page, {2} AS entity FROM {0}{3}) j "
+			"JOIN \"Scrapbook_Page\" p ON p.\"Page_Id\" = j.page "
+			"ORDER BY CAST(p.\"Scrapbook_Id\" AS INTEGER), p.row_order".format(
+				quote_sql_name(join_table), quote_sql_name(page_field), quote_sql_name(entity_field),
+				" WHERE {0} != ''".format(quote_sql_name(entity_field)) if skip_blank else ""))
+
+	def book_entity_counts(self, p_ids_str):
+
+		# (book ID, entity ID, count) of the entities listed on each book's pages, in the order first listed
+		join_table, page_field, entity_field, entity_table, skip_blank = WfsStagingStore.page_joins[p_ids_str]
+		return self.m_connection.execute(
+			"SELECT p.\"Scrapbook_Id\", j.{2}, COUNT(*) FROM {0} j "
+			"JOIN \"Scrapbook_Page\" p ON p.\"Page_Id\" = j.{1}{3} "
+			"GROUP BY p.\"Scrapbook_Id\", j.{2} "
+			"ORDER BY p.\"Scrapbook_Id\", MIN(p.row_order * 4294967296 + j.row_order)".format(
+				quote_sql_name(join_table), quote_sql_name(page_field), quote_sql_name(entity_field),
+				" WHERE j.{0} != ''".format(quote_sql_name(entity_field)) if skip_blank else ""))
+
+	def join_records(self, p_table, p_foreign_key, p_parent_table):
+
+		# Records of a join table whose foreign key is found in the table it refers to, in export order
+		return self.records(p_table, "WHERE {0} IN (SELECT {1} FROM {2})".format(
+			quote_sql_name(p_foreign_key), quote_sql_name(self.m_key_fields[p_parent_table]), quote_sql_name(p_parent_table)))
+
+	def load_table(self, p_table, p_filename):
+
+		key_field = self.m_key_fields[p_table]
+		references = dict((field, parent_table) for table, field, parent_table in WfsStagingStore.foreign_keys
+						  if table == p_table)
+
+		self.m_connection.execute("DROP TABLE IF EXISTS {0}".format(quote_sql_name(p_table)))
+
+		# Records are inserted in export order (row_order), with a column for each field. A record with a
+		# primary key already seen is skipped (the ingest keeps only the first record of each ID)
+		columns = []
+		rows = []
+		record_count = 0
+		for entry in read_records(p_filename):
+
+			# 1. Columns come from the first record, and from any later one with new fields
+			new_fields = [field for field in entry if field not in columns]
+			if len(new_fields) > 0:
+				self.insert_rows(p_table, columns, rows)
+				rows = []
+				if 0 == len(columns):
+					self.make_table(p_table, key_field, new_fields, references)
+				else:
+					for field in new_fields:
+						self.m_connection.execute("ALTER TABLE {0} ADD COLUMN {1} TEXT".format(
+							quote_sql_name(p_table), quote_sql_name(field)))
+				columns.extend(new_fields)
+
+			# 2. Rows are inserted in batches
+			rows.append(tuple(entry.get(field) for field in columns))
+			record_count += 1
+			if len(rows) >= records_chunk_size:
+				self.insert_rows(p_table, columns, rows)
+				rows = []
+
+		if 0 == len(columns):
+			self.make_table(p_table, key_field, [key_field], references)
+		self.insert_rows(p_table, columns, rows)
+
+		# 3. Index the foreign keys (the primary key is indexed by its UNIQUE constraint)
+		for field in references:
+			if field in columns:
+				self.m_connection.execute("CREATE INDEX {0} ON {1} ({2})".format(
+					quote_sql_name("{0}_{1}".format(p_table, field)), quote_sql_name(p_table), quote_sql_name(field)))
+
+		return record_count
+
+	def insert_rows(self, p_table, p_columns, p_rows):
+
+		if 0 == len(p_rows):
+			return
+		self.m_connection.executemany("INSERT OR IGNORE INTO {0} ({1}) VALUES ({2})".format(
+			quote_sql_name(p_table), ", ".join(quote_sql_name(field) for field in p_columns),
+			", ".join("?" for field in p_columns)), p_rows)
+
+	def make_table(self, p_table, p_key_field, p_fields, p_references):
+
+		column_definitions = ["row_order INTEGER PRIMARY KEY"]
+		for field in p_fields:
+			column_definition = "{0} TEXT".format(quote_sql_name(field))
+			if p_key_field == field:
+				column_definition += " NOT NULL UNIQUE"
+			elif field in p_references:
+				column_definition += " REFERENCES {0} ({1})".format(
+					quote_sql_name(p_references[field]), quote_sql_name(self.m_key_fields[p_references[field]]))
+			column_definitions.append(column_definition)
+		if p_key_field not in p_fields:
+			column_definitions.append("{0} TEXT NOT NULL UNIQUE".format(quote_sql_name(p_key_field)))
+
+		self.m_connection.execute("CREATE TABLE {0} ({1})".format(quote_sql_name(p_table), ", ".join(column_definitions)))
+
+	def missing_page_entities(self):
+
+		# (ID list, page ID, entity ID) of the entities listed on pages but not found in their tables,
+		# in page order, by people, sources, then places (the order WfsPages.save_stats looks them up in)
+		selects = []
+		for rank, ids_str in enumerate(["people_ids", "sources_ids", "places_ids"]):
+			join_table, page_field, entity_field, entity_table, skip_blank = WfsStagingStore.page_joins[ids_str]
+			selects.append(
+				"SELECT {0} AS rank, '{1}' AS ids_str, j.{3} AS page, j.{4} AS entity, MIN(j.row_order) AS first_row "
+				"FROM {2} j WHERE j.{4} NOT IN (SELECT {6} FROM {5}){7} GROUP BY j.{3}, j.{4}".format(
+					rank, ids_str, quote_sql_name(join_table), quote_sql_name(page_field), quote_sql_name(entity_field),
+					quote_sql_name(entity_table), quote_sql_name(self.m_key_fields[entity_table]),
+					" AND j.{0} != ''".format(quote_sql_name(entity_field)) if skip_blank else ""))
+
+		return self.m_connection.execute(
+			"SELECT m.ids_str, m.page, m.entity FROM ({0}) m "
+			"JOIN \"Scrapbook_Page\" p ON p.\"Page_Id\" = m.page "
+			"ORDER BY CAST(p.\"Scrapbook_Id\" AS INTEGER), p.row_order, m.rank, m.first_row".format(" UNION ALL ".join(selects)))
+
+	def missing_references(self, p_table, p_foreign_key, p_parent_table):
+
+		# Foreign keys of the records of a join table that are not found in the table they refer to, in export order
+		return [row[0] for row in self.m_connection.execute(
+			"SELECT {1} FROM {0} WHERE {1} NOT IN (SELECT {2} FROM {3}) ORDER BY row_order".format(
+				quote_sql_name(p_table), quote_sql_name(p_foreign_key),
+				quote_sql_name(self.m_key_fields[p_parent_table]), quote_sql_name(p_parent_table)))]
+
+	def page_join_records(self, p_ids_str):
+
+		# Records of the join table of one of the pages' ID lists whose page is in the export, in export order
+		join_table, page_field, entity_field, entity_table, skip_blank = WfsStagingStore.page_joins[p_ids_str]
+		return self.join_records(join_table, page_field, "Scrapbook_Page")
+
+	def page_stats(self, p_ids_str, p_value_field):
+
+		# (page ID, value, count) of a field of the entities on each page, counting each entity once per page.
+		# Values are in the order of the first entity (by ID) to have them, like update_stat over find_page_entities
+		join_table, page_field, entity_field, entity_table, skip_blank = WfsStagingStore.page_joins[p_ids_str]
+		return self.m_connection.execute(
+			"SELECT j.page, e.{5}, COUNT(*) FROM "
+			"(SELECT DISTINCT {1} AS page, {2} AS entity FROM {0} WHERE {1} IN (SELECT \"Page_Id\" FROM \"Scrapbook_Page\")) j "
+			"JOIN {3} e ON e.{4} = j.entity "
+			"GROUP BY j.page, e.{5} "
+			"ORDER BY j.page, MIN(CAST(j.entity AS INTEGER))".format(
+				quote_sql_name(join_table), quote_sql_name(page_field), quote_sql_name(entity_field),
+				quote_sql_name(entity_table), quote_sql_name(self.m_key_fields[entity_table]), quote_sql_name(p_value_field)))
+
+	def records(self, p_table, p_where=""):
+
+		# Records of a table as dicts, in export order (fields a record didn't have are left out)
+		cursor = self.m_connection.execute("SELECT * FROM {0} {1} ORDER BY row_order".format(quote_sql_name(p_table), p_where))
+		fields = [column[0] for column in cursor.description][1:]
+		for row in cursor:
+			yield dict((field, value) for field, value in zip(fields, row[1:]) if value is not None)
+
+	def stage(self, p_input_path, p_json_file_date):
+
+		with self.m_connection:
+
+			self.m_connection.execute("CREATE TABLE IF NOT EXISTS staged_files "
+									  "(table_name TEXT PRIMARY KEY, filename TEXT, size INTEGER, mtime_ns INTEGER, version INTEGER)")
+
+			for table, key_field, ref_fields in export_tables:
+
+				# 1. Tables are reused while their export file is unchanged since it was loaded
+				filename = export_filename(p_input_path, table, p_json_file_date)
+				file_stat = os.stat(filename)
+				staged_file = (os.path.abspath(filename), file_stat.st_size, file_stat.st_mtime_ns, WfsStagingStore.store_version)
+				if staged_file == self.m_connection.execute(
+					"SELECT filename, size, mtime_ns, version FROM staged_files WHERE table_name = ?", (table,)).fetchone():
+					self.m_reused_tables.append(table)
+					continue
+
+				# 2. Others are loaded from the export again
+				self.m_staged_records += self.load_table(table, filename)
+				self.m_connection.execute("INSERT OR REPLACE INTO staged_files VALUES (?, ?, ?, ?, ?)", (table,) + staged_file)
+				self.m_loaded_tables.append(table)
+
+
+class WfsIncrementalBuild:
+
+	# Join tables and the type of entity they join to pages
+	page_join_tables = [
+		("Page_People_Join", "people"),
+		("Page_Places_Named_Join", "places"),
+		("Page_Associated_Sources_Join", "sources")
+	]
+
+	# Entity tables, their type, and the page ID lists they appear in
+	entity_tables = [
+		("Page_Associated_People", "people", "people_ids"),
+		("Page_Places_Named", "places", "places_ids"),
+		("Page_Associated_Sources", "sources", "sources_ids")
+	]
+
+	state_version = 1
+
+	def __init__(self, p_state_filename, p_input_path, p_json_file_date, p_output_path, p_shard_count=0, p_binary=False,
+				 p_canonical=False):
+
+		self.m_state_filename = p_state_filename
+		self.m_output_path = p_output_path
+
+		# State of this build: a fingerprint for each export record and the outputs written (how many shards
+		# the people, places, and sources were split into, whether binary outputs were written, and whether
+		# they were written in canonical form)
+		self.m_state = { "version": WfsIncrementalBuild.state_version,
+						 "output_path": p_output_path,
+						 "shards": p_shard_count,
+						 "binary": p_binary,
+						 "canonical": p_canonical,
+						 "tables": {},
+						 "keywords_to_ids": {},
+						 "outputs": [] }
+		self.fingerprint_export(p_input_path, p_json_file_date)
+
+		# State of the last build, if it can be built upon
+		self.m_previous_state = self.read_previous_state()
+		self.m_full_rebuild = self.m_previous_state is None
+
+		# IDs of the books, pages, people, places, sources, and keywords affected by changed records
+		self.m_affected = { "books": set(), "pages": set(), "people": set(),
+							"places": set(), "sources": set(), "keywords": set() }
+		self.m_all_keywords_affected = self.m_full_rebuild
+
+	def affected_ids(self, p_type):
+
+		# None stands for all IDs of this type
+		if self.m_full_rebuild or ("keywords" == p_type and self.m_all_keywords_affected):
+			return None
+		return self.m_affected[p_type]
+
+	def changed_records(self, p_table):
+
+		# Records added, changed, or removed since the last build as (key, previous, current)
+		previous_records = self.m_previous_state["tables"].get(p_table, {})
+		current_records = self.m_state["tables"][p_table]
+
+		changes = []
+		for key in current_records:
+			if key not in previous_records or previous_records[key][0] != current_records[key][0]:
+				changes.append((key, previous_records.get(key), current_records[key]))
+		for key in previous_records:
+			if key not in current_records:
+				changes.append((key, previous_records[key], None))
+
+		return changes
+
+	def find_affected(self, p_scrapbooks, p_pages):
+
+		keywords_to_ids = p_scrapbooks.m_collection["stats"]["keywords_to_ids"]
+		self.m_state["keywords_to_ids"] = keywords_to_ids
+
+		if self.m_full_rebuild:
+			print("Incremental build: no usable state from a previous build, rebuilding all outputs")
+			return
+
+		affected = self.m_affected
+		change_count = 0
+
+		# Books whose pages gained, lost, or changed people or sources (and so people roles or source types)
+		tally_books = set()
+
+		# Pages added, removed, or with changed joins (to their book, keywords, people, places, or sources)
+		joined_pages = set()
+
+		# 1. Changed scrapbooks, and the keywords on their pages (keywords list book numbers)
+		for book_id, previous, current in self.changed_records("Scrapbook"):
+			change_count += 1
+			affected["books"].add(book_id)
+			for page in p_pages.m_pages_by_book_dict.get(book_id, []):
+				affected["keywords"].update(page["keywords"])
+
+		# 2. Changed pages and the books they belonged to before and after the change. Only a page added,
+		#    removed, or moved to another book or other keywords changes its keywords and the entities on it
+		for page_id, previous, current in self.changed_records("Scrapbook_Page"):
+			change_count += 1
+			affected["pages"].add(page_id)
+			if previous is None or current is None or previous[1:] != current[1:]:
+				joined_pages.add(page_id)
+			for record in (previous, current):
+				if record is not None:
+					affected["books"].add(record[1])
+					if page_id in joined_pages:
+						affected["keywords"].update(record[2].split(", "))
+
+			# Adding, removing, or moving a page changes the people roles and source types of its book(s)
+			if previous is None or current is None or previous[1] != current[1]:
+				tally_books.update(record[1] for record in (previous, current) if record is not None)
+
+		# 3. Changed page joins, and the pages and entities they joined before and after the change
+		for table, entity_type in WfsIncrementalBuild.page_join_tables:
+			for join_id, previous, current in self.changed_records(table):
+				change_count += 1
+				for record in (previous, current):
+					if record is not None:
+						affected["pages"].add(record[1])
+						joined_pages.add(record[1])
+						affected[entity_type].add(record[2])
+						if entity_type in ["people", "sources"] and record[1] in p_pages.m_pages_by_id_dict:
+							tally_books.add(p_pages.m_pages_by_id_dict[record[1]]["book_id"])
+
+		# 4. Changed people, places, and sources, and the books of the pages whose stats tally them
+		for table, entity_type, ids_str in WfsIncrementalBuild.entity_tables:
+			for entity_id, previous, current in self.changed_records(table):
+				change_count += 1
+				affected[entity_type].add(entity_id)
+				for page in p_pages.pages_with(ids_str, entity_id):
+					affected["books"].add(page["book_id"])
+					if "sources" == entity_type:
+						tally_books.add(page["book_id"])
+
+		# 5. Changed source creators
+		for join_id, previous, current in self.changed_records("Sources_People_Join"):
+			change_count += 1
+			for record in (previous, current):
+				if record is not None:
+					affected["sources"].add(record[1])
+
+		# 6. Affected pages change their book, and pages with changed joins their keywords and the
+		#    co-occurrences of every person, place, and source on them
+		for page_id in affected["pages"]:
+			if page_id in p_pages.m_pages_by_id_dict:
+				page = p_pages.m_pages_by_id_dict[page_id]
+				affected["books"].add(page["book_id"])
+				if page_id in joined_pages:
+					affected["keywords"].update(page["keywords"])
+		for table, entity_type in WfsIncrementalBuild.page_join_tables:
+			for record in self.m_state["tables"][table].values():
+				if record[1] in joined_pages:
+					affected[entity_type].add(record[2])
+
+		# 7. Book role type and source type counts accumulate over the books in order (see
+		#    WfsScrapBooks.save_people_roles and save_source_types), so a change to the people roles or
+		#    source types of one book affects each book after it
+		for index in range(len(p_scrapbooks.m_books)):
+			if p_scrapbooks.m_books[index]["id"] in tally_books:
+				for book in p_scrapbooks.m_books[index:]:
+					affected["books"].add(book["id"])
+				break
+
+		# 8. Keyword IDs are assigned over the whole vocabulary, so if any moved all keywords are rewritten
+		if self.m_previous_state["keywords_to_ids"] != keywords_to_ids:
+			self.m_all_keywords_affected = True
+
+		print("Incremental build: {0} changed records, rewriting {1} of {2} books, {3} people, {4} places, {5} sources, {6} keywords".format(
+			change_count,
+			len([book for book in p_scrapbooks.m_books if book["id"] in affected["books"]]),
+			len(p_scrapbooks.m_books),
+			len(affected["people"]), len(affected["places"]), len(affected["sources"]),
+			"all" if self.m_all_keywords_affected else len(affected["keywords"] & set(keywords_to_ids))))
+
+	def fingerprint_export(self, p_input_path, p_json_file_date):
+
+		for table, key_field, ref_fields in export_tables:
+
+			# Save each record's fingerprint along with the IDs it refers to
+			records = {}
+			for entry in read_records(export_filename(p_input_path, table, p_json_file_date)):
+				records[entry[key_field]] = [fingerprint_record(entry)] + [entry[field] for field in ref_fields]
+
+			self.m_state["tables"][table] = records
+
+	def has_affected(self, p_type):
+
+		return self.affected_ids(p_type) is None or len(self.m_affected[p_type]) > 0
+
+	def is_book_affected(self, p_book_id):
+
+		return self.m_full_rebuild or p_book_id in self.m_affected["books"]
+
+	def patch_entries(self, p_output_filename, p_entries_dict, p_type, p_section=None):
+
+		# Entries whose stats were all recomputed are output as is
+		affected_ids = self.affected_ids(p_type)
+		if affected_ids is None:
+			return p_entries_dict
+
+		# Keyword entries are keyed by keyword ID
+		if "keywords" == p_type:
+			keywords_to_ids = self.m_state["keywords_to_ids"]
+			affected_ids = set(keywords_to_ids[kw] for kw in affected_ids if kw in keywords_to_ids)
+
+		# Read the previous output
+		with open(p_output_filename, "r") as input_file:
+			previous_json = json.loads(input_file.read())
+		if p_section is not None:
+			previous_json = previous_json[p_section]
+
+		# Take recomputed entries for affected and new IDs, and previous entries for the rest
+		patched_dict = {}
+		for entry_id in p_entries_dict:
+			if entry_id in affected_ids or entry_id not in previous_json:
+				patched_dict[entry_id] = p_entries_dict[entry_id]
+			else:
+				patched_dict[entry_id] = previous_json[entry_id]
+
+		return patched_dict
+
+	def read_previous_state(self):
+
+		if not os.path.isfile(self.m_state_filename):
+			return None
+
+		with open(self.m_state_filename, "r") as input_file:
+			previous_state = json.loads(input_file.read())
+
+		# Previous state must be from this version, for this output folder and its files, with all of its outputs present
+		if WfsIncrementalBuild.state_version != previous_state["version"] or \
+		   self.m_output_path != previous_state["output_path"] or \
+		   self.m_state["shards"] != previous_state.get("shards", 0) or \
+		   self.m_state["binary"] != previous_state.get("binary", False) or \
+		   self.m_state["canonical"] != previous_state.get("canonical", False):
+			return None
+		for output_filename in previous_state["outputs"]:
+			if not os.path.isfile(self.m_output_path + output_filename):
+				print("Incremental build: previous output {0} is missing".format(output_filename))
+				return None
+
+		return previous_state
+
+	def save(self, p_scrapbooks):
+
+		# Outputs that the next incremental build will patch
+		self.m_state["outputs"] = p_scrapbooks.output_filenames(self.m_state["shards"], self.m_state["binary"])
+
+		state_path = os.path.dirname(self.m_state_filename)
+		if len(state_path) > 0 and not os.path.isdir(state_path):
+			os.makedirs(state_path)
+		# Through a temporary file (see write_json), so an interrupted save leaves the last state whole
+		write_json(self.m_state_filename, self.m_state)
+
+
+class WfsStageProfiler:
+
+	def __init__(self, p_json_file_date):
+
+		self.m_json_file_date = p_json_file_date
+
+		# Name, wall and CPU seconds, peak memory so far, and record count of each stage, in the order run
+		self.m_stages = []
+
+		# Stage being timed, and the wall and CPU times it started at
+		self.m_stage_name = None
+		self.m_start_wall = 0.0
+		self.m_start_cpu = 0.0
+		self.m_run_start_wall = time.time()
+		self.m_run_start_cpu = self.cpu_seconds()
+
+	def cpu_seconds(self):
+
+		# User and system time of this process and of its finished child processes (e.g. output workers)
+		times = os.times()
+		return times[0] + times[1] + times[2] + times[3]
+
+	def peak_rss_mb(self):
+
+		# Largest resident set size of this process so far (not available on Windows)
+		if resource is None:
+			return None
+		peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if "darwin" == sys.platform:
+			return round(peak_rss / 1048576.0, 1)
+		return round(peak_rss / 1024.0, 1)
+
+	def report(self):
+
+		return { "date": self.m_json_file_date,
+				 "stages": self.m_stages,
+				 "total": { "wall_seconds": round(time.time() - self.m_run_start_wall, 4),
+							"cpu_seconds": round(self.cpu_seconds() - self.m_run_start_cpu, 4),
+							"peak_rss_mb": self.peak_rss_mb() } }
+
+	def save(self, p_report_filename):
+
+		report_path = os.path.dirname(p_report_filename)
+		if len(report_path) > 0 and not os.path.isdir(report_path):
+			os.makedirs(report_path)
+		with open(p_report_filename, "w") as output_file:
+			output_file.write(json.dumps(self.report(), indent=1, sort_keys=True))
+
+	def start(self, p_stage_name):
+
+		self.m_stage_name = p_stage_name
+		self.m_start_wall = time.time()
+		self.m_start_cpu = self.cpu_seconds()
+
+	def stop(self, p_records=None):
+
+		self.m_stages.append({ "name": self.m_stage_name,
+							   "wall_seconds": round(time.time() - self.m_start_wall, 4),
+							   "cpu_seconds": round(self.cpu_seconds() - self.m_start_cpu, 4),
+							   "peak_rss_mb": self.peak_rss_mb(),
+							   "records": p_records })
+		self.m_stage_name = None
+
+
+class WfsBinaryEncoder:
+
+	# Binary form of an output's JSON: MessagePack with two extension types. Strings used more than once
+	# are written once, in a string table at the start of the file (most used first), and referred to by
+	# index (binary_string_type), and IDs (decimal strings) are written as integers (binary_id_type).
+	# A file is the array [binary_format, binary_version, string table, JSON]
+	def __init__(self, p_sort_keys=False):
+
+		self.m_sort_keys = p_sort_keys
+		self.m_buffer = bytearray()
+		self.m_string_indices = {}
+
+	def count_strings(self, p_json, p_counts):
+
+		if isinstance(p_json, str):
+			if not binary_id_regex.match(p_json):
+				p_counts[p_json] += 1
+		elif isinstance(p_json, dict):
+			for key in self.keys(p_json):
+				self.count_strings(json_key(key), p_counts)
+				self.count_strings(p_json[key], p_counts)
+		elif isinstance(p_json, (list, tuple)):
+			for item in p_json:
+				self.count_strings(item, p_counts)
+
+	def encode(self, p_json):
+
+		# 1. Strings used more than once go in the table, unless they are shorter than a reference to them
+		#    (strings used as often are in the order first written, so the same bytes give the same table)
+		counts = Counter()
+		self.count_strings(p_json, counts)
+		string_table = [string for string, count in sorted(counts.items(), key=lambda item: -item[1])
+						if count > 1 and len(string.encode("utf-8")) > 2]
+
+		# 2. Write the header and table, then the JSON
+		self.write_header(4, 0x90, 0xdc, 0xdd)
+		self.write_string(binary_format)
+		self.write_value(binary_version)
+		self.write_header(len(string_table), 0x90, 0xdc, 0xdd)
+		for string in string_table:
+			self.write_string(string)
+		self.m_string_indices = dict((string, index) for index, string in enumerate(string_table))
+		self.write_value(p_json)
+
+		return bytes(self.m_buffer)
+
+	def keys(self, p_json_dict):
+
+		# Keys of a dict in the order written
+		return sorted(p_json_dict, key=json_key) if self.m_sort_keys else p_json_dict
+
+	def write_extension(self, p_type, p_value):
+
+		# Fixed-size extension holding an unsigned integer in 1, 2, 4, or 8 bytes
+		if p_value < 0x100:
+			self.m_buffer += struct.pack(">BbB", 0xd4, p_type, p_value)
+		elif p_value < 0x10000:
+			self.m_buffer += struct.pack(">BbH", 0xd5, p_type, p_value)
+		elif p_value < 0x100000000:
+			self.m_buffer += struct.pack(">BbI", 0xd6, p_type, p_value)
+		else:
+			self.m_buffer += struct.pack(">BbQ", 0xd7, p_type, p_value)
+
+	def write_header(self, p_length, p_fix_code, p_code_16, p_code_32):
+
+		# Array or map header (fixed size up to 15 items)
+		if p_length < 16:
+			self.m_buffer.append(p_fix_code | p_length)
+		elif p_length < 0x10000:
+			self.m_buffer += struct.pack(">BH", p_code_16, p_length)
+		else:
+			self.m_buffer += struct.pack(">BI", p_code_32, p_length)
+
+	def write_integer(self, p_value):
+
+		if 0 <= p_value < 0x80:
+			self.m_buffer.append(p_value)
+		elif -32 <= p_value < 0:
+			self.m_buffer.append(p_value & 0xff)
+		elif 0 <= p_value < 0x100:
+			self.m_buffer += struct.pack(">BB", 0xcc, p_value)
+		elif 0 <= p_value < 0x10000:
+			self.m_buffer += struct.pack(">BH", 0xcd, p_value)
+		elif 0 <= p_value < 0x100000000:
+			self.m_buffer += struct.pack(">BI", 0xce, p_value)
+		elif 0 <= p_value:
+			self.m_buffer += struct.pack(">BQ", 0xcf, p_value)
+		elif -0x80 <= p_value:
+			self.m_buffer += struct.pack(">Bb", 0xd0, p_value)
+		elif -0x8000 <= p_value:
+			self.m_buffer += struct.pack(">Bh", 0xd1, p_value)
+		elif -0x80000000 <= p_value:
+			self.m_buffer += struct.pack(">Bi", 0xd2, p_value)
+		else:
+			self.m_buffer += struct.pack(">Bq", 0xd3, p_value)
+
+	def write_string(self, p_string):
+
+		data = p_string.encode("utf-8")
+		if len(data) < 32:
+			self.m_buffer.append(0xa0 | len(data))
+		elif len(data) < 0x100:
+			self.m_buffer += struct.pack(">BB", 0xd9, len(data))
+		elif len(data) < 0x10000:
+			self.m_buffer += struct.pack(">BH", 0xda, len(data))
+		else:
+			self.m_buffer += struct.pack(">BI", 0xdb, len(data))
+		self.m_buffer += data
+
+	def write_value(self, p_json):
+
+		if p_json is None:
+			self.m_buffer.append(0xc0)
+		elif p_json is True:
+			self.m_buffer.append(0xc3)
+		elif p_json is False:
+			self.m_buffer.append(0xc2)
+		elif isinstance(p_json, int):
+			self.write_integer(p_json)
+		elif isinstance(p_json, float):
+			self.m_buffer += struct.pack(">Bd", 0xcb, p_json)
+		elif isinstance(p_json, str):
+			if binary_id_regex.match(p_json):
+				self.write_extension(binary_id_type, int(p_json))
+			elif p_json in self.m_string_indices:
+				self.write_extension(binary_string_type, self.m_string_indices[p_json])
+			else:
+				self.write_string(p_json)
+		elif isinstance(p_json, dict):
+			self.write_header(len(p_json), 0x80, 0xde, 0xdf)
+			for key in self.keys(p_json):
+				self.write_value(json_key(key))
+				self.write_value(p_json[key])
+		else:
+			self.write_header(len(p_json), 0x90, 0xdc, 0xdd)
+			for item in p_json:
+				self.write_value(item)
+
+
+class WfsBinaryDecoder:
+
+	# Reads the JSON back from a binary output (see WfsBinaryEncoder), with the msgpack module's C reader
+	# if it is installed (p_native), and in Python otherwise
+	def __init__(self, p_data, p_native=True):
+
+		self.m_data = p_data
+		self.m_offset = 0
+		self.m_strings = []
+		self.m_native = p_native and msgpack is not None
+
+	def decode(self):
+
+		if self.m_native:
+			return self.decode_native()
+
+		# Header, string table, then the JSON
+		header_length = self.read_length(self.read_byte(), 0x90, 0xdc, 0xdd)
+		if 4 != header_length or binary_format != self.read_value() or binary_version != self.read_value():
+			raise ValueError("Not a version {0} {1} file".format(binary_version, binary_format))
+		self.m_strings = self.read_value()
+		json_value = self.read_value()
+		if self.m_offset != len(self.m_data):
+			raise ValueError("{0} bytes left over after the JSON".format(len(self.m_data) - self.m_offset))
+
+		return json_value
+
+	def decode_native(self):
+
+		# Same as decode, with extensions turned back into strings as msgpack reads them. The same extension
+		# bytes come up many times over, so each is only turned into its string once
+		extension_cache = { binary_string_type: {}, binary_id_type: {} }
+
+		def read_extension(p_type, p_data):
+			type_cache = extension_cache.get(p_type)
+			if type_cache is None:
+				raise ValueError("Unknown extension type {0}".format(p_type))
+			string = type_cache.get(p_data)
+			if string is None:
+				value = int.from_bytes(p_data, "big")
+				string = self.m_strings[value] if binary_string_type == p_type else str(value)
+				type_cache[p_data] = string
+			return string
+
+		unpacker = msgpack.Unpacker(ext_hook=read_extension, raw=False, strict_map_key=False,
+									max_buffer_size=max(len(self.m_data), 1))
+		unpacker.feed(self.m_data)
+		try:
+			header_length = unpacker.read_array_header()
+			if 4 != header_length or binary_format != unpacker.unpack() or binary_version != unpacker.unpack():
+				raise ValueError("Not a version {0} {1} file".format(binary_version, binary_format))
+			self.m_strings = unpacker.unpack()
+			json_value = unpacker.unpack()
+		except msgpack.OutOfData:
+			raise ValueError("Truncated {0} file".format(binary_format))
+		if unpacker.tell() != len(self.m_data):
+			raise ValueError("{0} bytes left over after the JSON".format(len(self.m_data) - unpacker.tell()))
+
+		return json_value
+
+	def read_byte(self):
+
+		value = self.m_data[self.m_offset]
+		self.m_offset += 1
+		return value
+
+	def read_length(self, p_code, p_fix_code, p_code_16, p_code_32):
+
+		if p_code_16 == p_code:
+			return self.unpack(">H", 2)
+		if p_code_32 == p_code:
+			return self.unpack(">I", 4)
+		return p_code - p_fix_code
+
+	def read_value(self):
+
+		data = self.m_data
+		code = data[self.m_offset]
+		self.m_offset += 1
+
+		# Fixed size integers, strings, maps, and arrays (the most common codes, checked first)
+		if code < 0x80:
+			return code
+		if 0xa0 <= code < 0xc0:
+			return self.read_string(code - 0xa0)
+		if code < 0x90:
+			json_dict = {}
+			for index in range(code - 0x80):
+				key = self.read_value()
+				json_dict[key] = self.read_value()
+			return json_dict
+		if code < 0xa0:
+			return [self.read_value() for index in range(code - 0x90)]
+
+		# Extensions: string table references and integer-encoded IDs
+		if 0xd4 <= code <= 0xd7:
+			extension_type, value = binary_extension_structs[code - 0xd4].unpack_from(data, self.m_offset)
+			self.m_offset += 1 + (1 << (code - 0xd4))
+			if binary_string_type == extension_type:
+				return self.m_strings[value]
+			if binary_id_type == extension_type:
+				return str(value)
+			raise ValueError("Unknown extension type {0}".format(extension_type))
+
+		if code >= 0xe0:
+			return code - 0x100
+		if 0xc0 == code:
+			return None
+		if 0xc2 == code:
+			return False
+		if 0xc3 == code:
+			return True
+		if 0xcb == code:
+			return self.unpack(">d", 8)
+		if 0xd9 == code:
+			return self.read_string(self.unpack(">B", 1))
+		if 0xda == code:
+			return self.read_string(self.unpack(">H", 2))
+		if 0xdb == code:
+			return self.read_string(self.unpack(">I", 4))
+		if 0xdc == code or 0xdd == code:
+			return [self.read_value() for index in range(self.read_length(code, 0x90, 0xdc, 0xdd))]
+		if 0xde == code or 0xdf == code:
+			json_dict = {}
+			for index in range(self.read_length(code, 0x80, 0xde, 0xdf)):
+				key = self.read_value()
+				json_dict[key] = self.read_value()
+			return json_dict
+		if 0xcc <= code <= 0xcf:
+			return self.unpack(">" + "BHIQ"[code - 0xcc], 1 << (code - 0xcc))
+		if 0xd0 <= code <= 0xd3:
+			return self.unpack(">" + "bhiq"[code - 0xd0], 1 << (code - 0xd0))
+
+		raise ValueError("Unknown type code 0x{0:02x} at byte {1}".format(code, self.m_offset - 1))
+
+	def read_string(self, p_length):
+
+		value = self.m_data[self.m_offset:self.m_offset + p_length].decode("utf-8")
+		self.m_offset += p_length
+		return value
+
+	def unpack(self, p_format, p_size):
+
+		value = struct.unpack_from(p_format, self.m_data, self.m_offset)[0]
+		self.m_offset += p_size
+		return value
+
+
+class WfsHashingWriter:
+
+	# Binary file wrapper that encodes, hashes, and counts the bytes of the text (or bytes) written through it.
+	# Without a file, the bytes are only hashed and counted
+	def __init__(self, p_file=None):
+
+		self.m_file = p_file
+		self.m_sha256 = hashlib.sha256()
+		self.m_size = 0
+
+	def output_info(self):
+
+		# Manifest entry of the bytes written
+		return { "sha256": self.m_sha256.hexdigest(), "size": self.m_size }
+
+	def write(self, p_text):
+
+		data = p_text if isinstance(p_text, bytes) else p_text.encode("utf-8")
+		self.m_sha256.update(data)
+		self.m_size += len(data)
+		if self.m_file is not None:
+			self.m_file.write(data)
+
+
+class WfsOutputManifest:
+
+	def __init__(self, p_output_path):
+
+		self.m_output_path = p_output_path
+		self.m_filename = p_output_path + "wfs_manifest.json"
+
+		# Content hash and size of each output, as of the last build and as written by this one
+		self.m_previous_files = self.read()
+		self.m_files = {}
+
+		# Whether each output listed by the last build still has the contents listed (see previous)
+		self.m_previous_checked = {}
+
+		# Outputs written and left unchanged by this build
+		self.m_written = 0
+		self.m_unchanged = 0
+
+	def previous(self, p_output_filename):
+
+		# Manifest entry of the output from the last build, if the file is still as listed. The file is hashed
+		# (once per build) rather than trusted, so that a file changed since, even to the same size, is written again
+		if p_output_filename not in self.m_previous_files:
+			return None
+		output_info = self.m_previous_files[p_output_filename]
+		if p_output_filename not in self.m_previous_checked:
+			filename = self.m_output_path + p_output_filename
+			self.m_previous_checked[p_output_filename] = os.path.isfile(filename) and \
+				os.path.getsize(filename) == output_info["size"] and hash_file(filename) == output_info["sha256"]
+		if not self.m_previous_checked[p_output_filename]:
+			return None
+
+		return output_info
+
+	def read(self):
+
+		if not os.path.isfile(self.m_filename):
+			return {}
+
+		with open(self.m_filename, "r") as input_file:
+			manifest = json.loads(input_file.read())
+
+		# Entries without a size are from before sizes were listed
+		previous_files = {}
+		for output_filename in manifest:
+			if "sha256" in manifest[output_filename] and "size" in manifest[output_filename]:
+				previous_files[output_filename] = manifest[output_filename]
+
+		return previous_files
+
+	def save(self, p_output_filenames):
+
+		# Outputs that this build did not write (e.g. books an incremental build left alone) keep their entries
+		manifest = {}
+		for output_filename in p_output_filenames:
+			if output_filename in self.m_files:
+				manifest[output_filename] = self.m_files[output_filename]
+			elif self.previous(output_filename) is not None:
+				manifest[output_filename] = self.previous(output_filename)
+			elif os.path.isfile(self.m_output_path + output_filename):
+				manifest[output_filename] = { "sha256": hash_file(self.m_output_path + output_filename),
+											  "size": os.path.getsize(self.m_output_path + output_filename) }
+
+		with open(self.m_filename + ".tmp", "w") as output_file:
+			output_file.write(json.dumps(manifest, indent=1, sort_keys=True))
+		replace_file(self.m_filename + ".tmp", self.m_filename)
+
+	def update(self, p_output_filename, p_output_info, p_written):
+
+		self.m_files[p_output_filename] = p_output_info
+		if p_written:
+			self.m_written += 1
+		else:
+			self.m_unchanged += 1
+
+
+class WfsOutputScheduler:
+
+	def __init__(self, p_workers=1, p_canonical=False, p_manifest=None, p_binary=False):
+
+		self.m_workers = p_workers
+
+		# Canonical outputs are written with sorted keys and ID lists (see canonical_json)
+		self.m_canonical = p_canonical
+
+		# Each output can also be written in the binary format (see WfsBinaryEncoder)
+		self.m_binary = p_binary
+
+		# Outputs are listed in the manifest, and only rewritten if their contents changed
+		self.m_manifest = p_manifest
+
+		# Output files to write as (filename, json, stream depth, canonical, previous manifest entry, binary)
+		self.m_jobs = []
+
+		# Compressed copies of the outputs made and left unchanged (see compress)
+		self.m_compressed_written = 0
+		self.m_compressed_unchanged = 0
+
+	def add(self, p_filename, p_json, p_stream_depth=0):
+
+		filenames = [p_filename] if not self.m_binary else [p_filename, binary_filename(p_filename)]
+		for filename in filenames:
+			previous = None
+			if self.m_manifest is not None:
+				previous = self.m_manifest.previous(os.path.basename(filename))
+			self.m_jobs.append((filename, p_json, p_stream_depth, self.m_canonical, previous, filename != p_filename))
+
+	def run(self):
+
+		global scheduled_output_jobs
+
+		# 1. Write the outputs in order in this process
+		if self.m_workers <= 1 or len(self.m_jobs) <= 1:
+			results = [write_output_job(job) for job in self.m_jobs]
+
+		# 2. Or serialise and write them in a pool of worker processes. Each file is still written whole
+		#    by one worker with the same encoder, so file contents don't depend on the number of workers
+		else:
+			# Workers forked when the pool starts inherit the jobs, so the built objects aren't pickled over to them
+			# (fork has to be asked for, as it is no longer the default start method everywhere it is available)
+			scheduled_output_jobs = self.m_jobs
+			context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+			pool = context.Pool(min(self.m_workers, len(self.m_jobs)))
+			try:
+				if hasattr(os, "fork"):
+					results = pool.map(write_scheduled_output_job, range(len(self.m_jobs)), 1)
+				else:
+					results = pool.map(write_output_job, self.m_jobs, 1)
+			finally:
+				pool.close()
+				pool.join()
+				scheduled_output_jobs = []
+
+		# 3. List each output's hash and size (the workers return them) in the manifest
+		if self.m_manifest is not None:
+			for job, result in zip(self.m_jobs, results):
+				self.m_manifest.update(os.path.basename(job[0]), result[0], result[1])
+
+		self.m_jobs = []
+
+	def compress(self, p_output_filenames, p_formats):
+
+		# Pre-compressed copies of the outputs (e.g. wfs_people.json.gz), so the web server doesn't compress
+		# them for each request. Each is only made again when its output's contents change
+		output_path = self.m_manifest.m_output_path
+		compressed_filenames = []
+		jobs = []
+		for output_filename in p_output_filenames:
+
+			# 1. Content hash of the output as written (or left unchanged) by this build
+			output_info = self.m_manifest.m_files.get(output_filename, self.m_manifest.previous(output_filename))
+			if output_info is None:
+				continue
+
+			for compression in p_formats:
+				compressed_filename = output_filename + "." + compression
+				compressed_filenames.append(compressed_filename)
+
+				# 2. Keep the compressed copy made from the same contents
+				previous = self.m_manifest.previous(compressed_filename)
+				if previous is not None and previous.get("source_sha256") == output_info["sha256"]:
+					self.m_manifest.m_files[compressed_filename] = previous
+					self.m_compressed_unchanged += 1
+				else:
+					jobs.append((output_path + output_filename, compression))
+
+		# 3. Compress the others in a pool of worker processes
+		if self.m_workers <= 1 or len(jobs) <= 1:
+			results = [compress_output_job(job) for job in jobs]
+		else:
+			context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+			pool = context.Pool(min(self.m_workers, len(jobs)))
+			try:
+				results = pool.map(compress_output_job, jobs, 1)
+			finally:
+				pool.close()
+				pool.join()
+
+		for job, result in zip(jobs, results):
+			self.m_manifest.m_files[os.path.basename(job[0]) + "." + job[1]] = result
+			self.m_compressed_written += 1
+
+		return compressed_filenames
+
+# Jobs of the running WfsOutputScheduler, for its forked worker processes
+scheduled_output_jobs = []
+
+def write_output_job(p_job):
+
+	if p_job[5]:
+		return write_binary(p_job[0], p_job[1], p_job[3], p_job[4])
+	return write_json(p_job[0], p_job[1], p_job[2], p_job[3], p_job[4])
+
+def write_scheduled_output_job(p_job_index):
+
+	return write_output_job(scheduled_output_jobs[p_job_index])
+
+def compress_output_job(p_job):
+
+	# Compressed copy of an output: gzip (with no timestamp or filename, so the same output always gives
+	# the same bytes) or brotli. Its manifest entry lists the hash of the output it was made from
+	output_filename, compression = p_job
+	with open(output_filename, "rb") as input_file:
+		data = input_file.read()
+	if "gz" == compression:
+		compressed_data = gzip.compress(data, 9, mtime=0)
+	else:
+		compressed_data = brotli.compress(data)
+
+	compressed_filename = output_filename + "." + compression
+	with open(compressed_filename + ".tmp", "wb") as output_file:
+		output_file.write(compressed_data)
+	replace_file(compressed_filename + ".tmp", compressed_filename)
+
+	return { "sha256": hashlib.sha256(compressed_data).hexdigest(), "size": len(compressed_data),
+			 "source_sha256": hashlib.sha256(data).hexdigest() }
+
+
+def parse_args(p_args=None):
+
+	# Command line options
+	parser = argparse.ArgumentParser(description="Transforms a Working from Scraps database export into the project site's JSON")
+	parser.add_argument("--date", default="20191025",
+						help="date of the export's JSON files (default: %(default)s)")
+	parser.add_argument("--input-path", help="folder with the export's JSON files (default: input/<date>/)")
+	parser.add_argument("--output-path", help="folder to write the site's JSON files to (default: output/)")
+	parser.add_argument("--cache-path", help="folder for data kept between runs (default: cache/)")
+	parser.add_argument("--incremental", action="store_true",
+						help="only rewrite the outputs affected by records changed since the last incremental build")
+	parser.add_argument("--description-cache-size", type=int, default=8388608,
+						help="characters of rendered page descriptions kept in cache/ between runs, 0 to turn off (default: %(default)s)")
+	parser.add_argument("--compact-pages", action="store_true",
+						help="keep pages in memory as compact records, for exports too large for page dicts")
+	parser.add_argument("--canonical", action="store_true",
+						help="write byte-stable outputs: keywords numbered alphabetically, sorted keys and ID lists")
+	parser.add_argument("--workers", type=int, default=1,
+						help="number of processes writing output files in parallel (default: %(default)s)")
+	parser.add_argument("--binary", action="store_true",
+						help="also write each output in a compact binary form (MessagePack with a string table and "
+							 "integer IDs), e.g. wfs_people.wfsb, readable with read_binary")
+	parser.add_argument("--compress", nargs="?", const="gz", metavar="FORMATS",
+						help="also write compressed copies of the JSON outputs, gz and/or br (comma-separated, "
+							 "default: gz), made again only when an output's contents change")
+	parser.add_argument("--shards", type=int, default=0,
+						help="split the people, places, and sources outputs into this many files by ID, each with an "
+							 "index of the file each ID is in (default: %(default)s, one file each)")
+	parser.add_argument("--staging-db", nargs="?", const="", metavar="FILE",
+						help="load the export's tables into a SQLite staging store and run the joins there, "
+							 "reusing the tables whose files are unchanged since FILE was loaded (default: cache/staging.sqlite)")
+	parser.add_argument("--stage-report",
+						help="file to write each stage's time, memory, and record count to (default: cache/stage_report.json)")
+	parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+						help="profile the run with cProfile, list its hottest functions, and dump the "
+							 "data to FILE (default: cache/profile.pstats)")
+
+	args = parser.parse_args(p_args)
+	if args.compress is not None:
+		for compression in args.compress.split(","):
+			if compression not in ["gz", "br"]:
+				parser.error("--compress formats are gz and br, not {0}".format(compression))
+			if "br" == compression and brotli is None:
+				parser.error("--compress br needs the brotli module")
+
+	return args
 
 def main():
 
-	# print anchor_routes_from_formatted_text("This is |Edwin Morgan[1]|", "/collection/person")
+	# print(anchor_routes_from_formatted_text("This is |Edwin Morgan[1]|", "/collection/person"))
 
-	# 1. Path and filename definitions
+	# 0. Command line options
+	args = parse_args()
+	if args.profile is None:
+		run_pipeline(args)
+		return
 
-	# Date of JSON files
-	# json_file_date = "20180206"
-	# json_file_date = "20180327"
-	# json_file_date = "20180405"
-	# json_file_date = "20180409"
-	# json_file_date = "20180613"
-	# json_file_date = "20181014"
-	# json_file_date = "20190830"
-	json_file_date = "20191025"
+	# Profile the whole run, listing the functions it spends the most time in
+	profiler = cProfile.Profile()
+	profiler.runcall(run_pipeline, args)
 
-	# JSON paths
-	input_path = os.getcwd() + os.sep + "input" + os.sep + json_file_date + os.sep
-	output_path = os.getcwd() + os.sep + "output" + os.sep
+	profile_filename = args.profile
+	if 0 == len(profile_filename):
+		cache_path = os.getcwd() + os.sep + "cache" + os.sep
+		if args.cache_path is not None:
+			cache_path = os.path.join(args.cache_path, "")
+		if not os.path.isdir(cache_path):
+			os.makedirs(cache_path)
+		profile_filename = cache_path + "profile.pstats"
+	profiler.dump_stats(profile_filename)
+
+	print("cProfile data written to {0}".format(profile_filename))
+	pstats.Stats(profiler).sort_stats("tottime").print_stats(25)
+
+def build_model(p_args, p_input_path, p_cache_path, p_stages, p_build=None):
+
+	# Collection model (books, pages, people, places, sources, and keywords with their stats) that the outputs,
+	# and the query server (see wfs_query_server.py), are made from
+	json_file_date = p_args.date
 
 	# Book JSON
-	scrapbooks_json_filename = input_path + "Scrapbook_{0}.json".format(json_file_date)
-	pages_json_filename = input_path + "Scrapbook_Page_{0}.json".format(json_file_date)
+	scrapbooks_json_filename = export_filename(p_input_path, "Scrapbook", json_file_date)
+	pages_json_filename = export_filename(p_input_path, "Scrapbook_Page", json_file_date)
 
 	# Book things JSON
-	people_json_filename = input_path + "Page_Associated_People_{0}.json".format(json_file_date)
-	places_json_filename = input_path + "Page_Places_Named_{0}.json".format(json_file_date)
-	sources_json_filename = input_path + "Page_Associated_Sources_{0}.json".format(json_file_date)
+	people_json_filename = export_filename(p_input_path, "Page_Associated_People", json_file_date)
+	places_json_filename = export_filename(p_input_path, "Page_Places_Named", json_file_date)
+	sources_json_filename = export_filename(p_input_path, "Page_Associated_Sources", json_file_date)
 
 	# Book joins JSON
-	page_people_join_json_filename = input_path + "Page_People_Join_{0}.json".format(json_file_date)
-	page_places_join_json_filename = input_path + "Page_Places_Named_Join_{0}.json".format(json_file_date)
-	page_sources_join_json_filename = input_path + "Page_Associated_Sources_Join_{0}.json".format(json_file_date)
+	page_people_join_json_filename = export_filename(p_input_path, "Page_People_Join", json_file_date)
+	page_places_join_json_filename = export_filename(p_input_path, "Page_Places_Named_Join", json_file_date)
+	page_sources_join_json_filename = export_filename(p_input_path, "Page_Associated_Sources_Join", json_file_date)
 	
 	# Sources JSON
-	sources_people_join_json_filename = input_path + "Sources_People_Join_{0}.json".format(json_file_date)
-
+	sources_people_join_json_filename = export_filename(p_input_path, "Sources_People_Join", json_file_date)
+
+	# Page descriptions rendered by earlier runs
+	description_cache_filename = p_cache_path + "descriptions.json"
+
+	# Tables of the export can be loaded into a staging store, which the joins and stats are run in
+	store = None
+	if p_args.staging_db is not None:
+		p_stages.start("staging")
+		staging_db_filename = p_args.staging_db
+		if 0 == len(staging_db_filename):
+			staging_db_filename = p_cache_path + "staging.sqlite"
+		store = WfsStagingStore(staging_db_filename, p_input_path, json_file_date)
+		print("Staging store: {0} tables loaded, {1} reused".format(len(store.m_loaded_tables), len(store.m_reused_tables)))
+		p_stages.stop(store.m_staged_records)
 
 	# 2. Ingest JSON in hierarchical fashion, from leaves up to root(s)
 
 	# Ingest people, places, sources json
-	people = WfsPeople(people_json_filename)
-	places = WfsPlaces(places_json_filename)
-	sources = WfsSources(sources_json_filename, sources_people_join_json_filename)	
-
-	# Ingest pages json
+	p_stages.start("ingest_people")
+	people = WfsPeople(people_json_filename, store)
+	p_stages.stop(len(people.m_people))
+
+	p_stages.start("ingest_places")
+	places = WfsPlaces(places_json_filename, store)
+	p_stages.stop(len(places.m_places))
+
+	p_stages.start("ingest_sources")
+	sources = WfsSources(sources_json_filename, sources_people_join_json_filename, store)	
+	p_stages.stop(len(sources.m_sources))
+
+	# Ingest pages json (rendering their descriptions through the cache, if kept)
+	p_stages.start("ingest_pages")
+	description_cache = None
+	if p_args.description_cache_size > 0:
+		description_cache = WfsDescriptionCache(description_cache_filename, p_max_size=p_args.description_cache_size)
 	pages = WfsPages(pages_json_filename,
 					 page_people_join_json_filename,
 					 page_places_join_json_filename,
-					 page_sources_join_json_filename)
+					 page_sources_join_json_filename,
+					 description_cache,
+					 p_args.compact_pages,
+					 store,
+					 p_args.canonical)
+	if description_cache is not None:
+		description_cache.save()
+	p_stages.stop(len(pages.m_pages))
 
 	# Ingest book json
-	scrapbooks = WfsScrapBooks(scrapbooks_json_filename)
+	p_stages.start("ingest_scrapbooks")
+	scrapbooks = WfsScrapBooks(scrapbooks_json_filename, store)
+	p_stages.stop(len(scrapbooks.m_books))
 
 	# 3. Save statistics
 
 	# Save page statistics
+	p_stages.start("pages_stats")
 	pages.save_stats(people, places, sources)
+	p_stages.stop(len(pages.m_pages))
 
 	# Save book statistics
-	scrapbooks.save_stats(pages)
+	p_stages.start("scrapbooks_stats")
+	scrapbooks.save_stats(pages, p_args.canonical)
+	p_stages.stop(len(scrapbooks.m_books))
+
+	# Find the books, people, places, sources, and keywords affected by changed records
+	if p_build is not None:
+		p_stages.start("incremental_affected")
+		p_build.find_affected(scrapbooks, pages)
+		p_stages.stop(sum(len(affected_ids) for affected_ids in p_build.m_affected.values()))
 
 	# Save people statistics
-	people.save_stats(pages)
+	p_stages.start("people_stats")
+	people.save_stats(pages, None if p_build is None else p_build.affected_ids("people"))
+	p_stages.stop(len(people.m_people))
 
 	# Save places statistics
-	places.save_stats(pages)
+	p_stages.start("places_stats")
+	places.save_stats(pages, None if p_build is None else p_build.affected_ids("places"))
+	p_stages.stop(len(places.m_places))
 
 	# Save sources statistics
-	sources.save_stats(pages)
+	p_stages.start("sources_stats")
+	sources.save_stats(pages, None if p_build is None else p_build.affected_ids("sources"))
+	p_stages.stop(len(sources.m_sources))
+
+	if store is not None:
+		store.close()
 
 	# Secondary statistics
+	p_stages.start("secondary_stats")
 
 	# Add source type count to collection stats
 	scrapbooks.save_source_types(sources)
@@ -1483,20 +3689,143 @@ def main():
 	# Add continent count to collection stats
 	scrapbooks.save_continent_counts()
 
-	# 4. Output one collection json and amalgamated json per book
-	scrapbooks.output(pages, output_path)
+	p_stages.stop(len(scrapbooks.m_books))
+
+	# 4. Create keywords object (created later because of need for collection stats)
+	p_stages.start("keywords")
+	keywords = WfsKeywords(scrapbooks, pages, None if p_build is None else p_build.affected_ids("keywords"))
+	p_stages.stop(len(keywords.m_keywords))
+
+	return scrapbooks, pages, people, places, sources, keywords
 
-	# 5. Output dictionary json for people, places, sources
-	people.output(output_path)
-	places.output(output_path)
-	sources.output(output_path)
+def run_pipeline(p_args):
 
-	# 6. Create keywords object (created later because of need for collection stats)
-	keywords = WfsKeywords(scrapbooks, pages)
+	# 1. Path and filename definitions
 
-	# 7. Output dictionary json for keywords
-	keywords.output(output_path)
+	# Date of JSON files
+	# json_file_date = "20180206"
+	# json_file_date = "20180327"
+	# json_file_date = "20180405"
+	# json_file_date = "20180409"
+	# json_file_date = "20180613"
+	# json_file_date = "20181014"
+	# json_file_date = "20190830"
+	json_file_date = p_args.date
+
+	# JSON paths
+	input_path = os.getcwd() + os.sep + "input" + os.sep + json_file_date + os.sep
+	output_path = os.getcwd() + os.sep + "output" + os.sep
+	cache_path = os.getcwd() + os.sep + "cache" + os.sep
+	if p_args.input_path is not None:
+		input_path = os.path.join(p_args.input_path, "")
+	if p_args.output_path is not None:
+		output_path = os.path.join(p_args.output_path, "")
+	if p_args.cache_path is not None:
+		cache_path = os.path.join(p_args.cache_path, "")
+
+	# State of the last incremental build
+	build_state_filename = cache_path + "build_state.json"
+
+	# Time, memory, and record count of each stage
+	stage_report_filename = cache_path + "stage_report.json"
+	if p_args.stage_report is not None:
+		stage_report_filename = p_args.stage_report
+	stages = WfsStageProfiler(json_file_date)
+
+	# Incremental builds compare this export with the one the last incremental build was made from
+	build = None
+	if p_args.incremental:
+		stages.start("incremental_fingerprint")
+		build = WfsIncrementalBuild(build_state_filename, input_path, json_file_date, output_path, p_args.shards, p_args.binary,
+									p_args.canonical)
+		stages.stop(sum(len(records) for records in build.m_state["tables"].values()))
+	elif os.path.isfile(build_state_filename):
+		# A full build leaves that state out of date
+		os.remove(build_state_filename)
+
+	# 2-4. Ingest the export and save its statistics
+	scrapbooks, pages, people, places, sources, keywords = build_model(p_args, input_path, cache_path, stages, build)
+
+	# 5. Output one collection json and amalgamated json per book, and dictionary json
+	#    for people, places, sources, and keywords (written together, in parallel if there are workers)
+	stages.start("output")
+	manifest = WfsOutputManifest(output_path)
+	scheduler = WfsOutputScheduler(p_args.workers, p_args.canonical, manifest, p_args.binary)
+	keywords.output(output_path, build, scheduler)
+	people.output(output_path, build, scheduler, p_args.shards)
+	places.output(output_path, build, scheduler, p_args.shards)
+	sources.output(output_path, build, scheduler, p_args.shards)
+	scrapbooks.output(pages, output_path, build, scheduler)
+	scheduler.run()
+	output_filenames = scrapbooks.output_filenames(p_args.shards, p_args.binary)
+	print("Outputs: {0} written, {1} unchanged".format(manifest.m_written, manifest.m_unchanged))
+	stages.stop(manifest.m_written + manifest.m_unchanged)
+
+	# Compressed copies of the JSON outputs
+	if p_args.compress is not None:
+		stages.start("compress")
+		output_filenames.extend(scheduler.compress([output_filename for output_filename in output_filenames
+													if output_filename.endswith(".json")], p_args.compress.split(",")))
+		print("Compressed outputs: {0} written, {1} unchanged".format(
+			scheduler.m_compressed_written, scheduler.m_compressed_unchanged))
+		stages.stop(scheduler.m_compressed_written + scheduler.m_compressed_unchanged)
+
+	# List the content hash and size of each output
+	manifest.save(output_filenames)
+
+	# 6. Save the state of this export for the next incremental build
+	if build is not None:
+		stages.start("incremental_save")
+		build.save(scrapbooks)
+		stages.stop()
+
+	# 7. Report the time, memory, and records of each stage
+	stages.save(stage_report_filename)
+
+	return stages
+
+
+def diff_main(p_args):
+
+	# Command line options
+	parser = argparse.ArgumentParser(prog="py_json_joins.py diff",
+									 description="Lists the records added, removed, and changed between two database exports")
+	parser.add_argument("old_date", help="date of the older export's JSON files, e.g. 20190830")
+	parser.add_argument("new_date", help="date of the newer export's JSON files, e.g. 20191025")
+	parser.add_argument("--old-input-path", help="folder with the older export (default: input/<old_date>/)")
+	parser.add_argument("--new-input-path", help="folder with the newer export (default: input/<new_date>/)")
+	parser.add_argument("--changelog", help="file to write the record-level changelog to (default: changelog_<old_date>_<new_date>.json)")
+	args = parser.parse_args(p_args)
+
+	old_input_path = os.getcwd() + os.sep + "input" + os.sep + args.old_date + os.sep
+	new_input_path = os.getcwd() + os.sep + "input" + os.sep + args.new_date + os.sep
+	changelog_filename = "changelog_{0}_{1}.json".format(args.old_date, args.new_date)
+	if args.old_input_path is not None:
+		old_input_path = os.path.join(args.old_input_path, "")
+	if args.new_input_path is not None:
+		new_input_path = os.path.join(args.new_input_path, "")
+	if args.changelog is not None:
+		changelog_filename = args.changelog
+
+	# Compare the exports table by table
+	changelog = diff_exports(old_input_path, args.old_date, new_input_path, args.new_date)
+
+	# Summarize and output the changelog
+	for table, key_field, ref_fields in export_tables:
+		print("{0}: {1} added, {2} removed, {3} changed".format(table,
+			len(changelog["tables"][table]["added"]),
+			len(changelog["tables"][table]["removed"]),
+			len(changelog["tables"][table]["changed"])))
+
+	# Through a temporary file (see write_json), so an interrupted run never leaves half a changelog
+	temp_filename = changelog_filename + ".tmp"
+	with open(temp_filename, "w") as output_file:
+		output_file.write(json.dumps(changelog, indent=1, sort_keys=True))
+	replace_file(temp_filename, changelog_filename)
 
 
 if "__main__" == __name__:
-	main()
\ No newline at end of file
+	if len(sys.argv) > 1 and "diff" == sys.argv[1]:
+		diff_main(sys.argv[2:])
+	else:
+		main()
\ No newline at end of file
@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Tests for py_json_joins.py builds, on the export in input/most_recent/
+
+Each optional form of the outputs is checked against a plain full build of the same export.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from py_json_joins import WfsBinaryDecoder, WfsBinaryEncoder, WfsDescriptionCache, WfsStagingStore, binary_filename, brotli, \
+	diff_main, export_filename, export_tables, format_description, format_description_old, msgpack, output_shard_filenames, \
+	parse_args, read_binary, read_records, run_pipeline, shard_of
+
+
+input_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input", "most_recent", "")
+json_file_date = "20191025"
+
+# Folder of the plain build the others are compared with (see setUpModule)
+test_path = None
+
+
+def build(p_name, *p_options):
+
+	# Full build of the export into a folder of the test folder, with its own cache, returning the output folder
+	output_path = test_path + p_name + os.sep
+	if not os.path.isdir(output_path):
+		os.makedirs(output_path)
+	with contextlib.redirect_stdout(io.StringIO()):
+		run_pipeline(parse_args(["--date", json_file_date, "--input-path", input_path, "--output-path", output_path,
+								 "--cache-path", test_path + p_name + "_cache", "--description-cache-size", "0"] +
+								list(p_options)))
+	return output_path
+
+def copy_export(p_name):
+
+	# Copy of the export to change records of, in a folder of the test folder
+	export_path = test_path + p_name + os.sep
+	os.makedirs(export_path)
+	for table, key_field, ref_fields in export_tables:
+		shutil.copy(export_filename(input_path, table, json_file_date), export_path)
+	return export_path
+
+def read_output(p_output_path, p_output_filename):
+
+	with open(p_output_path + p_output_filename, "r") as input_file:
+		return json.loads(input_file.read())
+
+def read_outputs(p_output_path, p_extension=".json"):
+
+	# Bytes of each output with the extension, by file name
+	outputs = {}
+	for output_filename in sorted(os.listdir(p_output_path)):
+		if output_filename.endswith(p_extension):
+			with open(p_output_path + output_filename, "rb") as input_file:
+				outputs[output_filename] = input_file.read()
+	return outputs
+
+def setUpModule():
+
+	global test_path
+	test_path = tempfile.mkdtemp(prefix="wfs_test_") + os.sep
+	build("plain")
+
+def tearDownModule():
+
+	shutil.rmtree(test_path)
+
+
+class WfsReadRecordsTest(unittest.TestCase):
+
+	def write_export(self, p_text):
+
+		filename = test_path + "records.json"
+		with open(filename, "w", encoding="utf-8") as output_file:
+			output_file.write(p_text)
+		return filename
+
+	def test_chunk_sizes(self):
+
+		# The same records at every chunk size, with scalars and records cut off at each point
+		text = '{ "RECORDS" : [12345, 67890,true , null,-1.5e3, "a,b]" ,{"x": [1, {"y": "z\\"]"}]},\n\tfalse, 0, [], {}] }'
+		filename = self.write_export(text)
+		for chunk_size in range(1, len(text) + 2):
+			self.assertEqual(json.loads(text)["RECORDS"], list(read_records(filename, chunk_size)), chunk_size)
+
+		filename = self.write_export('{"RECORDS":[]}')
+		for chunk_size in range(1, 17):
+			self.assertEqual([], list(read_records(filename, chunk_size)))
+
+		# and on the export
+		filename = export_filename(input_path, "Scrapbook_Page", json_file_date)
+		with open(filename, "r", encoding="utf-8") as input_file:
+			records = json.loads(input_file.read())["RECORDS"]
+		for chunk_size in [7, 4093]:
+			self.assertEqual(records, list(read_records(filename, chunk_size)))
+
+	def test_malformed(self):
+
+		for text in ['{"RECORDS":[1,2,]}', '{"RECORDS":[1 2]}', '{"RECORDS":[,1]}', '{"RECORDS":[1,,2]}',
+					 '{"RECORDS":[1:2]}', '{"RECORDS":[1,2', '{"RECORDS":[1x]}', '{"RECORDS":[{"a": 1]}', '{"records":[]}']:
+			filename = self.write_export(text)
+			for chunk_size in range(1, len(text) + 2):
+				with self.assertRaises(ValueError, msg="{0} at chunk size {1}".format(text, chunk_size)):
+					list(read_records(filename, chunk_size))
+
+
+class WfsDescriptionTest(unittest.TestCase):
+
+	def format_both(self, p_str_description):
+
+		# Output of each formatter, or the type of error it raised (the old one prints unpaired pipes)
+		results = []
+		with contextlib.redirect_stdout(io.StringIO()):
+			for formatter in [format_description_old, format_description]:
+				try:
+					results.append(formatter(p_str_description))
+				except Exception as error:
+					results.append(type(error))
+		return results
+
+	def assert_same(self, p_str_description):
+
+		old_result, new_result = self.format_both(p_str_description)
+		self.assertEqual(old_result, new_result, repr(p_str_description))
+
+	def test_export(self):
+
+		# Every page description of both exports in input/most_recent/
+		for file_date in ["20190830", json_file_date]:
+			for page in read_records(export_filename(input_path, "Scrapbook_Page", file_date)):
+				self.assert_same(page["Page_desc"])
+
+	def test_edge_cases(self):
+
+		for description in ["", " ", "%", "%%", "\r\n\r\n", "%\n\n\n%", "\n\r\n\n", "<br/>", " <br/> % ",
+							"|Ann Lee [1]|", "|Ann Lee [1]||Bo [2]|", "| Ann Lee  [ 1 ] |", "|Ann Lee [1]| and |Ann Lee [1]|",
+							"|A [1]|B [2]|A [1]|", "|A [1]| B [2] |A [1]|", "|A [1]|%|A [1]|",
+							"|A |B [2]| [1]|", "||A [1]||", "|A [1] |B [2]| C|",
+							"|A [1]", "A [1]|", "|A [1]| |B", "|", "|||", "|A|", "|A| |B|", "|A\n\n[1]|", "|A [1]\r\n|",
+							"Identified Clippings: |A [1]|%\nUnidentified Clippings:", "|Identified Clippings: [1]|",
+							"Identified Clippings:Identified Clippings:", "Unidentified Clippings"]:
+			self.assert_same(description)
+
+		# Every short sequence of tokens and text
+		pieces = ["|", "A [1]", "B", " ", "%\n", "\r\n", "<br/>", "Identified Clippings:"]
+		for length in range(1, 5):
+			for sequence in itertools.product(pieces, repeat=length):
+				self.assert_same("".join(sequence))
+
+
+class WfsDescriptionCacheTest(unittest.TestCase):
+
+	def test_hits_and_evictions(self):
+
+		# Room for two of the rendered descriptions (each is the same length)
+		descriptions = ["|Ann Lee [{0}]|%\nIdentified Clippings:".format(index) for index in range(10, 14)]
+		html_size = len(format_description(descriptions[0]))
+		cache = WfsDescriptionCache(test_path + "cache_hits" + os.sep + "descriptions.json", p_max_size=2 * html_size)
+
+		for description in descriptions[:2] + descriptions[:2]:
+			self.assertEqual(format_description(description), cache.render(description))
+		self.assertEqual((2, 2), (cache.m_hits, cache.m_misses))
+
+		# Rendering a third evicts the least recently used, and using one keeps it
+		cache.render(descriptions[0])
+		cache.render(descriptions[2])
+		self.assertEqual(2, len(cache.m_entries))
+		self.assertEqual(2 * html_size, cache.m_size)
+		cache.render(descriptions[0])
+		self.assertEqual((4, 3), (cache.m_hits, cache.m_misses))
+		cache.render(descriptions[1])
+		self.assertEqual((4, 4), (cache.m_hits, cache.m_misses))
+		self.assertEqual([cache.description_key(description) for description in [descriptions[0], descriptions[1]]],
+						 list(cache.m_entries))
+
+	def test_reload(self):
+
+		cache_filename = test_path + "cache_reload" + os.sep + "descriptions.json"
+		descriptions = ["|Ann Lee [1]| and |Bo [2]|", "Unidentified Clippings:%\n\nnone", ""]
+		cache = WfsDescriptionCache(cache_filename)
+		for description in descriptions:
+			cache.render(description)
+		cache.save()
+
+		# The saved descriptions are hits for the next cache, in the same order
+		reloaded_cache = WfsDescriptionCache(cache_filename)
+		self.assertEqual(list(cache.m_entries.items()), list(reloaded_cache.m_entries.items()))
+		for description in descriptions:
+			self.assertEqual(format_description(description), reloaded_cache.render(description))
+		self.assertEqual((3, 0), (reloaded_cache.m_hits, reloaded_cache.m_misses))
+
+		# and only the most recently used that fit a smaller cap are kept
+		small_cache = WfsDescriptionCache(cache_filename, p_max_size=len(format_description(descriptions[-1])) +
+										  len(format_description(descriptions[-2])))
+		self.assertEqual(list(cache.m_entries)[1:], list(small_cache.m_entries))
+
+		# Descriptions saved by another version of the cache are not reused
+		with open(cache_filename, "w") as output_file:
+			output_file.write(json.dumps({ "version": WfsDescriptionCache.cache_version + 1,
+										   "entries": list(cache.m_entries.items()) }))
+		self.assertEqual(0, len(WfsDescriptionCache(cache_filename).m_entries))
+
+	def test_changed_text(self):
+
+		# A description whose text changes is rendered again, not served from the cache
+		cache = WfsDescriptionCache(test_path + "cache_changed" + os.sep + "descriptions.json")
+		self.assertEqual(format_description("|Ann Lee [1]|"), cache.render("|Ann Lee [1]|"))
+		self.assertEqual(format_description("|Ann Lee [2]|"), cache.render("|Ann Lee [2]|"))
+		self.assertEqual(format_description("|Ann Lee [1]| "), cache.render("|Ann Lee [1]| "))
+		self.assertEqual((0, 3), (cache.m_hits, cache.m_misses))
+
+		# and the same text under another route is too
+		routed_cache = WfsDescriptionCache(test_path + "cache_changed" + os.sep + "descriptions.json", "/people")
+		self.assertEqual(format_description("|Ann Lee [1]|", "/people"), routed_cache.render("|Ann Lee [1]|"))
+		self.assertNotEqual(cache.description_key("|Ann Lee [1]|"), routed_cache.description_key("|Ann Lee [1]|"))
+
+	def test_outputs(self):
+
+		# Builds with a cold, a warm, and a too small cache give the outputs of an uncached build
+		plain_outputs = read_outputs(test_path + "plain" + os.sep)
+		for name, cache_size in [("cached", "8388608"), ("cached", "8388608"), ("cached_small", "65536")]:
+			output_path = build(name, "--description-cache-size", cache_size)
+			outputs = read_outputs(output_path)
+			self.assertEqual(sorted(plain_outputs), sorted(outputs))
+			for output_filename in plain_outputs:
+				if "wfs_manifest.json" != output_filename:
+					self.assertEqual(plain_outputs[output_filename], outputs[output_filename], output_filename)
+
+		# The small cache kept what fits, far from all of the descriptions
+		with open(test_path + "cached_small_cache" + os.sep + "descriptions.json", "r") as input_file:
+			entries = json.loads(input_file.read())["entries"]
+		self.assertGreater(len(entries), 0)
+		self.assertLess(len(entries), len(list(read_records(export_filename(input_path, "Scrapbook_Page", json_file_date)))))
+		self.assertLessEqual(sum(len(html) for key, html in entries), 65536)
+
+
+class WfsDiffTest(unittest.TestCase):
+
+	def write_export(self, p_export_path, p_file_date, p_tables):
+
+		# An export with the given records, and no records in its other tables
+		os.makedirs(p_export_path)
+		for table, key_field, ref_fields in export_tables:
+			with open(export_filename(p_export_path, table, p_file_date), "w") as output_file:
+				output_file.write(json.dumps({ "RECORDS": p_tables.get(table, []) }))
+
+	def diff(self, p_old_path, p_old_date, p_new_path, p_new_date, p_changelog_filename):
+
+		with contextlib.redirect_stdout(io.StringIO()):
+			diff_main([p_old_date, p_new_date, "--old-input-path", p_old_path, "--new-input-path", p_new_path,
+					   "--changelog", p_changelog_filename])
+		self.assertFalse(os.path.exists(p_changelog_filename + ".tmp"))
+		with open(p_changelog_filename, "r") as input_file:
+			return json.loads(input_file.read())
+
+	def test_changelog(self):
+
+		old_path = test_path + "diff_old" + os.sep
+		new_path = test_path + "diff_new" + os.sep
+		self.write_export(old_path, "20200101", {
+			"Scrapbook": [{ "Scrapbook_Id": "1", "Scrapbook_notes": "Notes" }],
+			"Page_Associated_People": [{ "Associated_Person_Id": "10", "Associated_Person_first_name": "Cy" },
+									   { "Associated_Person_Id": "1", "Associated_Person_first_name": "Ann" },
+									   { "Associated_Person_Id": "2", "Associated_Person_first_name": "Bo" }],
+			"Page_Places_Named": [{ "Place_Id": "1", "Place_name": "Babylon", "Place_name_WOEID": "" }] })
+		self.write_export(new_path, "20200201", {
+			"Scrapbook": [{ "Scrapbook_Id": "1", "Scrapbook_notes": "Notes" }],
+			"Page_Associated_People": [{ "Associated_Person_Id": "3", "Associated_Person_first_name": "Di" },
+									   { "Associated_Person_Id": "1", "Associated_Person_first_name": "Anne" }],
+			"Page_Places_Named": [{ "Place_Id": "1", "Place_name": "Babylon", "Place_name_variations": "Babel" }],
+			"Page_People_Join": [{ "Page_Associated_Person_Join_Id": "1", "Page_Id_Join": "1",
+								   "Associated_Person_Id_Join": "3" }] })
+
+		# Added records in the new export's order, removed ones by ID, and changed fields as [old, new]
+		expected_tables = dict((table, { "added": [], "removed": [], "changed": [] })
+							   for table, key_field, ref_fields in export_tables)
+		expected_tables["Page_Associated_People"] = {
+			"added": [{ "Associated_Person_Id": "3", "Associated_Person_first_name": "Di" }],
+			"removed": [{ "Associated_Person_Id": "2", "Associated_Person_first_name": "Bo" },
+						{ "Associated_Person_Id": "10", "Associated_Person_first_name": "Cy" }],
+			"changed": [{ "key": "1", "fields": { "Associated_Person_first_name": ["Ann", "Anne"] } }] }
+		expected_tables["Page_Places_Named"]["changed"] = [
+			{ "key": "1", "fields": { "Place_name_WOEID": ["", None], "Place_name_variations": [None, "Babel"] } }]
+		expected_tables["Page_People_Join"]["added"] = [
+			{ "Page_Associated_Person_Join_Id": "1", "Page_Id_Join": "1", "Associated_Person_Id_Join": "3" }]
+
+		changelog_filename = test_path + "changelog.json"
+		self.assertEqual({ "old_date": "20200101", "new_date": "20200201", "tables": expected_tables },
+						 self.diff(old_path, "20200101", new_path, "20200201", changelog_filename))
+
+		# An export has no changes from itself
+		changelog = self.diff(input_path, json_file_date, input_path, json_file_date, changelog_filename)
+		for table, key_field, ref_fields in export_tables:
+			self.assertEqual({ "added": [], "removed": [], "changed": [] }, changelog["tables"][table], table)
+
+
+class WfsManifestTest(unittest.TestCase):
+
+	def test_unchanged_outputs(self):
+
+		output_path = build("manifest")
+		outputs = read_outputs(output_path)
+		modified_times = dict((output_filename, os.stat(output_path + output_filename).st_mtime_ns)
+							  for output_filename in outputs)
+
+		# Change an output by hand, to the same size
+		people_bytes = bytearray(outputs["wfs_people.json"])
+		people_bytes[people_bytes.index(b"Morgan")] = ord("m")
+		with open(output_path + "wfs_people.json", "wb") as output_file:
+			output_file.write(people_bytes)
+
+		# The next build writes it again, and leaves the others alone
+		build("manifest")
+		self.assertEqual(outputs, read_outputs(output_path))
+		for output_filename in outputs:
+			if output_filename not in ["wfs_people.json", "wfs_manifest.json"]:
+				self.assertEqual(modified_times[output_filename], os.stat(output_path + output_filename).st_mtime_ns,
+								 output_filename)
+		self.assertEqual([], [output_filename for output_filename in os.listdir(output_path) if output_filename.endswith(".tmp")])
+
+
+class WfsStagingStoreTest(unittest.TestCase):
+
+	def test_outputs(self):
+
+		# The same bytes as a build from the export files, with and without compact pages
+		plain_outputs = read_outputs(test_path + "plain" + os.sep)
+		self.assertEqual(plain_outputs, read_outputs(build("staging", "--staging-db", test_path + "staging.sqlite")))
+		self.assertEqual(plain_outputs, read_outputs(build("staging_compact", "--staging-db",
+														   test_path + "staging.sqlite", "--compact-pages")))
+
+	def test_reuse(self):
+
+		# Tables are only loaded again once their export file changes
+		export_path = copy_export("reuse_export")
+		db_filename = test_path + "reuse.sqlite"
+
+		store = WfsStagingStore(db_filename, export_path, json_file_date)
+		self.assertEqual(len(export_tables), len(store.m_loaded_tables))
+		store.close()
+
+		store = WfsStagingStore(db_filename, export_path, json_file_date)
+		self.assertEqual([], store.m_loaded_tables)
+		self.assertEqual(len(export_tables), len(store.m_reused_tables))
+		store.close()
+
+		# Drop the last person
+		people_filename = export_filename(export_path, "Page_Associated_People", json_file_date)
+		with open(people_filename, "r") as input_file:
+			people_json = json.loads(input_file.read())
+		person_id = people_json["RECORDS"].pop()["Associated_Person_Id"]
+		with open(people_filename, "w") as output_file:
+			output_file.write(json.dumps(people_json))
+
+		store = WfsStagingStore(db_filename, export_path, json_file_date)
+		self.assertEqual(["Page_Associated_People"], store.m_loaded_tables)
+		self.assertNotIn(person_id, [entry["Associated_Person_Id"] for entry in store.records("Page_Associated_People")])
+		store.close()
+
+
+def edit_records(p_export_path, p_table, p_edit):
+
+	# Rewrite a table of a copied export with p_edit applied to its records
+	filename = export_filename(p_export_path, p_table, json_file_date)
+	with open(filename, "r") as input_file:
+		table_json = json.loads(input_file.read())
+	p_edit(table_json["RECORDS"])
+	with open(filename, "w") as output_file:
+		output_file.write(json.dumps(table_json))
+
+
+class WfsIncrementalTest(unittest.TestCase):
+
+	def test_single_table_edits(self):
+
+		# Edits to one table at a time, each on top of the ones before
+		def edit_field(p_index, p_field, p_value):
+			def edit(p_records):
+				p_records[p_index][p_field] = p_value
+			return edit
+
+		def add_record(p_record):
+			def edit(p_records):
+				p_records.append(dict(p_records[0], **p_record))
+			return edit
+
+		def remove_record(p_index):
+			def edit(p_records):
+				del p_records[p_index]
+			return edit
+
+		edits = [
+			("Scrapbook", edit_field(0, "Scrapbook_notes", "Notes changed")),
+			("Scrapbook_Page", edit_field(1, "Page_keywords", "Angel, Zebra")),
+			("Scrapbook_Page", edit_field(2, "Page_desc", "|Ann Lee [2]|%\nIdentified Clippings: none")),
+			("Page_Associated_People", edit_field(1, "Associated_Person_first_name", "Edwina")),
+			("Page_Places_Named", edit_field(0, "Place_name_continents", "Europe")),
+			("Page_Associated_Sources", edit_field(0, "Page_Associated_Sources_type_of_source", "Newspaper")),
+			("Page_People_Join", remove_record(0)),
+			("Page_People_Join", edit_field(5, "Associated_Person_Id_Join", "3")),
+			("Page_Places_Named_Join", edit_field(0, "Places_Named_Id_Join", "2")),
+			("Page_Places_Named_Join", add_record({ "Page_Places_Named_Join": "999999", "Page_Id_Join_5": "1" })),
+			("Page_Associated_Sources_Join", remove_record(0)),
+			("Sources_People_Join", edit_field(0, "Associated_Person_Id_Join_2", "3"))
+		]
+
+		# An incremental build after each edit gives the same bytes as a full build of the edited export
+		export_path = copy_export("incremental_export")
+		build("incremental", "--incremental")
+		for index, (table, edit) in enumerate(edits):
+			edit_records(export_path, table, edit)
+			incremental_path = build("incremental", "--incremental", "--input-path", export_path)
+			full_path = build("incremental_full_{0}".format(index), "--input-path", export_path)
+			self.assertEqual(read_outputs(full_path), read_outputs(incremental_path), table)
+
+
+class WfsCanonicalTest(unittest.TestCase):
+
+	def test_record_order(self):
+
+		# Canonical builds of the export and of a copy with the records of every table shuffled give the same bytes
+		export_path = copy_export("shuffled_export")
+		shuffle = random.Random(0).shuffle
+		for table, key_field, ref_fields in export_tables:
+			edit_records(export_path, table, shuffle)
+
+		canonical_outputs = read_outputs(build("canonical", "--canonical"))
+		for name, options in [("canonical_shuffled", []), ("canonical_shuffled_compact", ["--compact-pages"])]:
+			shuffled_outputs = read_outputs(build(name, "--canonical", "--input-path", export_path, *options))
+			self.assertEqual(sorted(canonical_outputs), sorted(shuffled_outputs))
+			for output_filename in canonical_outputs:
+				self.assertEqual(canonical_outputs[output_filename], shuffled_outputs[output_filename], output_filename)
+
+
+class WfsShardsTest(unittest.TestCase):
+
+	shard_count = 3
+
+	def test_shards(self):
+
+		plain_path = test_path + "plain" + os.sep
+		sharded_path = build("sharded", "--shards", str(WfsShardsTest.shard_count))
+
+		for output_name in ["wfs_people", "wfs_places", "wfs_sources"]:
+
+			# The index lists the shards, and the shard each ID is in
+			index = read_output(sharded_path, output_name + "_index.json")
+			self.assertEqual(output_shard_filenames(output_name, WfsShardsTest.shard_count), index["shards"])
+
+			# The shards hold the entries of the unsharded output, each in the shard the index gives
+			entries = {}
+			for shard, shard_filename in enumerate(index["shards"]):
+				shard_entries = read_output(sharded_path, shard_filename)
+				for entry_id in shard_entries:
+					self.assertEqual(shard, index["ids"][entry_id])
+					self.assertEqual(shard, shard_of(entry_id, WfsShardsTest.shard_count))
+				entries.update(shard_entries)
+			self.assertEqual(read_output(plain_path, output_name + ".json"), entries)
+			self.assertEqual(sorted(entries), sorted(index["ids"]))
+
+		# Other outputs are unchanged
+		sharded_outputs = read_outputs(sharded_path)
+		for output_filename, output_bytes in read_outputs(plain_path).items():
+			if output_filename not in ["wfs_people.json", "wfs_places.json", "wfs_sources.json", "wfs_manifest.json"]:
+				self.assertEqual(output_bytes, sharded_outputs[output_filename], output_filename)
+
+	def test_incremental(self):
+
+		# An incremental sharded build gives the same bytes as a full one after records change
+		export_path = copy_export("sharded_export")
+		edit_records(export_path, "Page_People_Join", lambda p_records: p_records.__delitem__(slice(0, 3)))
+
+		shards = str(WfsShardsTest.shard_count)
+		build("sharded_incremental", "--shards", shards, "--incremental")
+		incremental_path = build("sharded_incremental", "--shards", shards, "--incremental", "--input-path", export_path)
+		full_path = build("sharded_full", "--shards", shards, "--input-path", export_path)
+		self.assertEqual(read_outputs(full_path), read_outputs(incremental_path))
+
+
+class WfsBinaryTest(unittest.TestCase):
+
+	def assert_round_trip(self, p_json, p_sort_keys=False):
+
+		# Decoded as json.loads would give the JSON, keys in the same order
+		# with msgpack's reader as well as in Python
+		expected_json = json.dumps(p_json, sort_keys=p_sort_keys)
+		binary_data = WfsBinaryEncoder(p_sort_keys).encode(p_json)
+		for native in [False, True] if msgpack is not None else [False]:
+			decoded_json = WfsBinaryDecoder(binary_data, native).decode()
+			self.assertEqual(json.loads(expected_json), decoded_json)
+			self.assertEqual(expected_json, json.dumps(decoded_json))
+
+	def test_values(self):
+
+		self.assert_round_trip([None, True, False, 0, 1, 127, 128, 255, 256, 65535, 65536, 2 ** 32, 2 ** 64 - 1,
+								-1, -32, -33, -128, -129, -32768, -32769, -2 ** 31 - 1, -2 ** 63, 0.5, -1.25e300,
+								"", "a", "\u00e9\u4e2d\U0001f600", "x" * 31, "x" * 32, "y" * 255, "y" * 256, "z" * 65536])
+		self.assert_round_trip({ "empty": {}, "list": [], "nested": [[{ "a": [1, { "b": None }] }]] })
+		self.assert_round_trip(list(range(70000)))
+		self.assert_round_trip(dict(("key{0}".format(index), index) for index in range(70000)))
+
+	def test_ids_and_table(self):
+
+		# Decimal strings are written as integers and read back as strings, and strings that only look like IDs
+		# (leading zeros, too many digits, signs) stay strings
+		ids = ["0", "7", "42", "4294967296", "9223372036854775807", "007", "-1", "+1", "1.0", " 1",
+			   "12345678901234567890", "1\n"]
+		self.assert_round_trip(ids)
+		self.assert_round_trip(dict((entry_id, [entry_id]) for entry_id in ids))
+
+		# Repeated strings go in the string table once
+		repeated = ["a repeated string"] * 1000
+		self.assert_round_trip(repeated)
+		self.assertLess(len(WfsBinaryEncoder().encode(repeated)), len("a repeated string") + 1000 * 3 + 64)
+
+		# Keys are written in their order, or sorted
+		unsorted = { "b": 1, "a": { "d": 2, "c": 3 }, "10": 4, "9": 5 }
+		self.assert_round_trip(unsorted)
+		self.assert_round_trip(unsorted, True)
+
+	def test_errors(self):
+
+		# Truncated files and bytes after the JSON are refused by both readers
+		binary_data = WfsBinaryEncoder().encode({ "a": ["1", "b", "b"] })
+		for native in [False, True] if msgpack is not None else [False]:
+			for data in [binary_data[:-1], binary_data + b"\xc0"]:
+				with self.assertRaises((ValueError, IndexError)):
+					WfsBinaryDecoder(data, native).decode()
+
+	def test_outputs(self):
+
+		# Each binary output reads back as the JSON output next to it, and the JSON outputs are unchanged
+		for name, options in [("binary", []), ("binary_canonical", ["--canonical"])]:
+			binary_path = build(name, "--binary", *options)
+			json_outputs = read_outputs(binary_path)
+			self.assertEqual(sorted(binary_filename(output_filename) for output_filename in json_outputs
+									if "wfs_manifest.json" != output_filename),
+							 sorted(read_outputs(binary_path, ".wfsb")))
+			for output_filename in json_outputs:
+				if "wfs_manifest.json" != output_filename:
+					self.assertEqual(json.loads(json_outputs[output_filename].decode("utf-8")),
+									 read_binary(binary_path + binary_filename(output_filename)), output_filename)
+
+		plain_outputs = read_outputs(test_path + "plain" + os.sep)
+		binary_outputs = read_outputs(test_path + "binary" + os.sep)
+		for output_filename in plain_outputs:
+			if "wfs_manifest.json" != output_filename:
+				self.assertEqual(plain_outputs[output_filename], binary_outputs[output_filename], output_filename)
+
+
+class WfsCompressTest(unittest.TestCase):
+
+	def assert_compressed(self, p_output_path, p_extension, p_decompress):
+
+		# Each JSON output has a compressed copy that decompresses to its bytes, listed in the manifest
+		# with the hash of the output it was made from
+		json_outputs = read_outputs(p_output_path)
+		manifest = json.loads(json_outputs.pop("wfs_manifest.json").decode("utf-8"))
+		self.assertEqual(sorted(output_filename + p_extension for output_filename in json_outputs),
+						 sorted(read_outputs(p_output_path, p_extension)))
+		for output_filename, output_bytes in json_outputs.items():
+			with open(p_output_path + output_filename + p_extension, "rb") as input_file:
+				compressed_bytes = input_file.read()
+			self.assertEqual(output_bytes, p_decompress(compressed_bytes), output_filename)
+			self.assertEqual(hashlib.sha256(output_bytes).hexdigest(),
+							 manifest[output_filename + p_extension]["source_sha256"])
+			self.assertEqual(hashlib.sha256(compressed_bytes).hexdigest(), manifest[output_filename + p_extension]["sha256"])
+
+	def test_gzip(self):
+
+		compressed_path = build("gzip", "--compress")
+		self.assert_compressed(compressed_path, ".gz", gzip.decompress)
+
+		# The JSON outputs are unchanged
+		plain_outputs = read_outputs(test_path + "plain" + os.sep)
+		compressed_outputs = read_outputs(compressed_path)
+		for output_filename in plain_outputs:
+			if "wfs_manifest.json" != output_filename:
+				self.assertEqual(plain_outputs[output_filename], compressed_outputs[output_filename], output_filename)
+
+		# The same outputs always give the same bytes, and copies of unchanged outputs aren't made again
+		self.assertEqual(read_outputs(compressed_path, ".gz"), read_outputs(build("gzip_again", "--compress"), ".gz"))
+		modified_times = dict((output_filename, os.stat(compressed_path + output_filename).st_mtime_ns)
+							  for output_filename in read_outputs(compressed_path, ".gz"))
+		build("gzip", "--compress")
+		for output_filename in modified_times:
+			self.assertEqual(modified_times[output_filename], os.stat(compressed_path + output_filename).st_mtime_ns)
+
+	def test_gzip_shards(self):
+
+		self.assert_compressed(build("gzip_sharded", "--compress", "--shards", "3", "--workers", "2"), ".gz",
+							   gzip.decompress)
+
+	@unittest.skipIf(brotli is None, "needs the brotli module")
+	def test_brotli(self):
+
+		compressed_path = build("brotli", "--compress", "gz,br")
+		self.assert_compressed(compressed_path, ".gz", gzip.decompress)
+		self.assert_compressed(compressed_path, ".br", brotli.decompress)
+
+	def test_formats(self):
+
+		with contextlib.redirect_stderr(io.StringIO()):
+			with self.assertRaises(SystemExit):
+				parse_args(["--compress", "gz,zip"])
+
+
+if "__main__" == __name__:
+	unittest.main()
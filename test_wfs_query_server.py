@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Tests for wfs_query_server.py, on the export in input/most_recent/ """
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from py_json_joins import WfsStageProfiler, build_model
+from wfs_query_server import WfsQueryApi, make_server, max_limit
+
+
+input_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input", "most_recent", "")
+json_file_date = "20191025"
+
+
+def make_api(p_cache_path, p_compact=False):
+
+	args = argparse.Namespace(date=json_file_date, description_cache_size=0, compact_pages=p_compact,
+							  staging_db=None, canonical=False)
+	return WfsQueryApi(*build_model(args, input_path, p_cache_path, WfsStageProfiler(json_file_date)))
+
+
+class WfsQueryApiTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+
+		cls.cache_path = tempfile.mkdtemp(prefix="wfs_test_") + os.sep
+		cls.api = make_api(cls.cache_path)
+
+	@classmethod
+	def tearDownClass(cls):
+
+		shutil.rmtree(cls.cache_path)
+
+	def get_json(self, p_path):
+
+		status, body = self.api.get(p_path)
+		return status, json.loads(body.decode("utf-8"))
+
+	def test_entities(self):
+
+		for entity_type, entries in self.api.m_entities.items():
+			entity_id = next(iter(entries))
+			status, response = self.get_json("/{0}/{1}".format(entity_type, entity_id))
+			self.assertEqual(200, status)
+			self.assertEqual(json.loads(json.dumps(entries[entity_id])), response)
+
+	def test_book_and_page(self):
+
+		status, response = self.get_json("/books/1")
+		self.assertEqual(200, status)
+		self.assertEqual("1", response["book"]["id"])
+		self.assertEqual([page["id"] for page in self.api.m_pages.m_pages_by_book_dict["1"]], response["pages"])
+
+		status, response = self.get_json("/pages/" + response["pages"][0])
+		self.assertEqual(200, status)
+		self.assertEqual("1", response["book_id"])
+
+	def test_cooccurrences(self):
+
+		status, response = self.get_json("/people/2/places?limit=1000")
+		self.assertEqual(200, status)
+		self.assertEqual(len(set(self.api.m_entities["people"]["2"]["stats"]["places_ids"])), response["total"])
+		self.assertEqual(response["total"], len(response["results"]))
+
+		# Most pages shared first, and pages of results follow on from each other
+		pages_shared = [result["pages"] for result in response["results"]]
+		self.assertEqual(sorted(pages_shared, reverse=True), pages_shared)
+		status, second_page = self.get_json("/people/2/places?offset=2&limit=2")
+		self.assertEqual(response["results"][2:4], second_page["results"])
+
+	def test_keyword_cooccurrences(self):
+
+		# Person 41 is on a page without keywords, whose blank keyword has no keyword ID
+		self.assertIn("", [keyword for page in self.api.m_pages.pages_with("people_ids", "41") for keyword in page["keywords"]])
+		status, response = self.get_json("/people/41/keywords?limit={0}".format(max_limit))
+		self.assertEqual(200, status)
+		self.assertEqual(len(response["results"]), response["total"])
+		for result in response["results"]:
+			self.assertIn(result["id"], self.api.m_entities["keywords"])
+
+		# and from a keyword to the entities on its pages
+		keyword_id = response["results"][0]["id"]
+		status, response = self.get_json("/keywords/{0}/people".format(keyword_id))
+		self.assertEqual(200, status)
+		self.assertIn("41", [result["id"] for result in response["results"]])
+
+	def test_errors(self):
+
+		for path, expected_status in [("/people/999999", 404), ("/nothing/1", 404), ("/books/999", 404),
+									  ("/pages/999999", 404), ("/people/2/nothing", 404), ("/a/b/c/d", 404),
+									  ("/people/2/places?limit=0", 400), ("/people/2/places?offset=-1", 400),
+									  ("/people/2/places?limit={0}".format(max_limit + 1), 400),
+									  ("/people/2/places?limit=many", 400)]:
+			status, response = self.get_json(path)
+			self.assertEqual(expected_status, status, path)
+			self.assertIn("error", response)
+
+	def test_unexpected_errors(self):
+
+		# Errors the API doesn't expect are answered with a JSON 500, not raised
+		api = WfsQueryApi.__new__(WfsQueryApi)
+		api.__dict__.update(self.api.__dict__)
+		api.m_cache = type(self.api.m_cache)()
+		api.route = lambda p_path, p_query: {}["missing"]
+		status, response = api.get("/people/2")
+		self.assertEqual(500, status)
+		self.assertIn("KeyError", response.decode("utf-8"))
+
+	def test_cache(self):
+
+		status, body = self.api.get("/people/2/sources?limit=3")
+		hits = self.api.m_cache.m_hits
+		self.assertEqual((status, body), self.api.get("/people/2/sources?limit=3"))
+		self.assertEqual(hits + 1, self.api.m_cache.m_hits)
+
+	def test_compact_pages(self):
+
+		compact_api = make_api(self.cache_path, True)
+		for path in ["/pages/1", "/people/41/keywords?limit=100", "/books/1"]:
+			self.assertEqual(self.api.get(path), compact_api.get(path))
+
+
+class WfsQueryServerTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+
+		cls.cache_path = tempfile.mkdtemp(prefix="wfs_test_") + os.sep
+		cls.server = make_server(make_api(cls.cache_path), p_port=0, p_quiet=True)
+		cls.thread = threading.Thread(target=cls.server.serve_forever)
+		cls.thread.start()
+		cls.url = "http://127.0.0.1:{0}".format(cls.server.server_address[1])
+
+	@classmethod
+	def tearDownClass(cls):
+
+		cls.server.shutdown()
+		cls.server.server_close()
+		cls.thread.join()
+		shutil.rmtree(cls.cache_path)
+
+	def test_http(self):
+
+		response = urllib.request.urlopen(self.url + "/people/41/keywords?limit=1000")
+		self.assertEqual(200, response.status)
+		self.assertEqual("application/json; charset=utf-8", response.headers["Content-Type"])
+		self.assertIn("results", json.loads(response.read().decode("utf-8")))
+
+		with self.assertRaises(urllib.error.HTTPError) as context:
+			urllib.request.urlopen(self.url + "/people/999999")
+		self.assertEqual(404, context.exception.code)
+		self.assertIn("error", json.loads(context.exception.read().decode("utf-8")))
+
+
+if "__main__" == __name__:
+	unittest.main()
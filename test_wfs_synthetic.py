@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Tests for wfs_synthetic.py """
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from py_json_joins import export_filename, export_tables, parse_args, read_records, run_pipeline
+from wfs_synthetic import generate_export
+
+
+json_file_date = "20191025"
+
+# Join tables and the fields that refer to records of other tables
+join_fields = [
+	("Page_People_Join", [("Page_Id_Join", "Scrapbook_Page"), ("Associated_Person_Id_Join", "Page_Associated_People")]),
+	("Page_Places_Named_Join", [("Page_Id_Join_5", "Scrapbook_Page"), ("Places_Named_Id_Join", "Page_Places_Named")]),
+	("Page_Associated_Sources_Join", [("Page_Id_Join_2", "Scrapbook_Page"),
+									  ("Associated_Sources_Id_Join", "Page_Associated_Sources")]),
+	("Sources_People_Join", [("Associated_Sources_Id_Join_2", "Page_Associated_Sources")]),
+	("Scrapbook_Page", [("Scrapbook_Id", "Scrapbook")])
+]
+
+
+def read_export(p_input_path):
+
+	# Records of each table by primary key
+	export = {}
+	for table, key_field, ref_fields in export_tables:
+		records = list(read_records(export_filename(p_input_path, table, json_file_date)))
+		export[table] = dict((entry[key_field], entry) for entry in records)
+		if len(export[table]) != len(records):
+			raise ValueError("Duplicate {0} keys".format(table))
+	return export
+
+
+class WfsSyntheticExportTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.path = tempfile.mkdtemp(prefix="wfs_test_") + os.sep
+
+	def tearDown(self):
+
+		shutil.rmtree(self.path)
+
+	def test_record_counts(self):
+
+		record_counts = generate_export(self.path + "export" + os.sep, json_file_date, 3, 10)
+		export = read_export(self.path + "export" + os.sep)
+		self.assertEqual(3, len(export["Scrapbook"]))
+		self.assertEqual(30, len(export["Scrapbook_Page"]))
+		for table in export:
+			self.assertEqual(record_counts[table], len(export[table]), table)
+
+	def test_references(self):
+
+		# Every join refers to records of the export
+		generate_export(self.path + "export" + os.sep, json_file_date, 3, 10)
+		export = read_export(self.path + "export" + os.sep)
+		for table, fields in join_fields:
+			for entry in export[table].values():
+				for field, referred_table in fields:
+					self.assertIn(entry[field], export[referred_table], "{0}.{1}".format(table, field))
+
+	def test_seed(self):
+
+		# The same seed gives the same bytes, another seed another export
+		exports = []
+		for name, seed in [("a", 0), ("b", 0), ("c", 1)]:
+			generate_export(self.path + name + os.sep, json_file_date, 2, 8, seed)
+			exports.append(dict((table, open(export_filename(self.path + name + os.sep, table, json_file_date), "rb").read())
+								for table, key_field, ref_fields in export_tables))
+		self.assertEqual(exports[0], exports[1])
+		self.assertNotEqual(exports[0], exports[2])
+
+	def test_build(self):
+
+		# A full build over the export finds all of its records
+		generate_export(self.path + "export" + os.sep, json_file_date, 2, 8)
+		os.makedirs(self.path + "output")
+		log = io.StringIO()
+		with contextlib.redirect_stdout(log):
+			run_pipeline(parse_args(["--date", json_file_date, "--input-path", self.path + "export",
+									 "--output-path", self.path + "output", "--cache-path", self.path + "cache",
+									 "--description-cache-size", "0"]))
+		self.assertNotIn("Could not find", log.getvalue())
+
+		with open(self.path + "output" + os.sep + "wfs_people.json", "r") as input_file:
+			people = json.loads(input_file.read())
+		self.assertEqual(len(read_export(self.path + "export" + os.sep)["Page_Associated_People"]), len(people))
+
+
+if "__main__" == __name__:
+	unittest.main()
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Benchmarks for the Working from Scraps JSON transform
+
+Builds synthetic exports by scaling up one of the database exports in input/
+(or generating them with wfs_synthetic.py) and times stages of py_json_joins.py
+against them, so that we can check how the transform scales before the full
+archive is exported.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+__author__ = "Jonathan Armoza"
+__contact__ = "jarmoza@gmail.com"
+__copyright__ = "Copyright 2019, Jonathan Armoza"
+__credits__ = ["Jonathan Armoza", "Bridget Moynihan"]
+__date__ = "2019/11/12"
+__deprecated__ = False
+__license__ = "GPLv3"
+__maintainer__ = "developer"
+__status__ = "Production"
+__version__ = "1.0.8"
+
+
+import argparse
+import gzip
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from py_json_joins import WfsBinaryDecoder, WfsIdList, WfsPage, WfsPageStats, WfsPages, binary_filename, \
+	find_associated_pps, format_description, format_description_old, msgpack, read_records
+from wfs_synthetic import generate_export, presets
+
+
+# Tables read by WfsPages, and for each the primary key and page ID fields to offset when scaling
+page_tables = [
+	("Scrapbook_Page", "Page_Id", "Page_Id"),
+	("Page_People_Join", "Page_Associated_Person_Join_Id", "Page_Id_Join"),
+	("Page_Places_Named_Join", "Page_Places_Named_Join", "Page_Id_Join_5"),
+	("Page_Associated_Sources_Join", "Page_Associated_Sources_Join_Id", "Page_Id_Join_2"),
+]
+
+def read_table(p_input_path, p_table, p_json_file_date):
+
+	return list(read_records(p_input_path + "{0}_{1}.json".format(p_table, p_json_file_date)))
+
+def write_table(p_output_path, p_table, p_json_file_date, p_records):
+
+	with open(p_output_path + "{0}_{1}.json".format(p_table, p_json_file_date), "w") as output_file:
+		output_file.write(json.dumps({ "RECORDS": p_records }))
+
+def scale_page_tables(p_input_path, p_json_file_date, p_factor, p_output_path):
+
+	# Page IDs of each copy are offset past the largest page ID of the original export
+	pages = read_table(p_input_path, "Scrapbook_Page", p_json_file_date)
+	page_id_offset = max(int(page["Page_Id"]) for page in pages)
+
+	record_counts = {}
+	for table, key_field, page_id_field in page_tables:
+
+		records = pages if "Scrapbook_Page" == table else read_table(p_input_path, table, p_json_file_date)
+		key_offset = max(int(record[key_field]) for record in records)
+
+		scaled_records = []
+		for copy_index in range(p_factor):
+			for record in records:
+				scaled_record = dict(record)
+				scaled_record[key_field] = str(int(record[key_field]) + copy_index * key_offset)
+				if has_int_value(record[page_id_field]):
+					scaled_record[page_id_field] = str(int(record[page_id_field]) + copy_index * page_id_offset)
+				scaled_records.append(scaled_record)
+
+		write_table(p_output_path, table, p_json_file_date, scaled_records)
+		record_counts[table] = len(scaled_records)
+
+	return record_counts
+
+def has_int_value(p_string):
+
+	return len(p_string.strip()) > 0 and p_string.strip().isdigit()
+
+def benchmark_page_ingest(p_input_path, p_json_file_date, p_factors):
+
+	print("Page ingest (WfsPages) on {0} export scaled {1}x".format(
+		p_json_file_date, ", ".join(str(factor) for factor in p_factors)))
+	print("{0:>8} {1:>10} {2:>12} {3:>10} {4:>14}".format(
+		"scale", "pages", "join rows", "seconds", "usec/record"))
+
+	base_usec_per_record = None
+	for factor in p_factors:
+
+		scaled_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+		try:
+			record_counts = scale_page_tables(p_input_path, p_json_file_date, factor, scaled_path)
+
+			start_time = time.time()
+			WfsPages(scaled_path + "Scrapbook_Page_{0}.json".format(p_json_file_date),
+					 scaled_path + "Page_People_Join_{0}.json".format(p_json_file_date),
+					 scaled_path + "Page_Places_Named_Join_{0}.json".format(p_json_file_date),
+					 scaled_path + "Page_Associated_Sources_Join_{0}.json".format(p_json_file_date))
+			elapsed = time.time() - start_time
+		finally:
+			shutil.rmtree(scaled_path)
+
+		pages = record_counts["Scrapbook_Page"]
+		join_rows = sum(record_counts.values()) - pages
+		usec_per_record = 1000000.0 * elapsed / (pages + join_rows)
+		if base_usec_per_record is None:
+			base_usec_per_record = usec_per_record
+
+		# Roughly constant time per record (ratio near 1.0) means ingest scales linearly
+		print("{0:>7}x {1:>10} {2:>12} {3:>10.2f} {4:>8.1f} ({5:.2f})".format(
+			factor, pages, join_rows, elapsed, usec_per_record, usec_per_record / base_usec_per_record))
+
+def model_size(p_object, p_seen):
+
+	# Bytes held by the object and everything it refers to, counting shared objects (e.g. interned strings) once
+	if id(p_object) in p_seen:
+		return 0
+	p_seen.add(id(p_object))
+
+	size = sys.getsizeof(p_object)
+	if isinstance(p_object, dict):
+		for key, value in p_object.items():
+			size += model_size(key, p_seen) + model_size(value, p_seen)
+	elif isinstance(p_object, (list, tuple)):
+		for item in p_object:
+			size += model_size(item, p_seen)
+	elif isinstance(p_object, WfsIdList):
+		size += model_size(p_object.m_ints, p_seen) + model_size(p_object.m_table.m_ints_by_string, p_seen) + \
+				model_size(p_object.m_table.m_strings, p_seen)
+	elif isinstance(p_object, (WfsPage, WfsPageStats)):
+		for field in type(p_object).__slots__:
+			size += model_size(getattr(p_object, field), p_seen)
+
+	return size
+
+def benchmark_page_memory(p_input_path, p_json_file_date, p_factors):
+
+	print("Page model memory on {0} export scaled {1}x (page descriptions not counted)".format(
+		p_json_file_date, ", ".join(str(factor) for factor in p_factors)))
+	print("{0:>8} {1:>10} {2:>14} {3:>14} {4:>10}".format(
+		"scale", "pages", "dict MB", "compact MB", "ratio"))
+
+	for factor in p_factors:
+
+		scaled_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+		try:
+			scale_page_tables(p_input_path, p_json_file_date, factor, scaled_path)
+
+			sizes = []
+			for compact in [False, True]:
+				pages = WfsPages(scaled_path + "Scrapbook_Page_{0}.json".format(p_json_file_date),
+								 scaled_path + "Page_People_Join_{0}.json".format(p_json_file_date),
+								 scaled_path + "Page_Places_Named_Join_{0}.json".format(p_json_file_date),
+								 scaled_path + "Page_Associated_Sources_Join_{0}.json".format(p_json_file_date),
+								 p_compact=compact)
+
+				# Read each page's stats as a build does when writing the books and scrapbook files
+				for page in pages.m_pages:
+					for stat in page["stats"]:
+						len(page["stats"][stat])
+
+				# Descriptions are the same strings in both models
+				seen = set(id(page["desc"]) for page in pages.m_pages)
+				sizes.append(model_size(pages.m_pages, seen))
+		finally:
+			shutil.rmtree(scaled_path)
+
+		print("{0:>7}x {1:>10} {2:>14.1f} {3:>14.1f} {4:>9.1f}x".format(
+			factor, len(pages.m_pages), sizes[0] / 1048576.0, sizes[1] / 1048576.0, float(sizes[0]) / sizes[1]))
+
+# find_associated_pps as it was before reading co-occurrences off the pages' entity index (the baseline of the
+# cooccurrences benchmark)
+def find_associated_pps_helper_old(p_pps, p_page, p_pps_ids_str, p_pps_on_pages_dict_str):	
+
+	# Save all people associated with this page
+	p_pps["stats"][p_pps_ids_str].extend(p_page[p_pps_ids_str])
+
+	# Note these pps are on this page that this pps is also on
+	for pps_id in p_page[p_pps_ids_str]:
+		if pps_id not in p_pps["stats"][p_pps_on_pages_dict_str]:
+			p_pps["stats"][p_pps_on_pages_dict_str][pps_id] = []
+		p_pps["stats"][p_pps_on_pages_dict_str][pps_id].append(p_page["id"])		
+
+def find_associated_pps_old(p_pps_collection, p_pages, p_pps_ids_str):
+
+	# Note people, places, and sources found on pages with this pps's in this collection
+	for pps in p_pps_collection:
+
+		# For each page this pps is on
+		for page in p_pages.pages_with(p_pps_ids_str, pps["id"]):
+
+			# Save all pps associated with this page and,
+			# Note these people are on this page that this source is also on
+			find_associated_pps_helper_old(pps, page, "people_ids", "people_on_pages_dict")
+			find_associated_pps_helper_old(pps, page, "places_ids", "places_on_pages_dict")
+			find_associated_pps_helper_old(pps, page, "sources_ids", "sources_on_pages_dict")
+
+		# De-duplicate the people, places, and sources ID lists
+		pps["stats"]["people_ids"] = list(set(pps["stats"]["people_ids"]))			
+		pps["stats"]["places_ids"] = list(set(pps["stats"]["places_ids"]))
+		pps["stats"]["sources_ids"] = list(set(pps["stats"]["sources_ids"]))
+
+		# Remove the pps' own ID from the pps type list it would belong to
+		if pps["id"] in pps["stats"][p_pps_ids_str]:
+			pps["stats"][p_pps_ids_str].remove(pps["id"])		
+
+def cooccurrence_collection(p_pages, p_ids_str):
+
+	# Entities of one type found on the pages, with the co-occurrence stats find_associated_pps fills in
+	entity_ids = []
+	for page in p_pages.m_pages:
+		entity_ids.extend(page[p_ids_str])
+
+	return [{ "id": entity_id,
+			  "stats": { "people_ids": [], "places_ids": [], "sources_ids": [], "keywords": [],
+						 "people_on_pages_dict": {}, "places_on_pages_dict": {}, "sources_on_pages_dict": {} } }
+			for entity_id in sorted(set(entity_ids))]
+
+def sorted_id_lists(p_collections):
+
+	for collection in p_collections:
+		for entity in collection:
+			for ids_str in ["people_ids", "places_ids", "sources_ids"]:
+				entity["stats"][ids_str] = sorted(entity["stats"][ids_str])
+
+	return p_collections
+
+def benchmark_cooccurrences(p_input_path, p_json_file_date, p_factors):
+
+	print("Co-occurrence stats (find_associated_pps) on {0} export scaled {1}x".format(
+		p_json_file_date, ", ".join(str(factor) for factor in p_factors)))
+	print("{0:>8} {1:>10} {2:>10} {3:>14} {4:>14} {5:>10}".format(
+		"scale", "pages", "entities", "old seconds", "new seconds", "speedup"))
+
+	for factor in p_factors:
+
+		scaled_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+		try:
+			scale_page_tables(p_input_path, p_json_file_date, factor, scaled_path)
+			pages = WfsPages(scaled_path + "Scrapbook_Page_{0}.json".format(p_json_file_date),
+							 scaled_path + "Page_People_Join_{0}.json".format(p_json_file_date),
+							 scaled_path + "Page_Places_Named_Join_{0}.json".format(p_json_file_date),
+							 scaled_path + "Page_Associated_Sources_Join_{0}.json".format(p_json_file_date))
+		finally:
+			shutil.rmtree(scaled_path)
+
+		timings = []
+		collections = []
+		for find_function in [find_associated_pps_old, find_associated_pps]:
+			collections.append([])
+			start_time = time.time()
+			for ids_str in ["people_ids", "places_ids", "sources_ids", "keywords"]:
+				collection = cooccurrence_collection(pages, ids_str)
+				find_function(collection, pages, ids_str)
+				collections[-1].append(collection)
+			timings.append(time.time() - start_time)
+
+		# The new version has to give the same stats as the old one (ID lists in any order)
+		if sorted_id_lists(collections[0]) != sorted_id_lists(collections[1]):
+			print("find_associated_pps differs from find_associated_pps_old at {0}x".format(factor))
+			return
+
+		print("{0:>7}x {1:>10} {2:>10} {3:>14.2f} {4:>14.2f} {5:>9.2f}x".format(
+			factor, len(pages.m_pages), sum(len(collection) for collection in collections[1]),
+			timings[0], timings[1], timings[0] / timings[1]))
+
+def benchmark_descriptions(p_input_path, p_json_file_date, p_repeats):
+
+	descriptions = [page["Page_desc"] for page in read_table(p_input_path, "Scrapbook_Page", p_json_file_date)]
+
+	# The single-pass formatter has to give the same output as the original for every description
+	mismatches = [description for description in descriptions
+				  if format_description(description) != format_description_old(description)]
+	if len(mismatches) > 0:
+		print("format_description differs from format_description_old on {0} descriptions".format(len(mismatches)))
+		return
+
+	print("Description formatting on {0} export ({1} descriptions, {2} repeats)".format(
+		p_json_file_date, len(descriptions), p_repeats))
+	print("{0:>24} {1:>10} {2:>14}".format("function", "seconds", "usec/desc"))
+
+	timings = []
+	for formatter in [format_description_old, format_description]:
+		start_time = time.time()
+		for repeat in range(p_repeats):
+			for description in descriptions:
+				formatter(description)
+		elapsed = time.time() - start_time
+		timings.append(elapsed)
+		print("{0:>24} {1:>10.2f} {2:>14.1f}".format(
+			formatter.__name__, elapsed, 1000000.0 * elapsed / (p_repeats * len(descriptions))))
+
+	print("{0:>24} {1:>10.2f}x".format("speedup", timings[0] / timings[1]))
+
+def run_full_build(p_python, p_script, p_input_path, p_json_file_date, p_output_path, p_cache_path):
+
+	# Wall seconds of one canonical full build (options that both the Python 2 and 3 versions of the script take)
+	start_time = time.time()
+	with open(os.devnull, "w") as null_file:
+		subprocess.check_call([p_python, p_script, "--date", p_json_file_date, "--input-path", p_input_path,
+							   "--output-path", p_output_path, "--cache-path", p_cache_path,
+							   "--description-cache-size", "0", "--canonical"],
+							  stdout=null_file)
+
+	return time.time() - start_time
+
+def benchmark_runtimes(p_input_path, p_json_file_date, p_old_python, p_old_script, p_runs):
+
+	new_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "py_json_joins.py")
+	builds = [("old", p_old_python, os.path.abspath(p_old_script)), ("new", sys.executable, new_script)]
+
+	print("Full build runtimes on {0} export ({1} runs each, canonical outputs)".format(p_json_file_date, p_runs))
+	print("{0:>6} {1:>10} {2:>12} {3:>12}  {4}".format("build", "python", "best sec", "mean sec", "script"))
+
+	work_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+	try:
+		best_timings = []
+		for label, python, script in builds:
+
+			python_version = subprocess.check_output(
+				[python, "-c", "import sys; sys.stdout.write(sys.version.split()[0])"]).decode("utf-8")
+			os.makedirs(work_path + label)
+			timings = [run_full_build(python, script, p_input_path, p_json_file_date,
+									  work_path + label, work_path + label + "_cache") for run in range(p_runs)]
+			best_timings.append(min(timings))
+
+			print("{0:>6} {1:>10} {2:>12.2f} {3:>12.2f}  {4}".format(
+				label, python_version, min(timings), sum(timings) / len(timings), script))
+
+		print("{0:>6} {1:>10} {2:>11.2f}x".format("speedup", "", best_timings[0] / best_timings[1]))
+
+		# Canonical outputs don't depend on dict order, so the two versions should write the same bytes
+		# (the manifest is left out, as its indentation differs between json modules)
+		output_filenames = sorted(filename for filename in os.listdir(work_path + "new")
+								  if filename.endswith(".json") and "wfs_manifest.json" != filename)
+		identical_count = 0
+		for filename in output_filenames:
+			old_filename = work_path + "old" + os.sep + filename
+			if os.path.isfile(old_filename) and \
+			   open(old_filename, "rb").read() == open(work_path + "new" + os.sep + filename, "rb").read():
+				identical_count += 1
+		print("{0} of {1} outputs byte-identical".format(identical_count, len(output_filenames)))
+	finally:
+		shutil.rmtree(work_path)
+
+def benchmark_binary(p_input_path, p_json_file_date, p_runs):
+
+	# Full build writing both forms of each output
+	work_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+	try:
+		os.makedirs(work_path + "output")
+		with open(os.devnull, "w") as null_file:
+			subprocess.check_call([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "py_json_joins.py"),
+								   "--date", p_json_file_date, "--input-path", p_input_path,
+								   "--output-path", work_path + "output", "--cache-path", work_path + "cache",
+								   "--description-cache-size", "0", "--binary"],
+								  stdout=null_file)
+
+		# Binary outputs are read with the msgpack module's C reader if it is installed, and in Python otherwise
+		print("JSON and binary outputs of {0} export (KB, and best of {1} parses in ms)".format(p_json_file_date, p_runs))
+		print("{0:>28} {1:>9} {2:>9} {3:>7} {4:>9} {5:>9} {6:>10} {7:>10} {8:>10}".format(
+			"output", "json", "binary", "ratio", "json gz", "bin gz", "json ms", "msgpack ms", "python ms"))
+		if msgpack is None:
+			print("(msgpack is not installed, so binary outputs are read in Python, several times slower than JSON)")
+		parse_totals = [0.0, 0.0, 0.0]
+
+		output_filenames = sorted(filename for filename in os.listdir(work_path + "output")
+								  if filename.endswith(".json") and "wfs_manifest.json" != filename)
+		for filename in output_filenames:
+
+			with open(work_path + "output" + os.sep + filename, "rb") as json_file:
+				json_data = json_file.read()
+			with open(binary_filename(work_path + "output" + os.sep + filename), "rb") as binary_file:
+				binary_data = binary_file.read()
+
+			# Parse each form from bytes in memory, as a client would after downloading it
+			json_seconds = []
+			native_seconds = []
+			python_seconds = []
+			for run in range(p_runs):
+				start_time = time.time()
+				json_value = json.loads(json_data.decode("utf-8"))
+				json_seconds.append(time.time() - start_time)
+				if msgpack is not None:
+					start_time = time.time()
+					native_value = WfsBinaryDecoder(binary_data).decode()
+					native_seconds.append(time.time() - start_time)
+				start_time = time.time()
+				python_value = WfsBinaryDecoder(binary_data, False).decode()
+				python_seconds.append(time.time() - start_time)
+			if python_value != json_value or (msgpack is not None and native_value != json_value):
+				print("{0:>28} binary output does not read back as its JSON".format(filename))
+
+			parse_totals[0] += min(json_seconds)
+			parse_totals[1] += min(native_seconds) if msgpack is not None else 0.0
+			parse_totals[2] += min(python_seconds)
+			print("{0:>28} {1:>9.1f} {2:>9.1f} {3:>7.2f} {4:>9.1f} {5:>9.1f} {6:>10.1f} {7:>10} {8:>10.1f}".format(
+				filename, len(json_data) / 1024.0, len(binary_data) / 1024.0, float(len(binary_data)) / len(json_data),
+				len(gzip.compress(json_data, 9, mtime=0)) / 1024.0, len(gzip.compress(binary_data, 9, mtime=0)) / 1024.0,
+				min(json_seconds) * 1000.0,
+				"{0:.1f}".format(min(native_seconds) * 1000.0) if msgpack is not None else "-",
+				min(python_seconds) * 1000.0))
+
+		# Parse time of all outputs against JSON's (above 1 is slower than JSON)
+		print("Parse time against JSON: msgpack {0}, python {1:.2f}x".format(
+			"{0:.2f}x".format(parse_totals[1] / parse_totals[0]) if msgpack is not None else "-",
+			parse_totals[2] / parse_totals[0]))
+	finally:
+		shutil.rmtree(work_path)
+
+def run_pipeline_stages(p_input_path, p_json_file_date):
+
+	# The full build runs in its own process so that each size's peak memory is its own
+	work_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+	try:
+		os.makedirs(work_path + "output")
+		report_filename = work_path + "stage_report.json"
+		with open(os.devnull, "w") as null_file:
+			subprocess.check_call([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "py_json_joins.py"),
+								   "--date", p_json_file_date, "--input-path", p_input_path,
+								   "--output-path", work_path + "output", "--cache-path", work_path + "cache",
+								   "--description-cache-size", "0", "--stage-report", report_filename],
+								  stdout=null_file)
+		with open(report_filename, "r") as report_file:
+			return json.load(report_file)
+	finally:
+		shutil.rmtree(work_path)
+
+def scaling_exponent(p_base_seconds, p_seconds, p_base_size, p_size):
+
+	# 1.0 when time grows with the export, 2.0 when it grows with its square
+	if p_base_seconds <= 0 or p_seconds <= 0 or p_size == p_base_size:
+		return None
+	return math.log(p_seconds / p_base_seconds) / math.log(float(p_size) / p_base_size)
+
+def benchmark_pipeline(p_json_file_date, p_preset_names, p_seed):
+
+	print("Full build (py_json_joins.py) on synthetic exports: {0}".format(", ".join(p_preset_names)))
+
+	sizes = []
+	reports = []
+	for preset_name in p_preset_names:
+
+		books, pages_per_book = presets[preset_name]
+		export_path = tempfile.mkdtemp(prefix="wfs_bench_") + os.sep
+		try:
+			record_counts = generate_export(export_path, p_json_file_date, books, pages_per_book, p_seed)
+			reports.append(run_pipeline_stages(export_path, p_json_file_date))
+		finally:
+			shutil.rmtree(export_path)
+
+		sizes.append(sum(record_counts.values()))
+		print("{0:>12}: {1} books, {2} pages, {3} records, {4:.2f} seconds, {5:.1f} MB peak".format(
+			preset_name, books, record_counts["Scrapbook_Page"], sizes[-1],
+			reports[-1]["total"]["wall_seconds"], reports[-1]["total"]["peak_rss_mb"]))
+
+	# Seconds per stage at each size, and how fast each stage grows from the smallest size to the largest
+	print()
+	print("{0:>24} ".format("stage") + " ".join("{0:>12}".format(name) for name in p_preset_names) + " {0:>10}".format("exponent"))
+
+	stage_names = [stage["name"] for stage in reports[-1]["stages"]]
+	for stage_name in stage_names + ["total"]:
+		seconds = []
+		for report in reports:
+			stages = [stage for stage in report["stages"] if stage_name == stage["name"]]
+			if "total" == stage_name:
+				seconds.append(report["total"]["wall_seconds"])
+			else:
+				seconds.append(stages[0]["wall_seconds"] if len(stages) > 0 else 0.0)
+
+		exponent = scaling_exponent(seconds[0], seconds[-1], sizes[0], sizes[-1])
+
+		# Stages growing much faster than the export are the ones that will not reach the full archive
+		print("{0:>24} ".format(stage_name) + " ".join("{0:>12.2f}".format(value) for value in seconds) + \
+			  (" {0:>10}".format("-") if exponent is None else
+			   " {0:>10.2f}{1}".format(exponent, " <-" if exponent > 1.3 else "")))
+
+def main():
+
+	parser = argparse.ArgumentParser(description="Benchmarks for py_json_joins.py")
+	parser.add_argument("benchmark", nargs="?", default="ingest",
+						choices=["ingest", "memory", "cooccurrences", "descriptions", "pipeline", "runtimes", "binary"],
+						help="page ingest time, page model memory, or co-occurrence stats at increasing scales, "
+							 "description formatting, full builds of synthetic exports, full builds by an older "
+							 "version of the script (e.g. the Python 2 one) and this one, or the size and parse "
+							 "time of the binary outputs against the JSON ones")
+	parser.add_argument("--input-path", default=os.getcwd() + os.sep + "input" + os.sep + "most_recent" + os.sep,
+						help="folder containing the export to scale up")
+	parser.add_argument("--date", default="20191025", help="date of the export's JSON files")
+	parser.add_argument("--scales", default="1,10,25,50,100",
+						help="comma-separated multiples of the export to benchmark")
+	parser.add_argument("--repeats", type=int, default=50,
+						help="times to format each description in the descriptions benchmark")
+	parser.add_argument("--presets", default="sample,12-books,100-books",
+						help="comma-separated wfs_synthetic.py sizes for the pipeline benchmark ({0})".format(
+							", ".join(sorted(presets.keys()))))
+	parser.add_argument("--seed", type=int, default=0, help="random seed of the pipeline benchmark's exports")
+	parser.add_argument("--old-script", help="older py_json_joins.py for the runtimes benchmark, e.g. the Python 2 "
+											 "version from git show <revision>:py_json_joins.py")
+	parser.add_argument("--old-python", default="python2",
+						help="interpreter to run --old-script with (default: %(default)s)")
+	parser.add_argument("--runs", type=int, default=5,
+						help="full builds of each version in the runtimes benchmark, or parses of each output in the binary one")
+	args = parser.parse_args()
+	if "runtimes" == args.benchmark and args.old_script is None:
+		parser.error("the runtimes benchmark needs --old-script")
+
+	input_path = os.path.join(args.input_path, "")
+	factors = [int(factor) for factor in args.scales.split(",")]
+
+	if "binary" == args.benchmark:
+		benchmark_binary(input_path, args.date, args.runs)
+	elif "runtimes" == args.benchmark:
+		benchmark_runtimes(input_path, args.date, args.old_python, args.old_script, args.runs)
+	elif "pipeline" == args.benchmark:
+		benchmark_pipeline(args.date, args.presets.split(","), args.seed)
+	elif "descriptions" == args.benchmark:
+		benchmark_descriptions(input_path, args.date, args.repeats)
+	elif "cooccurrences" == args.benchmark:
+		benchmark_cooccurrences(input_path, args.date, factors)
+	elif "memory" == args.benchmark:
+		benchmark_page_memory(input_path, args.date, factors)
+	else:
+		benchmark_page_ingest(input_path, args.date, factors)
+
+
+if "__main__" == __name__:
+	main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Query server for the Working from Scraps collection
+
+Builds the collection model of py_json_joins.py from a database export and serves
+slices of it over HTTP (a single person, place, source, keyword, book, or page, or a
+page of an entity's co-occurrences), so that the site can fetch the kilobytes it
+renders instead of whole output files.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+__author__ = "Jonathan Armoza"
+__contact__ = "jarmoza@gmail.com"
+__copyright__ = "Copyright 2019, Jonathan Armoza"
+__credits__ = ["Jonathan Armoza", "Bridget Moynihan"]
+__date__ = "2019/11/12"
+__deprecated__ = False
+__license__ = "GPLv3"
+__maintainer__ = "developer"
+__status__ = "Production"
+__version__ = "1.0.8"
+
+
+import argparse
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from py_json_joins import WfsStageProfiler, build_model, canonical_json
+
+
+# Entity types served, and the pages' ID list each is found on (see WfsPages.pages_with)
+entity_types = OrderedDict([
+	("people", "people_ids"),
+	("places", "places_ids"),
+	("sources", "sources_ids"),
+	("keywords", "keywords")
+])
+
+# Co-occurrences per response when a request doesn't give a limit, and the most it can ask for
+default_limit = 50
+max_limit = 1000
+
+
+class WfsQueryError(Exception):
+
+	def __init__(self, p_status, p_message):
+
+		Exception.__init__(self, p_message)
+		self.m_status = p_status
+
+
+class WfsResponseCache:
+
+	# Response bodies by request, least recently used first, capped at a number of bytes
+	def __init__(self, p_max_size=8388608):
+
+		self.m_max_size = p_max_size
+		self.m_size = 0
+		self.m_entries = OrderedDict()
+		self.m_hits = 0
+		self.m_misses = 0
+
+		# Requests are served from several threads
+		self.m_lock = threading.Lock()
+
+	def add(self, p_key, p_body):
+
+		with self.m_lock:
+			if p_key in self.m_entries:
+				return
+			self.m_entries[p_key] = p_body
+			self.m_size += len(p_body)
+
+			# Evict the least recently used responses past the size cap
+			while self.m_size > self.m_max_size and len(self.m_entries) > 0:
+				evicted_key, evicted_body = self.m_entries.popitem(last=False)
+				self.m_size -= len(evicted_body)
+
+	def get(self, p_key):
+
+		with self.m_lock:
+
+			# Reuse the response, marking it as the most recently used
+			if p_key in self.m_entries:
+				self.m_hits += 1
+				body = self.m_entries.pop(p_key)
+				self.m_entries[p_key] = body
+				return body
+
+			self.m_misses += 1
+			return None
+
+
+class WfsQueryApi:
+
+	def __init__(self, p_scrapbooks, p_pages, p_people, p_places, p_sources, p_keywords, p_canonical=False,
+				 p_cache_size=8388608):
+
+		self.m_scrapbooks = p_scrapbooks
+		self.m_pages = p_pages
+		self.m_canonical = p_canonical
+
+		# Entries of each entity type, as written to its output file
+		self.m_entities = {
+			"people": p_people.m_people_dict,
+			"places": p_places.m_places_dict,
+			"sources": p_sources.m_sources_dict,
+			"keywords": p_keywords.m_keywords_json["ids"]
+		}
+
+		self.m_books_by_id_dict = dict((book["id"], book) for book in p_scrapbooks.m_books)
+
+		# Pages list keywords by keyword rather than by ID
+		self.m_ids_to_keywords = p_scrapbooks.m_collection["stats"]["ids_to_keywords"]
+		self.m_keywords_to_ids = p_scrapbooks.m_collection["stats"]["keywords_to_ids"]
+
+		self.m_cache = WfsResponseCache(p_cache_size)
+
+	def book(self, p_book_id):
+
+		# The book's entry in its scrapbook file, with the IDs of its pages (see page)
+		if p_book_id not in self.m_books_by_id_dict:
+			raise WfsQueryError(404, "No book with ID {0}".format(p_book_id))
+		return { "book": self.m_books_by_id_dict[p_book_id],
+				 "pages": [page["id"] for page in self.m_pages.m_pages_by_book_dict[p_book_id]] }
+
+	def cooccurrences(self, p_type, p_id, p_other_type, p_offset=0, p_limit=default_limit):
+
+		# The entities of another type sharing pages with this one, most pages shared first, one page of them at a time
+		self.entity(p_type, p_id)
+		if p_other_type not in entity_types:
+			raise WfsQueryError(404, "No entity type {0}".format(p_other_type))
+		if p_offset < 0 or p_limit < 1 or p_limit > max_limit:
+			raise WfsQueryError(400, "offset must be 0 or more and limit from 1 to {0}".format(max_limit))
+
+		listed_id = self.m_ids_to_keywords[p_id] if "keywords" == p_type else p_id
+		ranked = self.m_pages.top_cooccurrences(entity_types[p_type], listed_id, entity_types[p_other_type])
+
+		# Keywords are served by ID, leaving out the ones without one (e.g. the blank keyword of pages without any)
+		if "keywords" == p_other_type:
+			ranked = [(self.m_keywords_to_ids[other_id], pages_shared) for other_id, pages_shared in ranked
+					  if other_id in self.m_keywords_to_ids]
+
+		results = [{ "id": other_id, "pages": pages_shared } for other_id, pages_shared in ranked[p_offset:p_offset + p_limit]]
+
+		return { "type": p_type, "id": p_id, "other_type": p_other_type,
+				 "offset": p_offset, "limit": p_limit, "total": len(ranked), "results": results }
+
+	def entity(self, p_type, p_id):
+
+		if p_type not in self.m_entities:
+			raise WfsQueryError(404, "No entity type {0}".format(p_type))
+		if p_id not in self.m_entities[p_type]:
+			raise WfsQueryError(404, "No {0} entry with ID {1}".format(p_type, p_id))
+		return self.m_entities[p_type][p_id]
+
+	def get(self, p_path):
+
+		# Response status and JSON body for a request path, from the cache if it was served before.
+		# Only successful responses are cached
+		request = urlsplit(p_path)
+		query = parse_qs(request.query)
+		key = request.path.rstrip("/") + "?" + "&".join(
+			"{0}={1}".format(name, query[name][-1]) for name in sorted(query) if name in ["offset", "limit"])
+
+		body = self.m_cache.get(key)
+		if body is not None:
+			return 200, body
+
+		try:
+			body = self.serialise(self.route(request.path, query))
+		except WfsQueryError as error:
+			return error.m_status, self.serialise({ "error": str(error) })
+		except Exception as error:
+			return 500, self.serialise({ "error": "{0}: {1}".format(type(error).__name__, error) })
+
+		self.m_cache.add(key, body)
+		return 200, body
+
+	def page(self, p_page_id):
+
+		# The page's entry in its scrapbook file
+		if p_page_id not in self.m_pages.m_pages_by_id_dict:
+			raise WfsQueryError(404, "No page with ID {0}".format(p_page_id))
+		page = self.m_pages.m_pages_by_id_dict[p_page_id]
+		return page if not self.m_pages.m_compact else page.to_dict()
+
+	def route(self, p_path, p_query):
+
+		# /books/<id>, /pages/<id>, /<type>/<id>, or /<type>/<id>/<other type>?offset=<n>&limit=<n>
+		parts = [part for part in p_path.split("/") if len(part) > 0]
+
+		if 2 == len(parts) and "books" == parts[0]:
+			return self.book(parts[1])
+		if 2 == len(parts) and "pages" == parts[0]:
+			return self.page(parts[1])
+		if 2 == len(parts):
+			return self.entity(parts[0], parts[1])
+		if 3 == len(parts):
+			try:
+				offset = int(p_query.get("offset", ["0"])[-1])
+				limit = int(p_query.get("limit", [str(default_limit)])[-1])
+			except ValueError:
+				raise WfsQueryError(400, "offset and limit must be integers")
+			return self.cooccurrences(parts[0], parts[1], parts[2], offset, limit)
+
+		raise WfsQueryError(404, "No route {0}".format(p_path))
+
+	def serialise(self, p_json):
+
+		# Same serialisation as the output files
+		if self.m_canonical:
+			return json.dumps(canonical_json(p_json), sort_keys=True).encode("utf-8")
+		return json.dumps(p_json).encode("utf-8")
+
+
+class WfsQueryHandler(BaseHTTPRequestHandler):
+
+	def do_GET(self):
+
+		# Errors past the API's own (which it answers with a JSON error) still get a status line
+		try:
+			status, body = self.server.m_api.get(self.path)
+		except Exception as error:
+			status, body = 500, json.dumps({ "error": "{0}: {1}".format(type(error).__name__, error) }).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.send_header("Access-Control-Allow-Origin", "*")
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, p_format, *p_args):
+
+		if not self.server.m_quiet:
+			BaseHTTPRequestHandler.log_message(self, p_format, *p_args)
+
+
+def make_server(p_api, p_host="127.0.0.1", p_port=8000, p_quiet=False):
+
+	server = ThreadingHTTPServer((p_host, p_port), WfsQueryHandler)
+	server.m_api = p_api
+	server.m_quiet = p_quiet
+	return server
+
+def main():
+
+	parser = argparse.ArgumentParser(description="Serves people, places, sources, keywords, books, pages, and "
+												 "co-occurrences of a Working from Scraps export over HTTP")
+	parser.add_argument("--date", default="20191025",
+						help="date of the export's JSON files (default: %(default)s)")
+	parser.add_argument("--input-path", help="folder with the export's JSON files (default: input/<date>/)")
+	parser.add_argument("--cache-path", help="folder for data kept between runs (default: cache/)")
+	parser.add_argument("--description-cache-size", type=int, default=8388608,
+						help="characters of rendered page descriptions kept in cache/ between runs, 0 to turn off (default: %(default)s)")
+	parser.add_argument("--compact-pages", action="store_true",
+						help="keep pages in memory as compact records, for exports too large for page dicts")
+	parser.add_argument("--staging-db", nargs="?", const="", metavar="FILE",
+						help="build the model from a SQLite staging store (default: cache/staging.sqlite)")
+	parser.add_argument("--canonical", action="store_true",
+						help="serve the same JSON as a --canonical build writes")
+	parser.add_argument("--host", default="127.0.0.1", help="address to serve on (default: %(default)s)")
+	parser.add_argument("--port", type=int, default=8000, help="port to serve on (default: %(default)s)")
+	parser.add_argument("--response-cache-size", type=int, default=8388608,
+						help="bytes of responses kept in memory (default: %(default)s)")
+	parser.add_argument("--quiet", action="store_true", help="don't log each request")
+	args = parser.parse_args()
+
+	input_path = os.getcwd() + os.sep + "input" + os.sep + args.date + os.sep
+	cache_path = os.getcwd() + os.sep + "cache" + os.sep
+	if args.input_path is not None:
+		input_path = os.path.join(args.input_path, "")
+	if args.cache_path is not None:
+		cache_path = os.path.join(args.cache_path, "")
+
+	# Build the same model as a full build, without writing its outputs
+	scrapbooks, pages, people, places, sources, keywords = build_model(args, input_path, cache_path,
+																	   WfsStageProfiler(args.date))
+	api = WfsQueryApi(scrapbooks, pages, people, places, sources, keywords, args.canonical, args.response_cache_size)
+
+	server = make_server(api, args.host, args.port, args.quiet)
+	print("Serving {0} on http://{1}:{2}/".format(input_path, args.host, server.server_address[1]))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+
+
+if "__main__" == __name__:
+	main()
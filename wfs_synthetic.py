@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+""" Synthetic database exports for the Working from Scraps JSON transform
+
+Writes the nine JSON tables of a database export (Scrapbook, Scrapbook_Page,
+the people, places, and sources tables, and their four join tables) with the
+same fields as the real exports, at any size. Entities, keywords, and roles
+are drawn with skewed (Zipf-like) frequencies like those of the sample export
+in input/most_recent/, so that a few people and keywords appear on many pages
+and most appear on a few.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+__author__ = "Jonathan Armoza"
+__contact__ = "jarmoza@gmail.com"
+__copyright__ = "Copyright 2019, Jonathan Armoza"
+__credits__ = ["Jonathan Armoza", "Bridget Moynihan"]
+__date__ = "2019/11/12"
+__deprecated__ = False
+__license__ = "GPLv3"
+__maintainer__ = "developer"
+__status__ = "Production"
+__version__ = "1.0.8"
+
+
+import argparse
+import bisect
+import json
+import os
+import random
+
+
+# Sizes to benchmark at: books and pages per book (1M join rows is about 18 join rows per page)
+presets = {
+	"sample": (4, 51),
+	"12-books": (12, 50),
+	"100-books": (100, 50),
+	"1m-joins": (1093, 50)
+}
+
+# Per page rates measured on the 20191025 sample export
+people_per_page = 4.6
+places_per_page = 3.6
+sources_per_page = 4.3
+people_joins_per_page = 7.7
+places_joins_per_page = 5.3
+sources_joins_per_page = 5.3
+creators_per_source = 0.66
+keywords_per_page = 28
+ukat_keywords_per_page = 21
+description_length = 3400
+
+# Categorical values and how often they occur in the sample export
+roles = [("Named in clipping", 552), ("Author/Writer", 334), ("Illustrator/Artist", 328),
+		 ("Depicted in clipping", 301), ("Photographer", 46), ("Inventor/Designer/Engineer", 8), ("Translator", 1)]
+identification_methods = [("", 754), ("Given in Clipping", 278), ("Google", 277), ("Implied", 149), ("Morgan's note", 80)]
+nationalities = [("", 212), ("English", 190), ("French", 83), ("American", 71), ("Italian", 47),
+				 ("German", 42), ("Scottish", 38), ("Greek", 21), ("Dutch", 15), ("Russian", 12)]
+genders = [("Male", 796), ("Female", 100), ("Unknown", 47), ("Not Applicable", 3)]
+continents = [("Europe", 389), ("North America", 150), ("Asia", 53), ("Transcontinental", 48), ("Africa", 38),
+			  ("Australia and Oceania", 19), ("Imaginary", 17), ("South America", 8)]
+source_types = [("Original Art Object", 436), ("Source Poem/Literature", 222), ("Other Original Source", 84),
+				("Newspaper", 38), ("Book", 37), ("Periodical/Magazine", 30), ("Other Company", 15),
+				("Uncertain/Unknown", 12)]
+orientations = [("portrait", 152), ("mixed", 52), ("landscape", 1)]
+yes_no_foldout = [("N", 195), ("Y", 10)]
+yes_no_original = [("N", 140), ("Y", 65)]
+
+first_names = ["John", "Mary", "William", "Elizabeth", "James", "Anne", "Robert", "Margaret", "Edwin",
+			   "Jean", "Thomas", "Helen", "Pierre", "Marie", "Hans", "Greta", "Paolo", "Lucia"]
+last_names = ["Milton", "Morgan", "Smith", "Brown", "Wilson", "Campbell", "Stewart", "Dupont", "Martin",
+			  "Muller", "Rossi", "Bianchi", "Taylor", "Clark", "Walker", "Young", "King", "Wright"]
+months = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+		  "October", "November", "December"]
+filler_words = ["clipping", "page", "black", "white", "colour", "reproduction", "drawing", "photograph",
+				"arranged", "portrait", "landscape", "caption", "small", "large", "of", "the", "a", "and",
+				"with", "depicting", "woman", "man", "animal", "advertisement", "article", "poem"]
+
+
+class WfsZipfSampler:
+
+	# Draws indices 0..n-1 with probability proportional to 1 / (index + 1) ^ exponent
+	def __init__(self, p_random, p_count, p_exponent=1.0):
+
+		self.m_random = p_random
+		self.m_cumulative_weights = []
+		total = 0.0
+		for index in range(p_count):
+			total += 1.0 / (index + 1) ** p_exponent
+			self.m_cumulative_weights.append(total)
+
+	def sample(self):
+
+		index = bisect.bisect(self.m_cumulative_weights, self.m_random.random() * self.m_cumulative_weights[-1])
+		return min(index, len(self.m_cumulative_weights) - 1)
+
+	def sample_unique(self, p_count):
+
+		# Up to p_count different indices (fewer if the draws keep repeating)
+		indices = []
+		for attempt in range(p_count * 4):
+			index = self.sample()
+			if index not in indices:
+				indices.append(index)
+				if len(indices) == p_count:
+					break
+		return indices
+
+
+class WfsSyntheticExport:
+
+	def __init__(self, p_books, p_pages_per_book, p_seed=0):
+
+		self.m_random = random.Random(p_seed)
+		self.m_books = p_books
+		self.m_pages = p_books * p_pages_per_book
+		self.m_pages_per_book = p_pages_per_book
+
+		# Entity counts grow with the pages, and keyword vocabularies with their square root (as new
+		# pages mostly reuse keywords already seen)
+		self.m_people = max(1, int(people_per_page * self.m_pages))
+		self.m_places = max(1, int(places_per_page * self.m_pages))
+		self.m_sources = max(1, int(sources_per_page * self.m_pages))
+		self.m_keywords = max(keywords_per_page, int(80 * self.m_pages ** 0.5))
+		self.m_ukat_keywords = max(ukat_keywords_per_page, int(30 * self.m_pages ** 0.5))
+
+		# A few entities and keywords appear on many pages, most on a few
+		self.m_people_sampler = WfsZipfSampler(self.m_random, self.m_people, 0.9)
+		self.m_places_sampler = WfsZipfSampler(self.m_random, self.m_places, 0.9)
+		self.m_sources_sampler = WfsZipfSampler(self.m_random, self.m_sources, 0.9)
+		self.m_keywords_sampler = WfsZipfSampler(self.m_random, self.m_keywords, 1.0)
+		self.m_ukat_keywords_sampler = WfsZipfSampler(self.m_random, self.m_ukat_keywords, 1.0)
+
+		# People listed on each page (their tags appear in its description)
+		self.m_page_people = {}
+
+	def choose(self, p_weighted_values):
+
+		total = sum(weight for value, weight in p_weighted_values)
+		threshold = self.m_random.random() * total
+		for value, weight in p_weighted_values:
+			threshold -= weight
+			if threshold < 0:
+				return value
+		return p_weighted_values[-1][0]
+
+	def count_around(self, p_mean):
+
+		# Counts vary between none and twice the mean
+		return int(round(self.m_random.uniform(0, 2 * p_mean)))
+
+	def date(self):
+
+		return "{0} {1} {2}".format(self.m_random.randint(1, 28), self.m_random.choice(months),
+									self.m_random.randint(1600, 1990))
+
+	def person_name(self, p_person_index):
+
+		return (first_names[p_person_index % len(first_names)],
+				"{0} {1}".format(last_names[(p_person_index // len(first_names)) % len(last_names)], p_person_index + 1))
+
+	def text(self, p_length):
+
+		words = []
+		length = 0
+		while length < p_length:
+			words.append(self.m_random.choice(filler_words))
+			length += len(words[-1]) + 1
+		return " ".join(words)
+
+	def description(self, p_page_id):
+
+		# Description paragraphs separated by the endlines found in the exports, with |Name [id]| tags
+		# for people on the page and clipping headings
+		paragraphs = [self.text(description_length // 3)]
+		paragraphs.append("Identified Clippings:")
+		for person_index in self.m_page_people.get(p_page_id, [])[:6]:
+			first_name, last_name = self.person_name(person_index)
+			paragraphs.append("- a {0} by |{1} {2} [{3}]| {4}".format(
+				self.m_random.choice(filler_words), first_name, last_name, person_index + 1,
+				self.text(description_length // 12)))
+		paragraphs.append("Unidentified Clippings:")
+		paragraphs.append("- " + self.text(description_length // 6))
+		return self.m_random.choice([" %\r\n", " %\r\n\r\n", "\r\n"]).join(paragraphs)
+
+	def scrapbooks(self):
+
+		for book_index in range(self.m_books):
+			begin_year = self.m_random.randint(1931, 1980)
+			yield {
+				"Scrapbook_Id": str(book_index + 1),
+				"Scrapbook_number": str(book_index + 1),
+				"Scrapbook_pg_range": "{0}a-{1}c".format(book_index * 300 + 1, book_index * 300 + 300),
+				"Scrapbook_date_range": "{0}-{1}".format(begin_year, begin_year + self.m_random.randint(1, 8)),
+				"Scrapbook_height_cm": str(self.m_random.choice([32, 38.5, 40])),
+				"Scrapbook_width_cm": str(self.m_random.choice([20, 26.5, 28])),
+				"Scrapbook_depth_cm": str(self.m_random.choice([4, 7.5, 9])),
+				"Scrapbook_cover_image": self.m_random.choice(["Y", "N"]),
+				"Scrapbook_cover_image_ids": "MS_MORGAN_C_{0}_Front Binding".format(book_index + 1),
+				"Scrapbook_materiality_desc": self.text(250),
+				"Scrapbook_notes": "",
+				"Number of Pages included in our Subset": str(self.m_pages_per_book),
+				"Total Number of Pages in Scrapbook": "300"
+			}
+
+	def scrapbook_pages(self):
+
+		for page_index in range(self.m_pages):
+			page_id = str(page_index + 1)
+			book_index = page_index // self.m_pages_per_book
+			clippings = self.m_random.randint(1, 12)
+			yield {
+				"Page_Id": page_id,
+				"Page_number": str(book_index * 300 + page_index % self.m_pages_per_book + 1),
+				"Page_Number_suffix": self.m_random.choice(["a", "b", "c", "d"]),
+				"Scrapbook_Id": str(book_index + 1),
+				"Page_desc": self.description(page_id),
+				"Page_foldout": self.choose(yes_no_foldout),
+				"Page_clipping_count": str(clippings),
+				"Page_clipping_w_metadata_count": str(self.m_random.randint(0, clippings)),
+				"Page_keywords": ", ".join("Keyword {0}".format(index + 1) for index in
+										   self.m_keywords_sampler.sample_unique(self.count_around(keywords_per_page))),
+				"Page_UKAT_keyword": ", ".join("UKAT{0}.{1} Subject; Term {2}".format(index % 9 + 1, index % 90, index + 1)
+											   for index in self.m_ukat_keywords_sampler.sample_unique(
+												   self.count_around(ukat_keywords_per_page))),
+				"Page_clipping_orientations": self.choose(orientations),
+				"Page_original_material": self.choose(yes_no_original),
+				"Page_notes": "",
+				"Page_image_id": "MS_Morgan_C_{0}_{1:04d}".format(book_index + 1, page_index + 1)
+			}
+
+	def people(self):
+
+		for person_index in range(self.m_people):
+			first_name, last_name = self.person_name(person_index)
+			yield {
+				"Associated_Person_Id": str(person_index + 1),
+				"Associated_Person_first_name": first_name,
+				"Associated_Person_last_name": last_name,
+				"Associated_Person_dob": self.date() if self.m_random.random() < 0.7 else "",
+				"Associated_Person_dod": self.date() if self.m_random.random() < 0.6 else "",
+				"Associated_Person_nationality": self.choose(nationalities),
+				"Associated_Person_gender": self.choose(genders),
+				"Associated_Person_epithets": self.m_random.choice(["", "writer", "artist", "poet", "photographer"]),
+				"Associated_Person_alternate_names": "",
+				"Associated_Person_link": "https://en.wikipedia.org/wiki/Person_{0}".format(person_index + 1),
+				"Associated_Person_viaf": "http://viaf.org/viaf/{0}".format(10000000 + person_index)
+			}
+
+	def places(self):
+
+		for place_index in range(self.m_places):
+			yield {
+				"Place_Id": str(place_index + 1),
+				"Place_name": "Place {0}".format(place_index + 1),
+				"Place_name_variations": "",
+				"Place_name_countries": "Country {0}".format(place_index % 150 + 1),
+				"Place_name_continents": self.choose(continents),
+				"Place_name_WOEID": "",
+				"Place_name_geonames_lat": "N {0}° {1}' {2}''".format(
+					self.m_random.randint(0, 89), self.m_random.randint(0, 59), self.m_random.randint(0, 59)),
+				"Place_name_geonames_long": "E {0}° {1}' {2}''".format(
+					self.m_random.randint(0, 179), self.m_random.randint(0, 59), self.m_random.randint(0, 59)),
+				"Place_name_geoname_link": "http://www.geonames.org/{0}/place.html".format(place_index + 1)
+			}
+
+	def sources(self):
+
+		for source_index in range(self.m_sources):
+			yield {
+				"Page_Associated_Sources_Id": str(source_index + 1),
+				"Page_Associated_Sources_name": "Source {0}".format(source_index + 1),
+				"Page_Associated_Sources_associated_place": self.m_random.choice(["", "", "London", "Paris", "Glasgow"]),
+				"Page_Associated_Sources_date": str(self.m_random.randint(1600, 1990)),
+				"Page_Associated_Source_rights_holder": "",
+				"Page_Associated_Sources_type_of_source": self.choose(source_types),
+				"Page_Associated_Sources_link": "",
+				"Page_Associated_Sources_notes": ""
+			}
+
+	def page_people_joins(self):
+
+		# Drawn before the pages, since page descriptions tag the people on them
+		joins = []
+		for join_index in range(int(people_joins_per_page * self.m_pages)):
+			page_index = self.m_random.randrange(self.m_pages)
+			person_index = self.m_people_sampler.sample()
+			self.m_page_people.setdefault(str(page_index + 1), []).append(person_index)
+			joins.append({
+				"Page_Associated_Person_Join_Id": str(join_index + 1),
+				"Page_Id_Join": str(page_index + 1),
+				"Associated_Person_Id_Join": str(person_index + 1),
+				"Associated_Person_Role": self.choose(roles),
+				"Creator_Identification_Method": self.choose(identification_methods),
+				"Creator_item_desc": "",
+				"Creator_item_links": ""
+			})
+		return joins
+
+	def page_places_joins(self):
+
+		for join_index in range(int(places_joins_per_page * self.m_pages)):
+			yield {
+				"Page_Places_Named_Join": str(join_index + 1),
+				"Page_Id_Join_5": str(self.m_random.randrange(self.m_pages) + 1),
+				"Places_Named_Id_Join": str(self.m_places_sampler.sample() + 1)
+			}
+
+	def page_sources_joins(self):
+
+		for join_index in range(int(sources_joins_per_page * self.m_pages)):
+			yield {
+				"Page_Associated_Sources_Join_Id": str(join_index + 1),
+				"Page_Id_Join_2": str(self.m_random.randrange(self.m_pages) + 1),
+				"Associated_Sources_Id_Join": str(self.m_sources_sampler.sample() + 1),
+				"Sources_Identification_Method": self.choose(identification_methods),
+				"Source_year_on_page": "",
+				"Source_additional_date_info": "",
+				"Source_link_to_page_content": "",
+				"Page_Associated_Sources_Join_notes": ""
+			}
+
+	def sources_people_joins(self):
+
+		for join_index in range(int(creators_per_source * self.m_sources)):
+			yield {
+				"Sources_Person_Join_Id": str(join_index + 1),
+				"Associated_Sources_Id_Join_2": str(self.m_random.randrange(self.m_sources) + 1),
+				"Associated_Person_Id_Join_2": str(self.m_people_sampler.sample() + 1),
+				"Sources_Person_Join_notes": ""
+			}
+
+	def write(self, p_output_path, p_json_file_date):
+
+		# People joins come first so that the page descriptions can tag the people on each page
+		tables = [
+			("Page_People_Join", self.page_people_joins()),
+			("Scrapbook", self.scrapbooks()),
+			("Scrapbook_Page", self.scrapbook_pages()),
+			("Page_Associated_People", self.people()),
+			("Page_Places_Named", self.places()),
+			("Page_Associated_Sources", self.sources()),
+			("Page_Places_Named_Join", self.page_places_joins()),
+			("Page_Associated_Sources_Join", self.page_sources_joins()),
+			("Sources_People_Join", self.sources_people_joins())
+		]
+
+		record_counts = {}
+		for table, records in tables:
+			record_counts[table] = write_table(p_output_path + "{0}_{1}.json".format(table, p_json_file_date), records)
+
+		return record_counts
+
+
+def write_table(p_filename, p_records):
+
+	# Written one record at a time, in the { "RECORDS": [...] } shape of the database exports
+	record_count = 0
+	with open(p_filename, "w") as output_file:
+		output_file.write("{\"RECORDS\":[\n")
+		for record in p_records:
+			output_file.write(("" if 0 == record_count else ",\n") + json.dumps(record))
+			record_count += 1
+		output_file.write("\n]}\n")
+
+	return record_count
+
+def generate_export(p_output_path, p_json_file_date, p_books, p_pages_per_book, p_seed=0):
+
+	if not os.path.isdir(p_output_path):
+		os.makedirs(p_output_path)
+
+	return WfsSyntheticExport(p_books, p_pages_per_book, p_seed).write(p_output_path, p_json_file_date)
+
+def main():
+
+	parser = argparse.ArgumentParser(description="Writes a synthetic Working from Scraps database export")
+	parser.add_argument("output_path", help="folder to write the export's JSON files to")
+	parser.add_argument("--preset", choices=sorted(presets.keys()),
+						help="size to generate (books and pages per book), instead of --books and --pages-per-book")
+	parser.add_argument("--books", type=int, default=12, help="number of scrapbooks (default: %(default)s)")
+	parser.add_argument("--pages-per-book", type=int, default=50, help="pages of each scrapbook (default: %(default)s)")
+	parser.add_argument("--date", default="20191025", help="date to give the export's JSON files (default: %(default)s)")
+	parser.add_argument("--seed", type=int, default=0, help="random seed, for reproducible exports (default: %(default)s)")
+	args = parser.parse_args()
+
+	books, pages_per_book = args.books, args.pages_per_book
+	if args.preset is not None:
+		books, pages_per_book = presets[args.preset]
+
+	record_counts = generate_export(os.path.join(args.output_path, ""), args.date, books, pages_per_book, args.seed)
+	for table in sorted(record_counts):
+		print("{0:>32} {1:>10}".format(table, record_counts[table]))
+
+
+if "__main__" == __name__:
+	main()